@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+"""
+Precompute the NGDs of the top-K co-occurring UMLS pairs in the SemMedDB index into a lookup artifact,
+which is loaded by config_web/semmeddb.py and checked by `NGDService.calculate_ngd` before querying ES.
+
+Usage (from the "pending.api" folder):
+
+    python bin/ngd_precompute.py --es-host http://localhost:9200 --index pending-semmeddb --top-k 100000 \
+        --output assets/semmeddb_ngd/top_pairs.json.gz
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+
+from elasticsearch import AsyncElasticsearch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web.service.ngd_precompute import NGDPrecomputeJob  # noqa: E402
+from web.service.ngd_service import DocStatsService  # noqa: E402
+
+logging.basicConfig(level=logging.INFO)
+logging.getLogger("elasticsearch").setLevel(logging.WARNING)
+logger = logging.getLogger("ngd_precompute")
+
+
+async def precompute(args):
+    es_async_client = AsyncElasticsearch(args.es_host, request_timeout=args.timeout)
+    try:
+        # record the concrete index behind the alias, so the artifact can be matched to the index build
+        aliases = await es_async_client.indices.get_alias(index=args.index)
+        index_build = ",".join(sorted(aliases.keys()))
+
+        doc_stats_service = DocStatsService(
+            es_async_client=es_async_client,
+            es_index_name=args.index,
+            subject_field_name="subject.umls",
+            object_field_name="object.umls",
+            doc_freq_agg_name="sum_of_predication_counts",
+        )
+        job = NGDPrecomputeJob(doc_stats_service=doc_stats_service, top_k=args.top_k, page_size=args.page_size)
+        table = await job.run()
+        table.metadata["index_build"] = index_build
+    finally:
+        await es_async_client.close()
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    table.dump(args.output)
+    logger.info("Wrote %d NGDs of index %s to %s", len(table.distances), index_build, args.output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--es-host", default="http://localhost:9200")
+    parser.add_argument("--index", default="pending-semmeddb")
+    parser.add_argument("--top-k", type=int, default=100000, help="number of top co-occurring pairs to precompute")
+    parser.add_argument("--page-size", type=int, default=10000, help="number of composite buckets per ES request")
+    parser.add_argument("--timeout", type=int, default=600, help="ES request timeout in seconds")
+    parser.add_argument("--output", default="assets/semmeddb_ngd/top_pairs.json.gz")
+    asyncio.run(precompute(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+"""
+Benchmark the decoding throughput (lines/sec on a single core) of the nodenorm upload workers on a
+Protein.txt-shaped fixture: the previous text-mode `readline` path against the byte-oriented block
+reader of plugins/nodenorm/lines.py, both parsing with orjson.
+
+Usage (from the "pending.api" folder):
+
+    python bin/upload_decoding_benchmark.py --lines 200000
+    python bin/upload_decoding_benchmark.py --input /data/nodenorm/Protein.txt --max-bytes 1073741824
+"""
+
+import argparse
+import importlib.util
+import os
+import random
+import tempfile
+import time
+
+import orjson
+
+PLUGIN_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "plugins", "nodenorm")
+
+
+def load_lines_module():
+    # load the module on its own, as importing the plugin package requires the hub configuration
+    spec = importlib.util.spec_from_file_location("nodenorm_lines", os.path.join(PLUGIN_FOLDER, "lines.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def generate_protein_fixture(filepath: str, num_lines: int, seed: int = 0):
+    """
+    Writes cliques shaped like the Protein.txt compendium: a type, an information content and a list of
+    UniProtKB / ENSEMBL / PR identifiers with labels, descriptions and taxa
+    """
+    rng = random.Random(seed)
+    with open(filepath, "wb") as handle:
+        for index in range(num_lines):
+            identifiers = [
+                {
+                    "i": f"UniProtKB:{rng.choice('OPQ')}{index:05d}{offset}",
+                    "l": f"Protein {index} isoform {offset} ({rng.choice(['human', 'mouse', 'rat'])})",
+                    "d": ["An uncharacterized protein." * rng.randint(1, 3)] if offset == 0 else [],
+                    "t": [f"NCBITaxon:{rng.choice([9606, 10090, 10116])}"],
+                }
+                for offset in range(rng.randint(1, 4))
+            ]
+            identifiers.append({"i": f"ENSEMBL:ENSP{index:011d}", "t": ["NCBITaxon:9606"]})
+            document = {
+                "type": "biolink:Protein",
+                "ic": str(round(rng.uniform(50, 100), 3)) if rng.random() < 0.9 else None,
+                "identifiers": identifiers,
+                "preferred_name": identifiers[0]["l"],
+                "taxa": ["NCBITaxon:9606"],
+            }
+            handle.write(orjson.dumps(document) + b"\n")
+
+
+def decode_text_readline(filepath: str, offset_end: int) -> int:
+    num_lines = 0
+    with open(filepath, encoding="utf-8") as handle:
+        while handle.tell() < offset_end:
+            orjson.loads(handle.readline())
+            num_lines += 1
+    return num_lines
+
+
+def decode_byte_blocks(filepath: str, offset_end: int, iterate_file_lines) -> int:
+    num_lines = 0
+    for line, _ in iterate_file_lines(filepath, 0, offset_end):
+        orjson.loads(line)
+        num_lines += 1
+    return num_lines
+
+
+def line_boundary(filepath: str, max_bytes: int) -> int:
+    file_size_bytes = os.path.getsize(filepath)
+    if max_bytes is None or max_bytes >= file_size_bytes:
+        return file_size_bytes
+    with open(filepath, "rb") as handle:
+        handle.seek(max_bytes - 1)
+        handle.readline()
+        return handle.tell()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", default=None, help="existing compendium file (generates a fixture otherwise)")
+    parser.add_argument("--lines", type=int, default=200000, help="number of lines of the generated fixture")
+    parser.add_argument("--max-bytes", type=int, default=None, help="only decode the first bytes of the input")
+    parser.add_argument("--repeat", type=int, default=3, help="number of runs, the best one is reported")
+    args = parser.parse_args()
+
+    iterate_file_lines = load_lines_module().iterate_file_lines
+
+    with tempfile.TemporaryDirectory() as temporary_folder:
+        filepath = args.input
+        if filepath is None:
+            filepath = os.path.join(temporary_folder, "Protein.txt")
+            generate_protein_fixture(filepath, args.lines)
+        offset_end = line_boundary(filepath, args.max_bytes)
+
+        decoders = {
+            "text readline": lambda: decode_text_readline(filepath, offset_end),
+            "byte blocks": lambda: decode_byte_blocks(filepath, offset_end, iterate_file_lines),
+        }
+        print(f"{filepath}: {offset_end / 1024**2:.1f} MiB")
+        for name, decoder in decoders.items():
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                num_lines = decoder()
+                timings.append(time.perf_counter() - start)
+            best = min(timings)
+            print(f"{name:>14}: {num_lines / best:12,.0f} lines/sec/core | {offset_end / 1024**2 / best:8.1f} MiB/sec")
+
+
+if __name__ == "__main__":
+    main()
@@ -168,6 +168,20 @@ HUB_DB_BACKEND = ConfigurationError("Define Hub DB connection")
 
 # ES_HOST = ConfigurationError("Define ElasticSearch host used for index creation (eg localhost:9200)")
 
+# Direct-to-Elasticsearch upload of the nodenorm and nameres sources. The sources listed here
+# skip the MongoDB staging collection and stream their documents into a new index behind the alias
+# DIRECT_ES_UPLOAD = {
+#     "nodenorm": {
+#         "host": "http://localhost:9200",
+#         "alias": "pending-nodenorm",
+#         "number_of_replicas": 1,
+#         # the indices previously behind the alias are kept unless enabled
+#         "delete_previous_indices": False,
+#         "args": {"request_timeout": 300, "retry_on_timeout": True, "max_retries": 10},
+#     },
+# }
+DIRECT_ES_UPLOAD = {}
+
 TORNADO_SETTINGS = {
     # max 10GiB upload
     "max_buffer_size": 10
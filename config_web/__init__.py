@@ -91,6 +91,24 @@ from . import upheno_ontology
 
 APP_LIST += [(r"/{pre}/{ver}/metadata/?", "web.handlers.metadata.PendingMetadataSourceHandler")]
 
+# Shared Elasticsearch Settings
+# The ES clients are pooled on (ES_HOST, ES_ARGS), so every sub-application inheriting these
+# arguments shares one sync and one async client, along with their connection pool, per host.
+# The pool limit is therefore sized here for all of the sub-applications rather than per module
+ES_ARGS = {
+    "sniff": False,
+    "request_timeout": 60,
+    "connections_per_node": 100,
+}
+
+# Sub-Application Initialization
+# With LAZY_SUB_APPLICATIONS, the route of every sub-application is registered at startup, but
+# the sub-application itself (namespace, ES clients and metadata refresh) is only built on its
+# first request. With SUB_APPLICATION_WARMUP, the launcher also builds the remaining ones in the
+# background once the server is listening
+LAZY_SUB_APPLICATIONS = False
+SUB_APPLICATION_WARMUP = True
+
 # Default Opentelemetry Settings
 OPENTELEMETRY_ENABLED = "False"
 OPENTELEMETRY_SERVICE_NAME = "Service Provider"
@@ -13,4 +13,6 @@ API_VERSION = ""
 
 ES_QUERY_PIPELINE = "web.pipeline.PendingQueryPipeline"
 ES_QUERY_BUILDER = "web.pipeline.PendingQueryBuilder"
+# once the index holds the canonical direction of the edges (web.graph.GraphObject.add_canonical_direction)
+# ES_QUERY_BUILDER = "web.pipeline.CanonicalGraphQueryBuilder"
 ES_RESULT_TRANSFORM = "web.pipeline.GraphResultTransform"
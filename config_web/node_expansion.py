@@ -1,6 +1,19 @@
+import re
+
 ES_INDEX = ["pending-go", "pending-doid", "pending-mondo", "pending-chebi"]
 ES_DOC_TYPE = "node"
 
 ES_HOST = "http://localhost:9200"
 API_PREFIX = "node-expansion"
 API_VERSION = ""
+
+# routes the CURIEs to the index of their prefix
+ES_QUERY_PIPELINE = "web.engine.NodeExpansionQueryPipeline"
+ES_QUERY_BACKEND = "web.engine.NodeExpansionBackend"
+
+# id regex pattern
+id_node_regex_pattern = (re.compile(r"(GO|DOID|MONDO|CHEBI)\:[0-9]+", re.I), ["_id"])
+
+ANNOTATION_ID_REGEX_LIST = [id_node_regex_pattern]
+
+ANNOTATION_DEFAULT_SCOPES = ["_id"]
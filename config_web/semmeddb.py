@@ -6,6 +6,7 @@ from elasticsearch import Elasticsearch
 from elasticsearch_dsl import Search, A
 from biothings.web.settings.default import APP_LIST
 from web.service.umls_service import UMLSJsonFileClient, NarrowerRelationshipService
+from web.service.ngd_precompute import PrecomputedNGDTable
 
 
 ES_HOST = "http://localhost:9200"
@@ -59,6 +60,45 @@ _object_field_name = "object.umls"
 # You are free to name it anything, actually.
 _doc_freq_agg_name = "sum_of_predication_counts"
 
+#########################
+# URLSpec kwargs Part 4 #
+#########################
+
+# Expanded term sets (e.g. a UMLS term with thousands of narrower terms when `expand=both`) of at least this size are
+# stored as documents in the lookup index, and referenced by "terms lookup" in the `terms` filters instead of being
+# sent inline in every query. The API writes the term sets at request time, so it's off (None) unless the index exists
+# and the API's ES user can write to it, e.g. "pending-semmeddb-term-sets".
+_term_set_lookup_index = None
+_term_set_lookup_min_size = 1024
+
+#########################
+# URLSpec kwargs Part 5 #
+#########################
+
+# Capacity of each of the LRU caches (unary doc freqs, bipartite doc freqs, and NGDs) shared by the NGD handlers.
+# Suppose each term ID is an 8-char string and each doc freq is an integer, a cache of size 102400 takes ~10MB in RAM.
+# The actual memory usage is reported by the "/semmeddb/admin/ngd/cache" endpoint.
+_cache_capacity = 102400
+
+#########################
+# URLSpec kwargs Part 6 #
+#########################
+
+# NGDs of the top co-occurring UMLS pairs, precomputed offline by `bin/ngd_precompute.py`.
+# If the artifact exists, `NGDService.calculate_ngd` checks it before going to the caches and ES.
+_precomputed_ngd_filepath = os.path.join(Path.cwd(), "assets/semmeddb_ngd/top_pairs.json.gz")
+_precomputed_ngd_table = None
+if os.path.exists(_precomputed_ngd_filepath):
+    _precomputed_ngd_table = PrecomputedNGDTable.load(_precomputed_ngd_filepath)
+
+#########################
+# URLSpec kwargs Part 7 #
+#########################
+
+# The POST actions (flush, warm) of the "/semmeddb/admin/ngd/cache" endpoint require this token as a bearer token in the
+# Authorization header, and are refused when it's not set. GET (the statistics) stays public.
+_cache_admin_token = os.environ.get("SEMMEDDB_NGD_CACHE_ADMIN_TOKEN")
+
 ##############################
 # URLSpec kwargs composition #
 ##############################
@@ -68,6 +108,19 @@ urlspec_kwargs = dict(
     object_field_name=_object_field_name,
     doc_freq_agg_name=_doc_freq_agg_name,
     term_expansion_service=_term_expansion_service,
+    term_set_lookup_index=_term_set_lookup_index,
+    term_set_lookup_min_size=_term_set_lookup_min_size,
+    cache_capacity=_cache_capacity,
+    precomputed_ngd_table=_precomputed_ngd_table,
 )
 
-APP_LIST = [(r"/{pre}/{ver}/query/ngd?", "web.handlers.SemmedNGDHandler", urlspec_kwargs), *APP_LIST]
+APP_LIST = [
+    (
+        r"/{pre}/{ver}/admin/ngd/cache/?",
+        "web.handlers.SemmedNGDCacheHandler",
+        dict(urlspec_kwargs, admin_token=_cache_admin_token),
+    ),
+    (r"/{pre}/{ver}/query/ngd/matrix/?", "web.handlers.SemmedNGDMatrixHandler", urlspec_kwargs),
+    (r"/{pre}/{ver}/query/ngd?", "web.handlers.SemmedNGDHandler", urlspec_kwargs),
+    *APP_LIST,
+]
@@ -12,4 +12,6 @@ SMARTAPI_ID = "978fe380a147a8641caf72320862697b"
 
 ES_QUERY_PIPELINE = "web.pipeline.PendingQueryPipeline"
 ES_QUERY_BUILDER = "web.pipeline.PendingQueryBuilder"
+# once the index holds the canonical direction of the edges (web.graph.GraphObject.add_canonical_direction)
+# ES_QUERY_BUILDER = "web.pipeline.CanonicalGraphQueryBuilder"
 ES_RESULT_TRANSFORM = "web.pipeline.GraphResultTransform"
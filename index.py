@@ -28,6 +28,13 @@ define("address", default=None, help="host address to listen to, default to all
 define("autoreload", default=False, help="auto reload the web server when file change detected")
 define("conf", default="config", help="specify a config module name to import")
 define("dir", default=os.getcwd(), help="path to app directory that includes config.py")
+define("processes", default=1, help="number of pre-forked server processes, 0 for one per CPU core")
+define(
+    "compression",
+    default="",
+    help="comma separated response encodings to negotiate by order of preference (zstd,br,gzip), default to none",
+)
+define("compression_min_length", default=1024, help="minimum length in bytes of the compressed responses")
 
 
 def main(app_handlers: list = None, app_settings: dict = None, use_curl: bool = False):
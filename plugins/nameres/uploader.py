@@ -5,6 +5,7 @@ from biothings import config
 from biothings.hub.dataload.uploader import BaseSourceUploader
 from biothings.utils.manager import JobManager
 
+from .indexer import es_upload_process
 from .static import BASE_URL
 from .worker import upload_process
 
@@ -27,9 +28,14 @@ class NameResUploader(BaseSourceUploader):
         temp_collection_name = copy.deepcopy(self.temp_collection_name)
         self.unprepare()
 
-        job = await job_manager.defer_to_process(
-            pinfo, functools.partial(upload_process, data_folder, temp_collection_name)
-        )
+        # Stream the documents straight into elasticsearch rather than staging them in mongodb
+        es_upload = getattr(config, "DIRECT_ES_UPLOAD", {}).get(self.name, None)
+        if es_upload is not None:
+            upload_function = functools.partial(es_upload_process, data_folder, es_upload, self.get_mapping())
+        else:
+            upload_function = functools.partial(upload_process, data_folder, temp_collection_name)
+
+        job = await job_manager.defer_to_process(pinfo, upload_function)
 
         def uploaded(f):
             nonlocal got_error
@@ -41,6 +47,9 @@ class NameResUploader(BaseSourceUploader):
         if got_error:
             raise got_error
 
+        if es_upload is not None:
+            return job.result()
+
         self.switch_collection()
         self.clean_archived_collections()
 
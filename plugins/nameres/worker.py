@@ -14,6 +14,7 @@ from biothings.utils.dataload import merge_struct
 from biothings.utils.serializer import json_loads, json_dumps
 from biothings.utils.hub_db import get_src_db
 
+from .lines import iterate_file_lines
 from .static import NAMERES_UPLOAD_CHUNKS
 
 
@@ -50,7 +51,8 @@ def _build_offset_tasks(data_folder: Union[str, Path], collection_name: str):
     we want to read as a subset of the file processing.
 
     These are all generated in a queue that we continually feed to multiprocessing queue
-    that is continually uploading to the backend database
+    that is continually uploading to the backend database, i.e. this is a streaming producer
+    for the process pool in upload_process
     """
 
     def _populate_upload_arguments(input_file: Union[Path, str], num_partitions: int) -> list:
@@ -76,17 +78,18 @@ def _build_offset_tasks(data_folder: Union[str, Path], collection_name: str):
         logger.debug("File %s is empty. No partitions to generate", input_file)
         return []
 
-    thread_futures = []
+    # Each file is planned exactly once in the thread pool. The tasks of a file are yielded as soon as
+    # its plan is ready, so the uploads can start while the later files are still being planned
     with concurrent.futures.ThreadPoolExecutor() as executor:
+        thread_futures = []
         for filename, num_partitions in NAMERES_UPLOAD_CHUNKS.items():
             filepath = Path(data_folder).joinpath(filename).resolve().absolute()
             arguments = {"input_file": filepath, "num_partitions": num_partitions}
             future = executor.submit(_populate_upload_arguments, **arguments)
             thread_futures.append(future)
 
-    concurrent.futures.wait(thread_futures, timeout=None, return_when=concurrent.futures.ALL_COMPLETED)
-
-    yield from itertools.chain.from_iterable([future.result() for future in thread_futures])
+        for future in concurrent.futures.as_completed(thread_futures):
+            yield from future.result()
 
 
 def generate_file_offsets(file: Union[str, Path], num_partitions: int = None):
@@ -95,9 +98,12 @@ def generate_file_offsets(file: Union[str, Path], num_partitions: int = None):
 
     We're primarily interested in parallel processsing a file in batches for uploading
     to a database, so we don't need to store every offset as that would be a waste of memory.
-    Rather, based off the number of partitions we store the file size as we iterate over the file
-    so we can track the approximate percentage we've completed so we can store inteval markers while
-    chunking the file
+    Rather, based off the number of partitions we seek to evenly spaced byte offsets and scan
+    ahead to the next newline to store the interval markers while chunking the file. This is
+    O(partitions) rather than O(file) as we never read the file line by line
+
+    The index is cached next to the file and reused as long as the file signature (size, mtime, and
+    sampled block hashes) and the number of partitions are unchanged
     """
     if num_partitions is None:
         num_partitions = 10
@@ -106,56 +112,90 @@ def generate_file_offsets(file: Union[str, Path], num_partitions: int = None):
     file_size_bytes = file.stat().st_size
     file_index = file.with_suffix(".index")
 
-    if file_size_bytes > 0:
-        logger.debug("Calculating SHA256 hashsum for file: %s", file)
-        file_hash = sha256sum(file)
-
-        if file_index.exists():
-            with open(file_index, "r", encoding="utf-8") as index_handle:
-                previous_index = json_loads(index_handle.read())
-
-            if previous_index["hash"] == file_hash:
-                return previous_index["index"]
-
-            logger.debug(
-                "Different hash found for file %s [%s, %s] [previous, current]. "
-                "Updating file offsets with the new file",
-                file,
-                previous_index["hash"],
-                file_hash,
-            )
-
-        partitions = [0]
-        marker = file_size_bytes / num_partitions
-        progress_bytes = 0
-        with open(file, "rb") as handle:
-            while line := handle.readline():
-                if progress_bytes >= marker:
-                    partitions.append(handle.tell())
-                    progress_bytes = 0
-                else:
-                    progress_bytes += len(line)
-            partitions.append(handle.tell())
-        with open(file_index, "w", encoding="utf-8") as index_handle:
-            index_handle.write(json_dumps({"index": partitions, "hash": file_hash}))
-        return partitions
-
-
-def sha256sum(file: Union[str, Path], buffer_size: int = None):
+    if file_size_bytes == 0:
+        return None
+
+    file_signature = generate_file_signature(file)
+
+    if file_index.exists():
+        with open(file_index, "r", encoding="utf-8") as index_handle:
+            previous_index = json_loads(index_handle.read())
+
+        previous_signature = previous_index.get("signature", None)
+        if previous_signature == file_signature and previous_index.get("partitions", None) == num_partitions:
+            return previous_index["index"]
+
+        logger.debug(
+            "Different signature found for file %s [%s, %s] [previous, current]. "
+            "Updating file offsets with the new file",
+            file,
+            previous_signature,
+            file_signature,
+        )
+
+    partitions = find_partition_offsets(file, num_partitions)
+    with open(file_index, "w", encoding="utf-8") as index_handle:
+        index_handle.write(json_dumps({"index": partitions, "signature": file_signature, "partitions": num_partitions}))
+    return partitions
+
+
+def find_partition_offsets(file: Union[str, Path], num_partitions: int) -> list[int]:
+    """
+    Splits the file into (at most) num_partitions byte ranges aligned on line boundaries
+
+    For each evenly spaced byte offset we seek to the byte right before it and read the rest of
+    that line, so the partition boundary is always the start of a line. Boundaries landing in
+    the same line are collapsed, so very long lines can yield fewer partitions than requested
+    """
+    file_size_bytes = Path(file).stat().st_size
+
+    partitions = [0]
+    with open(file, "rb") as handle:
+        for partition in range(1, num_partitions):
+            marker = (file_size_bytes * partition) // num_partitions
+            if marker <= partitions[-1]:
+                continue
+
+            handle.seek(marker - 1)
+            handle.readline()
+            boundary = handle.tell()
+            if boundary >= file_size_bytes:
+                break
+            if boundary > partitions[-1]:
+                partitions.append(boundary)
+    partitions.append(file_size_bytes)
+    return partitions
+
+
+def generate_file_signature(file: Union[str, Path], num_samples: int = None, sample_size: int = None) -> str:
     """
-    Generates a sha256 hashsum for a file to determine if the previously generated
+    Generates a cheap signature for a file to determine if the previously generated
     index requires updating
+
+    Rather than hashing the entire file (multiple GB for the larger compendia), we hash
+    the file size, the modification time, and num_samples blocks of sample_size bytes at
+    evenly spaced offsets (including the first and last block of the file)
     """
-    if buffer_size is None:
-        buffer_size = 1024 * 128
+    if num_samples is None:
+        num_samples = 16
+
+    if sample_size is None:
+        sample_size = 1024 * 64
+
+    file_stat = Path(file).stat()
+    file_size_bytes = file_stat.st_size
 
     filehash = hashlib.sha256()
-    buffer = bytearray(buffer_size)
-    file_view = memoryview(buffer)
+    filehash.update(f"{file_size_bytes}:{file_stat.st_mtime_ns}".encode("utf-8"))
 
-    with open(file, "rb", buffering=0) as file_handle:
-        while n := file_handle.readinto(file_view):
-            filehash.update(file_view[:n])
+    with open(file, "rb") as file_handle:
+        last_sample_offset = max(file_size_bytes - sample_size, 0)
+        sample_offsets = sorted(
+            {(last_sample_offset * index) // max(num_samples - 1, 1) for index in range(num_samples)}
+        )
+        for sample_offset in sample_offsets:
+            file_handle.seek(sample_offset)
+            filehash.update(file_handle.read(sample_size))
     return filehash.hexdigest()
 
 
@@ -179,19 +219,12 @@ def subset_upload_worker(
     offset_start: int,
     offset_end: int,
     collection_name: str,
-) -> list[str]:
+) -> int:
     """
     Internal function for handling the multipart uploading of the file in partitions
 
     Accepts the file path, along with the chunk start and chunk end in bytes to determine
     what offset to start and stop at in the file
-
-    The conflation_connection is a static singular sqlite3 file located in the same directory as the
-    data files as it's generated post-dump. We can just derived it at run-time from the provided
-    data filepath
-
-    Afterwards the data processing is straight forward, we effectively don't transform the state of
-    the nameres files
     """
     logger.info("Starting bulk upload to backend %s [%s|%s]", input_file, offset_start, offset_end)
 
@@ -199,39 +232,48 @@ def subset_upload_worker(
     collection = pymongo.collection.Collection(database=upload_database, name=collection_name)
 
     total_upload = 0
-    with open(input_file, encoding="utf-8") as file_handle:
-        buffer = []
-        file_handle.seek(offset_start)
-        while file_handle.tell() < offset_end:
-            line = file_handle.readline()
-            doc = json_loads(line)
-            doc["_id"] = doc["curie"]
-            try:
-                doc["shortest_name_length"] = int(doc["shortest_name_length"])
-            except (TypeError, ValueError):
-                doc["shortest_name_length"] = 0
-
-            try:
-                doc["clique_identifier_count"] = int(doc["clique_identifier_count"])
-            except (TypeError, ValueError):
-                doc["clique_identifier_count"] = 0
+    for buffer, progress in iterate_partition_buffers(input_file, buffer_size, offset_start, offset_end):
+        total_upload += len(buffer)
+        _upload_buffer(collection, buffer, input_file, progress)
+    return total_upload
 
-            biolink_types = doc.pop("types", [])
-            doc["biolink_types"] = biolink_types
 
-            buffer.append(doc)
+def iterate_partition_buffers(input_file: Union[str, Path], buffer_size: int, offset_start: int, offset_end: int):
+    """
+    Reads the partition of the file and yields the buffers of (at most) buffer_size documents ready
+    to be uploaded, along with the progress within the partition
 
-            if len(buffer) >= buffer_size:
-                total_upload += len(buffer)
-                _upload_buffer(collection, buffer, input_file, file_handle.tell() / offset_end)
-                buffer = []
+    The lines are read as bytes in large blocks and parsed by orjson without any text decoding
 
-        if len(buffer) > 0:
-            total_upload += len(buffer)
-            _upload_buffer(collection, buffer, input_file, file_handle.tell() / offset_end)
+    Afterwards the data processing is straight forward, we effectively don't transform the state of
+    the nameres files
+    """
+    buffer = []
+    position = offset_start
+    for line, position in iterate_file_lines(input_file, offset_start, offset_end):
+        doc = json_loads(line)
+        doc["_id"] = doc["curie"]
+        try:
+            doc["shortest_name_length"] = int(doc["shortest_name_length"])
+        except (TypeError, ValueError):
+            doc["shortest_name_length"] = 0
+
+        try:
+            doc["clique_identifier_count"] = int(doc["clique_identifier_count"])
+        except (TypeError, ValueError):
+            doc["clique_identifier_count"] = 0
+
+        biolink_types = doc.pop("types", [])
+        doc["biolink_types"] = biolink_types
+
+        buffer.append(doc)
+
+        if len(buffer) >= buffer_size:
+            yield buffer, position / offset_end
             buffer = []
 
-    return total_upload
+    if len(buffer) > 0:
+        yield buffer, position / offset_end
 
 
 def _upload_buffer(
@@ -0,0 +1,229 @@
+"""
+Compact, read-only conflation lookup structure shared by the upload workers
+
+Rather than every worker querying the conflation sqlite3 database with thousands of bound
+parameters per buffer and splitting the comma-joined identifier strings, we build the map once
+in the main process and write it to a single binary file. Every worker memory-maps the file, so
+the pages are shared through the OS page cache, and performs O(1) lookups against an open
+addressing hash table without any SQL or string splitting
+
+File layout (all integers are little-endian uint64 unless stated otherwise):
+
+header          | magic, number of CURIEs (n), number of sets (m), hash table size (t),
+                | byte offsets of the 6 sections below
+curie_offsets   | uint64[n + 1] byte offsets of each interned CURIE into curie_bytes
+curie_sets      | uint64[n] conflation set of each CURIE id
+set_offsets     | uint64[m + 1] CURIE id ranges of each conflation set. The CURIEs of a set are
+                | interned contiguously, so set s holds the CURIE ids [set_offsets[s], set_offsets[s + 1])
+set_types       | uint8[m] conflation type of each set (index into CONFLATION_TYPES)
+table_slots     | uint64[t] open addressing hash table, each slot holds CURIE id + 1 (0 is empty)
+curie_bytes     | utf-8 bytes of all the interned CURIEs back to back
+"""
+
+import hashlib
+import mmap
+import sqlite3
+import struct
+from array import array
+from pathlib import Path
+from typing import Iterable, Optional, Union
+
+MAGIC = b"NNCONF02"
+HEADER_FORMAT = "<8s9Q"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+# The conflation types as stored in the conflation database and their key within the `c` field
+# of each identifier in the uploaded documents
+CONFLATION_TYPES = ("GeneProtein", "DrugChemical")
+CONFLATION_TYPE_KEYS = {"GeneProtein": "gp", "DrugChemical": "dc"}
+
+
+def _curie_hash(curie: bytes) -> int:
+    """
+    Stable 64-bit hash of a CURIE. The builtin hash is salted per process, so
+    we cannot use it for a structure shared between processes
+    """
+    return int.from_bytes(hashlib.blake2b(curie, digest_size=8).digest(), "little")
+
+
+def _align(offset: int, alignment: int = 8) -> int:
+    return (offset + alignment - 1) // alignment * alignment
+
+
+def build_conflation_map(conflation_sets: Iterable[tuple[list[str], str]], output: Union[str, Path]) -> Path:
+    """
+    Builds the conflation map file from an iterable of (identifiers, conflation type) pairs
+
+    Each CURIE is interned once. If a CURIE appears in more than one conflation set, the first
+    set is the one found by the lookup, matching the primary key semantics of the conflation database
+    """
+    output = Path(output).resolve().absolute()
+
+    curie_bytes = bytearray()
+    curie_offsets = array("Q", [0])
+    curie_sets = array("Q")
+    set_offsets = array("Q", [0])
+    set_types = bytearray()
+
+    for identifiers, conflation_type in conflation_sets:
+        for identifier in identifiers:
+            curie_bytes += identifier.encode("utf-8")
+            curie_offsets.append(len(curie_bytes))
+            curie_sets.append(len(set_types))
+        set_offsets.append(len(curie_offsets) - 1)
+        set_types.append(CONFLATION_TYPES.index(conflation_type))
+
+    num_curies = len(curie_offsets) - 1
+    num_sets = len(set_offsets) - 1
+
+    # power of two with a load factor of at most 0.5 to keep the probe sequences short
+    table_size = 1
+    while table_size < 2 * max(num_curies, 1):
+        table_size *= 2
+
+    table_slots = array("Q", bytes(8 * table_size))
+    mask = table_size - 1
+    curie_view = memoryview(curie_bytes)
+    for curie_id in range(num_curies):
+        curie = curie_view[curie_offsets[curie_id] : curie_offsets[curie_id + 1]]
+        slot = _curie_hash(curie) & mask
+        while table_slots[slot] != 0:
+            existing_id = table_slots[slot] - 1
+            if curie_view[curie_offsets[existing_id] : curie_offsets[existing_id + 1]] == curie:
+                break
+            slot = (slot + 1) & mask
+        else:
+            table_slots[slot] = curie_id + 1
+
+    curie_offsets_start = HEADER_SIZE
+    curie_sets_start = curie_offsets_start + 8 * len(curie_offsets)
+    set_offsets_start = curie_sets_start + 8 * len(curie_sets)
+    set_types_start = set_offsets_start + 8 * len(set_offsets)
+    table_slots_start = _align(set_types_start + len(set_types))
+    curie_bytes_start = table_slots_start + 8 * table_size
+
+    header = struct.pack(
+        HEADER_FORMAT,
+        MAGIC,
+        num_curies,
+        num_sets,
+        table_size,
+        curie_offsets_start,
+        curie_sets_start,
+        set_offsets_start,
+        set_types_start,
+        table_slots_start,
+        curie_bytes_start,
+    )
+
+    temporary_output = output.with_suffix(".tmp")
+    with open(temporary_output, "wb") as handle:
+        handle.write(header)
+        handle.write(curie_offsets.tobytes())
+        handle.write(curie_sets.tobytes())
+        handle.write(set_offsets.tobytes())
+        handle.write(set_types)
+        handle.write(bytes(table_slots_start - (set_types_start + len(set_types))))
+        handle.write(table_slots.tobytes())
+        handle.write(curie_bytes)
+    temporary_output.replace(output)
+    return output
+
+
+def build_conflation_map_from_database(conflation_database: Union[str, Path], output: Union[str, Path]) -> Path:
+    """
+    Builds the conflation map file from the conflation sqlite3 database generated by the dumper
+
+    Every conflation set is stored once in the database, so this is a single sequential scan
+    """
+
+    def _iterate_conflation_sets():
+        connection = sqlite3.connect(str(conflation_database))
+        try:
+            cursor = connection.execute("SELECT identifiers, type FROM conflation_sets ORDER BY set_id")
+            for identifiers, conflation_type in cursor:
+                yield identifiers.strip().split(","), conflation_type
+        finally:
+            connection.close()
+
+    return build_conflation_map(_iterate_conflation_sets(), output)
+
+
+class ConflationMap:
+    """
+    Read-only view over a memory-mapped conflation map file
+    """
+
+    def __init__(self, filepath: Union[str, Path]):
+        self.filepath = Path(filepath)
+        with open(self.filepath, "rb") as handle:
+            self._mmap = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (
+            magic,
+            self.num_curies,
+            self.num_sets,
+            self.table_size,
+            curie_offsets_start,
+            curie_sets_start,
+            set_offsets_start,
+            set_types_start,
+            table_slots_start,
+            curie_bytes_start,
+        ) = struct.unpack_from(HEADER_FORMAT, self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Invalid conflation map file {self.filepath}")
+
+        view = memoryview(self._mmap)
+        self._curie_offsets = view[curie_offsets_start:curie_sets_start].cast("Q")
+        self._curie_sets = view[curie_sets_start:set_offsets_start].cast("Q")
+        self._set_offsets = view[set_offsets_start:set_types_start].cast("Q")
+        self._set_types = view[set_types_start : set_types_start + self.num_sets]
+        self._table_slots = view[table_slots_start:curie_bytes_start].cast("Q")
+        self._curie_bytes = view[curie_bytes_start:]
+        self._mask = self.table_size - 1
+
+    def _curie(self, curie_id: int) -> memoryview:
+        return self._curie_bytes[self._curie_offsets[curie_id] : self._curie_offsets[curie_id + 1]]
+
+    def set_of(self, curie_id: int) -> int:
+        return self._curie_sets[curie_id]
+
+    def find_curie_id(self, curie: str) -> Optional[int]:
+        if self.num_curies == 0:
+            return None
+
+        encoded_curie = curie.encode("utf-8")
+        slot = _curie_hash(encoded_curie) & self._mask
+        while (entry := self._table_slots[slot]) != 0:
+            if self._curie(entry - 1) == encoded_curie:
+                return entry - 1
+            slot = (slot + 1) & self._mask
+        return None
+
+    def conflation_set(self, set_id: int) -> tuple[str, list[str]]:
+        """
+        Returns the conflation type and the (ordered) identifiers of the set
+        """
+        conflation_type = CONFLATION_TYPES[self._set_types[set_id]]
+        start, end = self._set_offsets[set_id], self._set_offsets[set_id + 1]
+        identifiers = [bytes(self._curie(curie_id)).decode("utf-8") for curie_id in range(start, end)]
+        return conflation_type, identifiers
+
+    def lookup(self, curie: str) -> Optional[tuple[str, list[str]]]:
+        """
+        Returns the conflation type and identifiers of the set containing the CURIE, if any
+        """
+        curie_id = self.find_curie_id(curie)
+        if curie_id is None:
+            return None
+        return self.conflation_set(self.set_of(curie_id))
+
+    def close(self):
+        self._curie_offsets.release()
+        self._curie_sets.release()
+        self._set_offsets.release()
+        self._set_types.release()
+        self._table_slots.release()
+        self._curie_bytes.release()
+        self._mmap.close()
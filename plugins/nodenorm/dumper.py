@@ -1,17 +1,21 @@
 import asyncio
 import concurrent.futures
-import json
 import os
 import sqlite3
+import time
 from pathlib import Path
 from functools import partial
 from typing import override, Union
 from urllib.parse import urlparse
 
+import requests
+
 from biothings import config
 from biothings.hub.dataload.dumper import DumperException, LastModifiedHTTPDumper
 from biothings.utils.manager import JobManager
+from biothings.utils.serializer import json_loads
 
+from .lines import iterate_file_lines
 from .static import (
     BASE_URL,
     CONFLATION_LOOKUP_DATABASE,
@@ -41,6 +45,9 @@ class NodeNormDumper(LastModifiedHTTPDumper):
     ARCHIVE = False
     SCHEDULE = None
 
+    # number of retries of a failed byte range request, resuming from the last byte written
+    DOWNLOAD_RANGE_RETRIES = 5
+
     def __init__(self, src_name: str = None, src_root_folder: str = None, log_folder: str = None, archive: bool = None):
         super().__init__(src_name, src_root_folder, log_folder, archive)
         self.to_dump_large = []
@@ -119,60 +126,47 @@ class NodeNormDumper(LastModifiedHTTPDumper):
         """
         logger.info("Downloading (large) file %s -> %s | Partitions %s", remoteurl, localfile, num_partitions)
         self.prepare_local_folders(localfile)
-
-        thread_futures = []
-        with concurrent.futures.ThreadPoolExecutor(max_workers=1 * os.cpu_count()) as executor:
-            chunks, chunk_size = self.get_range_chunks(remoteurl, num_partitions)
-
-            for index, chunk_start in enumerate(chunks):
-                chunk_end = chunk_start + (chunk_size - 1)
-                output_chunk = f"{localfile}.part{index}"
-
-                arguments = {"url": remoteurl, "start": chunk_start, "end": chunk_end, "output": output_chunk}
-                future = executor.submit(self.download_range, **arguments)
-                thread_futures.append(future)
-
-            concurrent.futures.wait(thread_futures, timeout=None, return_when=concurrent.futures.ALL_COMPLETED)
-            with open(localfile, "wb") as combined_output:
-                for index in range(len(chunks)):
-                    chunk_path = f"{localfile}.part{index}"
-
-                    with open(chunk_path, "rb") as partial_input:
-                        combined_output.write(partial_input.read())
-                    os.remove(chunk_path)
-                logger.info(f"Combined all chunks -> {localfile}")
+        self.download_ranges(remoteurl, localfile, num_partitions)
 
     def download(self, remoteurl: str, localfile: Union[str, Path], headers: dict = {}) -> None:
         """
         Handles downloading of remote files over HTTP to the local file system
 
         Leverages multiple threads to download the remote file in multiple chunks
-        concurrently and then combines them at the end
+        concurrently, each written in place into the local file
         """
         logger.info("Downloading (normal) file %s -> %s | Partitions %s", remoteurl, localfile, 10)
         self.prepare_local_folders(localfile)
+        self.download_ranges(remoteurl, localfile, 10)
 
-        thread_futures = []
-        with concurrent.futures.ThreadPoolExecutor(max_workers=1 * os.cpu_count()) as executor:
-            chunks, chunk_size = self.get_range_chunks(remoteurl, 10)
-
-            for index, chunk_start in enumerate(chunks):
-                chunk_end = chunk_start + (chunk_size - 1)
-                output_chunk = f"{localfile}.part{index}"
-
-                arguments = {"url": remoteurl, "start": chunk_start, "end": chunk_end, "output": output_chunk}
-                future = executor.submit(self.download_range, **arguments)
-                thread_futures.append(future)
-
-            concurrent.futures.wait(thread_futures, timeout=None, return_when=concurrent.futures.ALL_COMPLETED)
-            with open(localfile, "wb") as combined_output:
-                for index in range(len(chunks)):
-                    chunk_path = f"{localfile}.part{index}"
-
-                    with open(chunk_path, "rb") as partial_input:
-                        combined_output.write(partial_input.read())
-                    os.remove(chunk_path)
-                logger.info(f"Combined all chunks -> {localfile}")
+    def download_ranges(self, url: str, localfile: Union[str, Path], num_partitions: int) -> None:
+        """
+        Downloads the byte ranges of the remote file concurrently into a file preallocated
+        to the `Content-Length` of the remote file. Each thread writes its range in place with
+        `os.pwrite`, so there are no intermediary part files to combine afterwards
+        """
+        file_size = self.get_file_size(url)
+        byte_ranges = self.get_byte_ranges(file_size, num_partitions)
+
+        file_descriptor = os.open(localfile, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(file_descriptor, file_size)
+            workers = max(min(os.cpu_count(), len(byte_ranges)), 1)
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+                thread_futures = [
+                    executor.submit(self.download_range, url, start, end, file_descriptor) for start, end in byte_ranges
+                ]
+                downloaded_size = sum(future.result() for future in concurrent.futures.as_completed(thread_futures))
+            local_size = os.fstat(file_descriptor).st_size
+        finally:
+            os.close(file_descriptor)
+
+        if downloaded_size != file_size or local_size != file_size:
+            raise DumperException(
+                f"Incomplete download of '{url}' -> {localfile}: "
+                f"Content-Length {file_size} | downloaded {downloaded_size} | local size {local_size}"
+            )
+        logger.info("Downloaded all ranges -> %s (%s bytes)", localfile, file_size)
 
     def get_file_size(self, url: str) -> int:
         """
@@ -185,33 +179,69 @@ class NodeNormDumper(LastModifiedHTTPDumper):
         size = int(response.headers["Content-Length"])
         return size
 
-    def get_range_chunks(self, url: int, num_partitions: int = 10) -> tuple[range, int]:
+    def get_byte_ranges(self, file_size: int, num_partitions: int = 10) -> list[tuple[int, int]]:
         """
-        Partitions a file into distinct chunks for consuming each chunk within
-        a thread concurrently
+        Partitions a file into distinct inclusive byte ranges for consuming each range within
+        a thread concurrently. The last range always ends on the last byte of the file
         """
-        file_size = self.get_file_size(url)
-        chunk_size = int(file_size / num_partitions)
-        chunks = range(0, file_size, chunk_size)
-        return chunks, chunk_size
+        chunk_size = max(-(-file_size // max(num_partitions, 1)), 1)
+        return [(start, min(start + chunk_size, file_size) - 1) for start in range(0, file_size, chunk_size)]
 
-    def download_range(self, url: str, start: int, end: int, output: str) -> None:
-        self.logger.debug("Downloading Filepart '%s' as '%s'", url, output)
-        headers = {"Range": f"bytes={start}-{end}"}
-        response = self.client.get(url, headers=headers)
+    def download_range(self, url: str, start: int, end: int, file_descriptor: int) -> int:
+        """
+        Downloads the inclusive byte range [start, end] of the remote file and writes it at the same
+        offsets of the local file. A failed request is retried (up to DOWNLOAD_RANGE_RETRIES times)
+        from the first byte not written yet, rather than from the start of the range
 
-        if not response.status_code == 206:
-            raise DumperException(
-                "Error while downloading '%s' (status: %s, reason: %s)",
-                url,
-                response.status_code,
-                response.reason,
-            )
+        Returns the number of bytes written
+        """
+        offset = start
+        attempt = 0
+        while offset <= end:
+            try:
+                # The streamed response is closed (its connection released) whether the range completes or fails
+                with self.client.get(url, headers={"Range": f"bytes={offset}-{end}"}, stream=True) as response:
+                    if not response.status_code == 206:
+                        raise DumperException(
+                            f"Error while downloading '{url}' "
+                            f"(status: {response.status_code}, reason: {response.reason})"
+                        )
+                    expected_size = end - offset + 1
+                    content_length = int(response.headers.get("Content-Length", expected_size))
+                    if content_length != expected_size:
+                        raise DumperException(
+                            f"Unexpected Content-Length {content_length} for byte range [{offset}, {end}] of '{url}'"
+                        )
 
-        with open(output, "wb") as file_handle:
-            for response_part in response.iter_content(512 * 1024):
-                file_handle.write(response_part)
-        logger.info(f"Chunk Completed | {output} | Byte Range [{start}, {end}]")
+                    for response_part in response.iter_content(512 * 1024):
+                        view = memoryview(response_part)
+                        while view:
+                            written = os.pwrite(file_descriptor, view, offset)
+                            view = view[written:]
+                            offset += written
+
+                if offset <= end:
+                    raise DumperException(f"Connection closed at byte {offset} of range [{start}, {end}] of '{url}'")
+            except (requests.RequestException, DumperException) as download_error:
+                attempt += 1
+                if attempt > self.DOWNLOAD_RANGE_RETRIES:
+                    raise
+                logger.warning(
+                    "Retrying byte range [%s, %s] of '%s' from byte %s (attempt %s/%s): %s",
+                    start,
+                    end,
+                    url,
+                    offset,
+                    attempt,
+                    self.DOWNLOAD_RANGE_RETRIES,
+                    download_error,
+                )
+                time.sleep(min(2**attempt, 60))
+
+        if offset != end + 1:
+            raise DumperException(f"Received {offset - start} bytes for byte range [{start}, {end}] of '{url}'")
+        logger.info(f"Chunk Completed | {url} | Byte Range [{start}, {end}]")
+        return offset - start
 
     def set_release(self) -> None:
         """
@@ -232,66 +262,94 @@ class NodeNormDumper(LastModifiedHTTPDumper):
         Takes the generated conflation files and creates a sqlite3 database used for looking
         up the conflation identifiers for the supported types of nodes
 
-        Finds the identifiers and then flattens so each identifier found within the conflation list
-        points back to the same list of identifiers, so every CURIE within the list points to the
-        same list
+        Every conflation set (line of the conflation files) is stored once, and each identifier
+        found within the conflation list points back to its set, so storage grows linearly with the
+        number of identifiers rather than repeating the whole list for every member
 
         Example:
-        conflation  | identifiers
-        identifier0 | identifer0,identifer1,identifer2,identifer3,identifer4
-        identifier1 | identifer0,identifer1,identifer2,identifer3,identifer4
-        identifier2 | identifer0,identifer1,identifer2,identifer3,identifer4
-        identifier3 | identifer0,identifer1,identifer2,identifer3,identifer4
-        identifier4 | identifer0,identifer1,identifer2,identifer3,identifer4
+        conflation_sets
+        set_id | type        | identifiers
+        0      | GeneProtein | identifer0,identifer1,identifer2
+
+        conflation_members
+        conflation  | set_id
+        identifier0 | 0
+        identifier1 | 0
+        identifier2 | 0
+
+        The files are streamed and inserted in bounded batches within a single transaction. If an
+        identifier appears in several sets, the first set is kept
         """
         conflation_database_path = data_directory.joinpath(CONFLATION_LOOKUP_DATABASE).resolve().absolute()
         conflation_database = sqlite3.connect(conflation_database_path)
         cursor = conflation_database.cursor()
 
-        enable_foreign_keys = "PRAGMA foreign_keys = ON;"
-        cursor.execute(enable_foreign_keys)
-        conflation_existance_check = "DROP TABLE IF EXISTS conflations"
-        cursor.execute(conflation_existance_check)
+        # The database is rebuilt from scratch on failure, so no need for the rollback journal
+        cursor.execute("PRAGMA journal_mode = OFF;")
+        cursor.execute("PRAGMA synchronous = OFF;")
+        cursor.execute("PRAGMA foreign_keys = ON;")
+        cursor.execute("DROP TABLE IF EXISTS conflations")
+        cursor.execute("DROP TABLE IF EXISTS conflation_members")
+        cursor.execute("DROP TABLE IF EXISTS conflation_sets")
 
-        conflations_table = (
-            "CREATE TABLE conflations "
+        conflation_sets_table = (
+            "CREATE TABLE conflation_sets "
             "("
-            "conflation text PRIMARY KEY NOT NULL, "
-            "identifiers text NOT NULL, "
-            "type text NOT NULL"
+            "set_id INTEGER PRIMARY KEY NOT NULL, "
+            "type text NOT NULL, "
+            "identifiers text NOT NULL"
             ");"
         )
-        cursor.execute(conflations_table)
+        cursor.execute(conflation_sets_table)
+
+        conflation_members_table = (
+            "CREATE TABLE conflation_members "
+            "("
+            "conflation text PRIMARY KEY NOT NULL, "
+            "set_id INTEGER NOT NULL REFERENCES conflation_sets(set_id)"
+            ") WITHOUT ROWID;"
+        )
+        cursor.execute(conflation_members_table)
 
         conflation_files = [
             data_directory.joinpath("GeneProtein.txt").resolve().absolute(),
             data_directory.joinpath("DrugChemical.txt").resolve().absolute(),
         ]
+        set_statement = "INSERT INTO conflation_sets VALUES (?, ?, ?)"
+        member_statement = "INSERT OR IGNORE INTO conflation_members VALUES (?, ?)"
+
+        cursor.execute("BEGIN")
+        set_id = 0
+        set_batch = []
+        member_batch = []
         for conflation_file in conflation_files:
             if not conflation_file.exists():
                 raise OSError(f"Unable to locate conflation file {conflation_file}")
 
-            with open(conflation_file, "r", encoding="utf-8") as handle:
-                batch = []
-                for line in handle.readlines():
-                    identifiers = json.loads(line)
-
-                    # There have been bugs in the past with Babel where duplicate identifiers appear
-                    # on the line. This ensures we have unique identifiers in the original order
-                    cleaned_identifiers = list(dict.fromkeys(identifiers))
-
-                    identifiers_repr = ",".join(cleaned_identifiers)
-                    for identifier in cleaned_identifiers:
-                        batch.append(
-                            {"conflation": identifier, "identifiers": identifiers_repr, "type": conflation_file.stem}
-                        )
-
-                    if len(batch) >= 10000:
-                        cursor.executemany("INSERT INTO conflations VALUES (:conflation, :identifiers, :type)", batch)
-                        batch = []
-
-        if len(batch) > 0:
-            cursor.executemany("INSERT INTO conflations VALUES (:conflation, :identifiers, :type)", batch)
-            batch = []
+            for line, _ in iterate_file_lines(conflation_file):
+                identifiers = json_loads(line)
+
+                # There have been bugs in the past with Babel where duplicate identifiers appear
+                # on the line. This ensures we have unique identifiers in the original order
+                cleaned_identifiers = list(dict.fromkeys(identifiers))
+
+                set_batch.append((set_id, conflation_file.stem, ",".join(cleaned_identifiers)))
+                member_batch.extend((identifier, set_id) for identifier in cleaned_identifiers)
+                set_id += 1
+
+                # The sets are always written before the members referencing them (foreign key)
+                if len(set_batch) >= 10000 or len(member_batch) >= 10000:
+                    cursor.executemany(set_statement, set_batch)
+                    set_batch = []
+                if len(member_batch) >= 10000:
+                    cursor.executemany(member_statement, member_batch)
+                    member_batch = []
+
+        if len(set_batch) > 0:
+            cursor.executemany(set_statement, set_batch)
+        if len(member_batch) > 0:
+            cursor.executemany(member_statement, member_batch)
         conflation_database.commit()
         conflation_database.close()
+        logger.info("Created conflation database %s with %s conflation sets", conflation_database_path, set_id)
+        return conflation_database_path
@@ -0,0 +1,156 @@
+"""
+In-stream CURIE duplicate detection for the nodenorm upload
+
+Every identifier streamed by the upload workers is fed to a bloom filter. An identifier the filter
+reports as (probably) already seen is added to an exact set of duplicate candidates. Only the
+candidates are resolved against the backend database once the upload completes, rather than
+counting every identifier in a database and querying each duplicate one by one
+
+The bit array of the bloom filter lives in shared memory, so the upload workers feed the same
+filter directly and only send their duplicate candidates to the main process
+
+The candidates are a superset of the real duplicates (false positive rate of the bloom filter),
+which is fine as the resolution is a no-op for CURIEs found in a single document entry
+"""
+
+import contextlib
+import ctypes
+import hashlib
+import math
+import multiprocessing
+from collections import Counter
+from typing import Iterable
+
+# Upper bound of the bit array (256 MiB, ~220M identifiers at a 1% false positive rate). Past it the false positive
+# rate goes up, i.e. more (false) duplicate candidates, rather than the shared memory of the upload
+MAX_FILTER_BYTES = 256 * 1024 * 1024
+
+
+class BloomFilter:
+    """
+    Bloom filter over a flat bit array using double hashing (Kirsch-Mitzenmacher) to
+    derive the num_hashes bit positions from a single 128-bit digest
+
+    The bit array is either private to the process or a shared ctypes array (see `shared`),
+    which child processes attach to with `BloomFilter(num_bits, num_hashes, shared_bits)`
+    """
+
+    def __init__(self, num_bits: int, num_hashes: int, shared_bits: ctypes.Array = None):
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.shared_bits = shared_bits
+        if shared_bits is None:
+            self.bits = bytearray((num_bits + 7) // 8)
+        else:
+            self.bits = memoryview(shared_bits).cast("B")
+
+    @staticmethod
+    def optimal_size(
+        capacity: int, false_positive_rate: float = 0.01, max_bytes: int = MAX_FILTER_BYTES
+    ) -> tuple[int, int]:
+        """
+        Returns the number of bits and hashes for the expected number of items and false positive rate,
+        the number of bits being capped to `max_bytes`
+        """
+        capacity = max(capacity, 1)
+        num_bits = math.ceil(-capacity * math.log(false_positive_rate) / (math.log(2) ** 2))
+        num_bits = min(num_bits, max_bytes * 8)
+        num_hashes = max(round(num_bits / capacity * math.log(2)), 1)
+        return num_bits, num_hashes
+
+    @staticmethod
+    def expected_false_positive_rate(num_bits: int, num_hashes: int, capacity: int) -> float:
+        return (1 - math.exp(-num_hashes * capacity / num_bits)) ** num_hashes
+
+    @classmethod
+    def from_capacity(
+        cls, capacity: int, false_positive_rate: float = 0.01, shared: bool = False, max_bytes: int = MAX_FILTER_BYTES
+    ) -> "BloomFilter":
+        num_bits, num_hashes = cls.optimal_size(capacity, false_positive_rate, max_bytes)
+        shared_bits = None
+        if shared:
+            # zero-initialized anonymous shared memory inherited by the worker processes
+            shared_bits = multiprocessing.RawArray(ctypes.c_ubyte, (num_bits + 7) // 8)
+        return cls(num_bits, num_hashes, shared_bits)
+
+    def positions(self, item: str) -> list[int]:
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        first_hash = int.from_bytes(digest[:8], "little")
+        second_hash = int.from_bytes(digest[8:], "little") | 1
+        return [(first_hash + index * second_hash) % self.num_bits for index in range(self.num_hashes)]
+
+    def add_positions(self, positions: list[int]) -> bool:
+        """
+        Sets the bit positions of an item and returns whether they were all already set,
+        i.e. whether the item was (probably) already present
+        """
+        present = True
+        for position in positions:
+            byte_index, bit_mask = position >> 3, 1 << (position & 7)
+            if not self.bits[byte_index] & bit_mask:
+                present = False
+                self.bits[byte_index] |= bit_mask
+        return present
+
+    def add(self, item: str) -> bool:
+        """
+        Adds the item and returns whether it was (probably) already present
+        """
+        return self.add_positions(self.positions(item))
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(item))
+
+
+class CurieDuplicateDetector:
+    """
+    Bloom filter of every identifier seen plus the exact set of the duplicate candidates
+    """
+
+    def __init__(
+        self, capacity: int, false_positive_rate: float = 0.01, shared: bool = False, max_bytes: int = MAX_FILTER_BYTES
+    ):
+        self.bloom_filter = BloomFilter.from_capacity(capacity, false_positive_rate, shared=shared, max_bytes=max_bytes)
+        self.candidates = set()
+
+    def add(self, identifiers: Iterable[str]) -> list[str]:
+        """
+        Feeds the identifiers to the detector and returns the new duplicate candidates
+        """
+        new_candidates = []
+        for identifier in identifiers:
+            if self.bloom_filter.add(identifier) and identifier not in self.candidates:
+                self.candidates.add(identifier)
+                new_candidates.append(identifier)
+        return new_candidates
+
+    def add_candidates(self, candidates: Iterable[str]) -> list[str]:
+        """
+        Merges the duplicate candidates found by a worker and returns the new ones
+        """
+        new_candidates = []
+        for identifier in candidates:
+            if identifier not in self.candidates:
+                self.candidates.add(identifier)
+                new_candidates.append(identifier)
+        return new_candidates
+
+
+def find_duplicate_candidates(identifiers: list[str], bloom_filter: BloomFilter, lock=None) -> list[str]:
+    """
+    Worker side of the duplicate detection for a batch of identifiers
+
+    The identifiers are counted locally first, so the identifiers repeated within the batch are exact
+    duplicates and every distinct identifier is fed to the shared bloom filter only once. The hashes
+    are computed outside of the lock, which only guards the test-and-set of the bits so two workers
+    feeding the same identifier at the same time cannot both miss it
+    """
+    identifier_counts = Counter(identifiers)
+    candidates = [identifier for identifier, count in identifier_counts.items() if count > 1]
+
+    identifier_positions = [(identifier, bloom_filter.positions(identifier)) for identifier in identifier_counts]
+    with lock if lock is not None else contextlib.nullcontext():
+        for identifier, positions in identifier_positions:
+            if bloom_filter.add_positions(positions) and identifier_counts[identifier] == 1:
+                candidates.append(identifier)
+    return candidates
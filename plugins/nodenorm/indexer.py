@@ -0,0 +1,288 @@
+"""
+Direct-to-Elasticsearch upload mode
+
+The nodenorm compendia are already in their final document shape, so staging them in MongoDB
+before the hub indexes them into Elasticsearch roughly doubles the I/O of a release. When the
+source is listed in the DIRECT_ES_UPLOAD hub configuration, the workers instead stream `_bulk`
+requests straight into a new index:
+
+1. create the index with the refresh disabled and no replicas
+2. stream the partitions of every file into the index from the process pool
+3. restore the refresh interval and the replicas, refresh the index
+4. resolve the CURIE duplication in the index and swap the alias
+
+DIRECT_ES_UPLOAD = {
+    "nodenorm": {
+        "host": "http://localhost:9200",
+        "alias": "pending-nodenorm",
+        "number_of_replicas": 1,
+        # the indices previously behind the alias are kept unless enabled
+        "delete_previous_indices": False,
+        "args": {"request_timeout": 300, "retry_on_timeout": True, "max_retries": 10},
+    },
+}
+
+The duplicate CURIEs are detected in-stream and resolved as with the MongoDB upload, and documents
+sharing an _id are merged the same way. The upload checkpoints are specific to the MongoDB upload
+and aren't applied in this mode
+"""
+
+import concurrent.futures
+import os
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Union
+
+from elasticsearch import Elasticsearch
+from elasticsearch.helpers import scan
+
+from biothings import config
+from biothings.hub.dataindex.indexer_payload import DEFAULT_INDEX_MAPPINGS, DEFAULT_INDEX_SETTINGS
+from biothings.utils.common import iter_n
+from biothings.utils.dataload import merge_struct
+from biothings.utils.serializer import json_dumps
+
+from .duplication import CurieDuplicateDetector
+from .worker import (
+    _build_offset_tasks,
+    _find_duplicate_candidates,
+    _initialize_upload_worker,
+    create_conflation_map,
+    create_duplicate_detector,
+    iterate_partition_buffers,
+    resolve_curie_duplication,
+    upload_worker_arguments,
+)
+
+
+logger = config.logger
+
+
+def es_upload_process(data_folder: Union[str, Path], es_upload: dict, mapping: dict) -> int:
+    """
+    Uploads the files of the data folder into a new index and points the alias to it. The new index
+    is deleted if any step fails before the alias points to it
+    """
+    client = _es_client(es_upload)
+    index_name = f"{es_upload['alias']}_{time.strftime('%Y%m%d_%H%M%S')}"
+
+    try:
+        create_upload_index(client, index_name, mapping)
+        create_conflation_map(data_folder)
+        duplicate_detector = create_duplicate_detector(data_folder)
+
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=1 * os.cpu_count(),
+            initializer=_initialize_upload_worker,
+            initargs=upload_worker_arguments(duplicate_detector),
+        ) as executor:
+            process_futures = []
+            for task in _build_offset_tasks(data_folder, collection_name=None):
+                task.pop("collection_name")
+                future = executor.submit(es_subset_upload_worker, index_name=index_name, es_upload=es_upload, **task)
+                process_futures.append(future)
+
+            total_document_count = 0
+            for index, future in enumerate(concurrent.futures.as_completed(process_futures)):
+                document_count, worker_candidates = future.result()
+                duplicate_detector.add_candidates(worker_candidates)
+                total_document_count += document_count
+                logger.debug(
+                    "Task %s completed | Indexed %s documents | Total documents %s | Duplicate candidates %s",
+                    index,
+                    document_count,
+                    total_document_count,
+                    len(duplicate_detector.candidates),
+                )
+
+        finalize_upload_index(client, index_name, es_upload.get("number_of_replicas", 1))
+        cleanup_index_curie_duplication(client, index_name, duplicate_detector)
+        swap_index_alias(client, es_upload["alias"], index_name, es_upload.get("delete_previous_indices", False))
+    except Exception as gen_exc:
+        logger.exception(gen_exc)
+        client.indices.delete(index=index_name, ignore_unavailable=True)
+        raise gen_exc
+    return int(total_document_count)
+
+
+def _es_client(es_upload: dict) -> Elasticsearch:
+    return Elasticsearch(es_upload["host"], **es_upload.get("args", {}))
+
+
+def create_upload_index(client: Elasticsearch, index_name: str, mapping: dict) -> None:
+    """
+    Creates the index with the hub default settings (analysis, normalizers) and mappings, tuned
+    for the bulk load: no refresh and no replicas until the load completes
+    """
+    settings = {**DEFAULT_INDEX_SETTINGS, "refresh_interval": "-1", "number_of_replicas": 0}
+    mappings = {**DEFAULT_INDEX_MAPPINGS, "properties": {**DEFAULT_INDEX_MAPPINGS["properties"], **mapping}}
+    logger.info("Creating index %s for the direct upload", index_name)
+    client.indices.create(index=index_name, settings={"index": settings}, mappings=mappings)
+
+
+def finalize_upload_index(client: Elasticsearch, index_name: str, number_of_replicas: int) -> None:
+    logger.info("Restoring refresh interval and %s replicas on index %s", number_of_replicas, index_name)
+    client.indices.put_settings(
+        index=index_name, settings={"index": {"refresh_interval": None, "number_of_replicas": number_of_replicas}}
+    )
+    client.indices.refresh(index=index_name)
+
+
+def swap_index_alias(client: Elasticsearch, alias: str, index_name: str, delete_previous: bool = False) -> None:
+    """
+    Atomically points the alias to the new index. The previous indices of the alias are kept
+    (e.g. to roll back the release) unless delete_previous is set
+    """
+    previous_indices = []
+    if client.indices.exists_alias(name=alias):
+        previous_indices = list(client.indices.get_alias(name=alias).keys())
+
+    actions = [{"remove": {"index": previous_index, "alias": alias}} for previous_index in previous_indices]
+    actions.append({"add": {"index": index_name, "alias": alias}})
+    client.indices.update_aliases(actions=actions)
+    logger.info("Alias %s swapped from %s to %s", alias, previous_indices, index_name)
+
+    # The alias points to the new index from here on, so failing to delete a previous index
+    # doesn't fail the upload
+    if delete_previous:
+        for previous_index in previous_indices:
+            if previous_index != index_name:
+                logger.info("Deleting index %s previously behind alias %s", previous_index, alias)
+                try:
+                    client.indices.delete(index=previous_index, ignore_unavailable=True)
+                except Exception as delete_exc:
+                    logger.warning("Unable to delete index %s: %s", previous_index, delete_exc)
+
+
+def cleanup_index_curie_duplication(
+    client: Elasticsearch, index_name: str, duplicate_detector: CurieDuplicateDetector
+) -> None:
+    """
+    Handle the CURIE duplication directly in the index, the same way as in the mongodb collection
+    (see worker.cleanup_curie_duplication)
+
+    The index was refreshed by finalize_upload_index, so the documents of each batch of candidates
+    are found by a single `terms` query. It's refreshed again once the resolutions are written
+    """
+    logger.info("Handling CURIE duplication issue in index %s", index_name)
+
+    total_correction_count = 0
+    for task_id, curie_batch in enumerate(iter_n(sorted(duplicate_detector.candidates), 1000)):
+        query = {"query": {"terms": {"identifiers.i": list(curie_batch)}}}
+        candidate_documents = (
+            {**hit["_source"], "_id": hit["_id"]} for hit in scan(client, index=index_name, query=query)
+        )
+        replaced, deleted = resolve_curie_duplication(task_id, curie_batch, candidate_documents)
+
+        operations = []
+        for _id in deleted:
+            operations.append(json_dumps({"delete": {"_index": index_name, "_id": _id}}))
+        for document in replaced:
+            operations.append(json_dumps({"index": {"_index": index_name, "_id": document.pop("_id")}}))
+            operations.append(json_dumps(document))
+        if len(operations) > 0:
+            operations.append("")
+            _check_bulk_response(client.bulk(operations="\n".join(operations)), index_name)
+
+        total_correction_count += len(replaced) + len(deleted)
+        logger.debug(
+            "Task %s completed | Corrected %s documents | Total corrections %s",
+            task_id,
+            len(replaced) + len(deleted),
+            total_correction_count,
+        )
+    client.indices.refresh(index=index_name)
+
+
+def es_subset_upload_worker(
+    input_file: Union[str, Path],
+    buffer_size: int,
+    offset_start: int,
+    offset_end: int,
+    index_name: str,
+    es_upload: dict,
+    conflation_map: str = None,
+) -> tuple[int, list[str]]:
+    """
+    Internal function for handling the multipart indexing of the file in partitions
+
+    Returns the number of documents indexed and the duplicate candidates found by this worker
+    """
+    logger.info("Starting bulk indexing to %s %s [%s|%s]", index_name, input_file, offset_start, offset_end)
+    client = _es_client(es_upload)
+
+    total_upload = 0
+    duplicate_candidates = set()
+    partition_buffers = iterate_partition_buffers(input_file, buffer_size, offset_start, offset_end, conflation_map)
+    for buffer, identifiers, progress in partition_buffers:
+        total_upload += len(buffer)
+        _index_buffer(client, index_name, buffer, input_file, progress)
+        duplicate_candidates.update(_find_duplicate_candidates(identifiers))
+    client.close()
+    return total_upload, list(duplicate_candidates)
+
+
+def _index_buffer(
+    client: Elasticsearch, index_name: str, buffer: list[dict], input_file: Union[str, Path], progress: float
+):
+    """
+    Sends the buffer as a single NDJSON `_bulk` request of create actions. Documents with an
+    _id already indexed are rejected by the create action and merged afterwards
+    """
+    t0 = time.perf_counter()
+    documents = []
+    operations = []
+    for document in buffer:
+        _id = document.pop("_id")
+        documents.append(document)
+        operations.append(json_dumps({"create": {"_index": index_name, "_id": _id}}))
+        operations.append(json_dumps(document))
+    operations.append("")
+
+    response = client.bulk(operations="\n".join(operations))
+    if response["errors"]:
+        # the items of the response are in the order of the operations, a buffer possibly holding
+        # several documents with the same _id
+        conflicts = defaultdict(list)
+        for document, item in zip(documents, response["items"]):
+            result = item["create"]
+            if result["status"] == 409:
+                conflicts[result["_id"]].append(document)
+            elif result.get("error") is not None:
+                raise RuntimeError(f"Unable to index document {result['_id']} into {index_name}: {result['error']}")
+        _handle_bulk_conflicts(client, index_name, conflicts)
+
+    logger.debug(
+        "bulk index #[%d] in [%3.4f]s | file %s subset progress: %1.3f%%",
+        len(buffer),
+        time.perf_counter() - t0,
+        input_file.name,
+        progress * 100,
+    )
+
+
+def _handle_bulk_conflicts(client: Elasticsearch, index_name: str, conflicts: dict[str, list[dict]]):
+    """
+    Merges all the documents rejected for an existing _id into the indexed documents
+    """
+    logger.debug("Fixing %d records ", len(conflicts))
+    response = client.mget(index=index_name, ids=list(conflicts.keys()))
+
+    operations = []
+    for existing in response["docs"]:
+        merged = existing["_source"]
+        for document in conflicts[existing["_id"]]:
+            merged = merge_struct(document, merged)
+        operations.append(json_dumps({"index": {"_index": index_name, "_id": existing["_id"]}}))
+        operations.append(json_dumps(merged))
+    operations.append("")
+    _check_bulk_response(client.bulk(operations="\n".join(operations)), index_name)
+
+
+def _check_bulk_response(response: dict, index_name: str) -> None:
+    if response["errors"]:
+        for item in response["items"]:
+            action, result = next(iter(item.items()))
+            if result.get("error") is not None:
+                raise RuntimeError(f"Unable to {action} document {result['_id']} in {index_name}: {result['error']}")
@@ -0,0 +1,48 @@
+"""
+Byte-oriented line reader for the upload workers
+
+Reading the partitions in text mode decodes every byte to `str` before the JSON parser encodes it
+back to UTF-8, and `readline` / `tell` on a text handle are comparatively slow. Instead we read
+large binary blocks and split them on newlines, so each line reaches the JSON parser (orjson
+parses `bytes` directly) without any text decoding
+"""
+
+from pathlib import Path
+from typing import Iterator, Union
+
+DEFAULT_BLOCK_SIZE = 8 * 1024 * 1024
+
+
+def iterate_file_lines(
+    file: Union[str, Path], offset_start: int = 0, offset_end: int = None, block_size: int = None
+) -> Iterator[tuple[bytes, int]]:
+    """
+    Yields the (non-empty) lines of the file between the byte offsets, without their trailing
+    newline, along with the byte offset read so far (the end of the current block) for progress
+
+    The offsets are expected to be line boundaries, as generated by find_partition_offsets
+    """
+    if offset_end is None:
+        offset_end = Path(file).stat().st_size
+
+    if block_size is None:
+        block_size = DEFAULT_BLOCK_SIZE
+
+    with open(file, "rb") as handle:
+        handle.seek(offset_start)
+        position = offset_start
+        remainder = b""
+        while position < offset_end:
+            block = handle.read(min(block_size, offset_end - position))
+            if not block:
+                break
+            position += len(block)
+
+            lines = (remainder + block).split(b"\n")
+            remainder = lines.pop()
+            for line in lines:
+                if line:
+                    yield line, position
+
+        if remainder:
+            yield remainder, position
@@ -3,6 +3,7 @@ Static defintions for urls and file locations
 """
 
 CONFLATION_LOOKUP_DATABASE = "conflation.sqlite3"
+CONFLATION_LOOKUP_MAP = "conflation.map"
 IDENTIFIER_LOOKUP_DATABASE = "identifier.sqlite3"
 PRIOR_URL = [
     "https://stars.renci.org/var/babel_outputs/2025mar31/",
@@ -1,14 +1,15 @@
 import concurrent.futures
-import copy
 import hashlib
 import itertools
 import json
+import multiprocessing
 import os
+import re
 import sqlite3
 import time
 from collections import defaultdict
 from pathlib import Path
-from typing import Union
+from typing import Iterable, Union
 
 import pymongo
 from pymongo.errors import BulkWriteError
@@ -19,8 +20,12 @@ from biothings.utils.serializer import json_loads
 from biothings.utils.hub_db import get_src_db
 from biothings.utils.common import iter_n
 
+from .conflation import CONFLATION_TYPE_KEYS, ConflationMap, build_conflation_map_from_database
+from .duplication import BloomFilter, CurieDuplicateDetector, find_duplicate_candidates
+from .lines import iterate_file_lines
 from .static import (
     CONFLATION_LOOKUP_DATABASE,
+    CONFLATION_LOOKUP_MAP,
     DRUG_CHEMICAL_IDENTIFIER_FILES,
     GENE_PROTEIN_IDENTIFER_FILES,
     IDENTIFIER_LOOKUP_DATABASE,
@@ -30,37 +35,75 @@ from .static import (
 
 logger = config.logger
 
+# Conflation maps opened by this (worker) process, keyed by filepath. Every task submitted to the same
+# worker process reuses the memory mapping instead of reopening the file
+_CONFLATION_MAPS = {}
+
+# Shared bloom filter of the duplicate detection and the lock guarding its bits, attached once
+# per worker process by _initialize_upload_worker
+_DUPLICATE_FILTER = None
+_DUPLICATE_FILTER_LOCK = None
+
+# The number of identifiers of a file is estimated from the identifier entries ({"i": <CURIE>, ...})
+# found in its first bytes
+IDENTIFIER_SAMPLE_BYTES = 16 * 1024 * 1024
+IDENTIFIER_ENTRY_PATTERN = re.compile(rb'"i"\s*:')
 
-def upload_process(data_folder: Union[str, Path], collection_name: str) -> int:
-    create_identifiers_table(data_folder)
 
-    with concurrent.futures.ProcessPoolExecutor(max_workers=1 * os.cpu_count()) as executor:
-        process_futures = []
+def upload_process(data_folder: Union[str, Path], collection_name: str) -> int:
+    completed_partitions = prepare_upload_checkpoint(data_folder, collection_name)
+    create_conflation_map(data_folder)
+
+    duplicate_detector = create_duplicate_detector(data_folder)
+    if len(completed_partitions) > 0:
+        rebuild_duplicate_detector(duplicate_detector, data_folder, collection_name)
+
+    worker_arguments = upload_worker_arguments(duplicate_detector)
+    identifier_connection = connect_identifier_database(data_folder)
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=1 * os.cpu_count(), initializer=_initialize_upload_worker, initargs=worker_arguments
+    ) as executor:
+        process_futures = {}
+        total_document_count = sum(completed_partitions.values())
         for index, task in enumerate(_build_offset_tasks(data_folder, collection_name)):
+            # Partitions interrupted midway are uploaded again. The documents already inserted fail
+            # as duplicates and merging identical documents in _handle_bulk_write_error is a no-op
+            partition = (str(task["input_file"]), task["offset_start"], task["offset_end"])
+            if partition in completed_partitions:
+                logger.debug("Skipping completed partition %s [%s|%s]", *partition)
+                continue
             future = executor.submit(subset_upload_worker, **task)
-            process_futures.append(future)
+            process_futures[future] = partition
 
-        total_document_count = 0
+        file_signatures = {}
         for index, future in enumerate(concurrent.futures.as_completed(process_futures)):
             try:
-                identifiers = future.result()
+                identifier_count, worker_candidates = future.result()
             except Exception as gen_exc:
                 logger.exception(gen_exc)
                 raise gen_exc
             else:
-                update_identifier_collection(data_folder, identifiers)
-                total_document_count += len(identifiers)
+                input_file = process_futures[future][0]
+                if input_file not in file_signatures:
+                    file_signatures[input_file] = generate_file_signature(input_file)
+
+                duplicate_candidates = duplicate_detector.add_candidates(worker_candidates)
+                checkpoint = (*process_futures[future], file_signatures[input_file], identifier_count)
+                update_identifier_collection(identifier_connection, duplicate_candidates, checkpoint)
+                total_document_count += identifier_count
                 logger.debug(
-                    "Task %s completed | Update %s identifiers | Total identifiers %s",
+                    "Task %s completed | Update %s identifiers | Total identifiers %s | Duplicate candidates %s",
                     index,
-                    len(identifiers),
+                    identifier_count,
                     total_document_count,
+                    len(duplicate_detector.candidates),
                 )
-                del identifiers
+                del worker_candidates
+    identifier_connection.close()
 
     create_mongo_identifiers_index(collection_name)
-    create_identifiers_index(data_folder)
     cleanup_curie_duplication(data_folder, collection_name)
+    clear_upload_checkpoint(data_folder)
     return int(total_document_count)
 
 
@@ -70,15 +113,18 @@ def _build_offset_tasks(data_folder: Union[str, Path], collection_name: str):
     we want to read as a subset of the file processing.
 
     These are all generated in a queue that we continually feed to multiprocessing queue
-    that is continually uploading to the backend database
+    that is continually uploading to the backend database, i.e. this is a streaming producer
+    for the process pool in upload_process
     """
 
     def _populate_upload_arguments(input_file: Union[Path, str], num_partitions: int) -> list:
         logger.info("Analyzing offsets for %s | number of partitions %s", input_file, num_partitions)
-        conflation_database = None
+        conflation_map = None
         if input_file.name in DRUG_CHEMICAL_IDENTIFIER_FILES or input_file.name in GENE_PROTEIN_IDENTIFER_FILES:
             data_folder = Path(input_file).absolute().resolve().parent
-            conflation_database = data_folder.joinpath(CONFLATION_LOOKUP_DATABASE)
+            conflation_map = data_folder.joinpath(CONFLATION_LOOKUP_MAP)
+            if not conflation_map.exists():
+                conflation_map = None
 
         offsets = generate_file_offsets(input_file, num_partitions)
 
@@ -93,23 +139,23 @@ def _build_offset_tasks(data_folder: Union[str, Path], collection_name: str):
                 "offset_start": offset_start,
                 "offset_end": offset_end,
                 "collection_name": collection_name,
-                "conflation_database": conflation_database,
+                "conflation_map": conflation_map,
             }
             argument_collection.append(arguments)
         return argument_collection
 
-    thread_futures = []
+    # Each file is planned exactly once in the thread pool. The tasks of a file are yielded as soon as
+    # its plan is ready, so the uploads can start while the later files are still being planned
     with concurrent.futures.ThreadPoolExecutor() as executor:
+        thread_futures = []
         for filename, num_partitions in NODENORM_UPLOAD_CHUNKS.items():
             filepath = Path(data_folder).joinpath(filename).resolve().absolute()
             arguments = {"input_file": filepath, "num_partitions": num_partitions}
-            _populate_upload_arguments(**arguments)
             future = executor.submit(_populate_upload_arguments, **arguments)
             thread_futures.append(future)
 
-    concurrent.futures.wait(thread_futures, timeout=None, return_when=concurrent.futures.ALL_COMPLETED)
-
-    yield from itertools.chain.from_iterable([future.result() for future in thread_futures])
+        for future in concurrent.futures.as_completed(thread_futures):
+            yield from future.result()
 
 
 def generate_file_offsets(file: Union[str, Path], num_partitions: int = None):
@@ -118,65 +164,100 @@ def generate_file_offsets(file: Union[str, Path], num_partitions: int = None):
 
     We're primarily interested in parallel processsing a file in batches for uploading
     to a database, so we don't need to store every offset as that would be a waste of memory.
-    Rather, based off the number of partitions we store the file size as we iterate over the file
-    so we can track the approximate percentage we've completed so we can store inteval markers while
-    chunking the file
+    Rather, based off the number of partitions we seek to evenly spaced byte offsets and scan
+    ahead to the next newline to store the interval markers while chunking the file. This is
+    O(partitions) rather than O(file) as we never read the file line by line
+
+    The index is cached next to the file and reused as long as the file signature (size, mtime, and
+    sampled block hashes) and the number of partitions are unchanged
     """
     if num_partitions is None:
         num_partitions = 10
 
     file = Path(file).absolute().resolve()
-    file_size_bytes = file.stat().st_size
     file_index = file.with_suffix(".index")
 
-    logger.debug("Calculating SHA256 hashsum for file: %s", file)
-    file_hash = sha256sum(file)
+    file_signature = generate_file_signature(file)
 
     if file_index.exists():
         with open(file_index, "r", encoding="utf-8") as index_handle:
             previous_index = json.load(index_handle)
 
-        if previous_index["hash"] == file_hash:
+        previous_signature = previous_index.get("signature", None)
+        if previous_signature == file_signature and previous_index.get("partitions", None) == num_partitions:
             return previous_index["index"]
 
         logger.debug(
-            "Different hash found for file %s [%s, %s] [previous, current]. " "Updating file offsets with the new file",
+            "Different signature found for file %s [%s, %s] [previous, current]. "
+            "Updating file offsets with the new file",
             file,
-            previous_index["hash"],
-            file_hash,
+            previous_signature,
+            file_signature,
         )
 
+    partitions = find_partition_offsets(file, num_partitions)
+    with open(file_index, "w", encoding="utf-8") as index_handle:
+        index_handle.write(json.dumps({"index": partitions, "signature": file_signature, "partitions": num_partitions}))
+    return partitions
+
+
+def find_partition_offsets(file: Union[str, Path], num_partitions: int) -> list[int]:
+    """
+    Splits the file into (at most) num_partitions byte ranges aligned on line boundaries
+
+    For each evenly spaced byte offset we seek to the byte right before it and read the rest of
+    that line, so the partition boundary is always the start of a line. Boundaries landing in
+    the same line are collapsed, so very long lines can yield fewer partitions than requested
+    """
+    file_size_bytes = Path(file).stat().st_size
+
     partitions = [0]
-    marker = file_size_bytes / num_partitions
-    progress_bytes = 0
     with open(file, "rb") as handle:
-        while line := handle.readline():
-            if progress_bytes >= marker:
-                partitions.append(handle.tell())
-                progress_bytes = 0
-            else:
-                progress_bytes += len(line)
-        partitions.append(handle.tell())
-    with open(file_index, "w", encoding="utf-8") as index_handle:
-        index_handle.write(json.dumps({"index": partitions, "hash": file_hash}))
+        for partition in range(1, num_partitions):
+            marker = (file_size_bytes * partition) // num_partitions
+            if marker <= partitions[-1]:
+                continue
+
+            handle.seek(marker - 1)
+            handle.readline()
+            boundary = handle.tell()
+            if boundary >= file_size_bytes:
+                break
+            if boundary > partitions[-1]:
+                partitions.append(boundary)
+    partitions.append(file_size_bytes)
     return partitions
 
 
-def sha256sum(file: Union[str, Path], buffer_size: int = None):
+def generate_file_signature(file: Union[str, Path], num_samples: int = None, sample_size: int = None) -> str:
     """
-    Generates a sha256 hashsum for a file to determine if the previously generated
+    Generates a cheap signature for a file to determine if the previously generated
     index requires updating
+
+    Rather than hashing the entire file (multiple GB for the larger compendia), we hash
+    the file size, the modification time, and num_samples blocks of sample_size bytes at
+    evenly spaced offsets (including the first and last block of the file)
     """
-    if buffer_size is None:
-        buffer_size = 1024 * 128
+    if num_samples is None:
+        num_samples = 16
+
+    if sample_size is None:
+        sample_size = 1024 * 64
+
+    file_stat = Path(file).stat()
+    file_size_bytes = file_stat.st_size
 
     filehash = hashlib.sha256()
-    buffer = bytearray(buffer_size)
-    file_view = memoryview(buffer)
+    filehash.update(f"{file_size_bytes}:{file_stat.st_mtime_ns}".encode("utf-8"))
 
-    with open(file, "rb", buffering=0) as file_handle:
-        while n := file_handle.readinto(file_view):
-            filehash.update(file_view[:n])
+    with open(file, "rb") as file_handle:
+        last_sample_offset = max(file_size_bytes - sample_size, 0)
+        sample_offsets = sorted(
+            {(last_sample_offset * index) // max(num_samples - 1, 1) for index in range(num_samples)}
+        )
+        for sample_offset in sample_offsets:
+            file_handle.seek(sample_offset)
+            filehash.update(file_handle.read(sample_size))
     return filehash.hexdigest()
 
 
@@ -200,101 +281,190 @@ def subset_upload_worker(
     offset_start: int,
     offset_end: int,
     collection_name: str,
-    conflation_database: str = None,
-) -> list[str]:
+    conflation_map: str = None,
+) -> tuple[int, list[str]]:
     """
     Internal function for handling the multipart uploading of the file in partitions
 
     Accepts the file path, along with the chunk start and chunk end in bytes to determine
     what offset to start and stop at in the file
 
-    The conflation_connection is a static singular sqlite3 file located in the same directory as the
-    data files as it's generated post-dump. We can just derived it at run-time from the provided
-    data filepath
+    The identifiers of every buffer are fed to the shared duplicate detection as we go, so we only
+    return the number of identifiers uploaded and the duplicate candidates found by this worker
+    """
+    logger.info("Starting bulk upload to backend %s [%s|%s]", input_file, offset_start, offset_end)
+    upload_database = get_src_db()
+    collection = pymongo.collection.Collection(database=upload_database, name=collection_name)
+
+    identifier_count = 0
+    duplicate_candidates = set()
+    partition_buffers = iterate_partition_buffers(input_file, buffer_size, offset_start, offset_end, conflation_map)
+    for buffer, identifiers, progress in partition_buffers:
+        _upload_buffer(collection, buffer, input_file, progress)
+        duplicate_candidates.update(_find_duplicate_candidates(identifiers))
+        identifier_count += len(identifiers)
+    return identifier_count, list(duplicate_candidates)
+
+
+def iterate_partition_buffers(
+    input_file: Union[str, Path], buffer_size: int, offset_start: int, offset_end: int, conflation_map: str = None
+):
+    """
+    Reads the partition of the file and yields the buffers of (at most) buffer_size documents ready
+    to be uploaded, along with the identifiers of the buffer and the progress within the partition
+
+    The conflation_map is a static singular memory-mapped file located in the same directory as the
+    data files as it's generated once by the upload process before any worker starts. The pages of the
+    map are shared between all the worker processes through the OS page cache
+
+    The lines are read as bytes in large blocks and parsed by orjson without any text decoding
 
     Afterwards the data processing is straight forward, we effectively don't transform the state of
     the nodenorm files
     """
-    logger.info("Starting bulk upload to backend %s [%s|%s]", input_file, offset_start, offset_end)
-    conflation_connection = None
-    if conflation_database is not None:
-        conflation_connection = sqlite3.connect(str(conflation_database))
+    conflation_lookup = None
+    if conflation_map is not None:
+        conflation_lookup = _open_conflation_map(conflation_map)
 
-    upload_database = get_src_db()
-    collection = pymongo.collection.Collection(database=upload_database, name=collection_name)
+    buffer = []
+    identifiers = []
+    position = offset_start
+    for line, position in iterate_file_lines(input_file, offset_start, offset_end):
+        doc = json_loads(line)
 
-    with open(input_file, encoding="utf-8") as file_handle:
-        buffer = []
-        identifiers = []
-        canonical_identifiers = []
-        file_handle.seek(offset_start)
-        while file_handle.tell() < offset_end:
-            line = file_handle.readline()
-            doc = json_loads(line)
-
-            canonical_identifier = doc["identifiers"][0]["i"]
-            canonical_identifiers.append(canonical_identifier)
-            doc["_id"] = canonical_identifier
-            try:
-                doc["ic"] = float(doc["ic"])
-            except (TypeError, ValueError):
-                doc["ic"] = 0.0
+        canonical_identifier = doc["identifiers"][0]["i"]
+        doc["_id"] = canonical_identifier
+        try:
+            doc["ic"] = float(doc["ic"])
+        except (TypeError, ValueError):
+            doc["ic"] = 0.0
 
-            buffer.append(doc)
+        buffer.append(doc)
 
-            for identifier in doc["identifiers"]:
-                identifiers.append(identifier["i"])
-                identifier["c"] = {"gp": None, "dc": None}
+        doc["identifiers"] = _trim_identical_identifiers(doc["identifiers"])
+        for identifier in doc["identifiers"]:
+            identifiers.append(identifier["i"])
+            identifier["c"] = {"gp": None, "dc": None}
 
-            if len(buffer) >= buffer_size:
-                if conflation_connection is not None:
-                    buffer = _update_buffer_with_conflations(buffer, canonical_identifiers, conflation_connection)
-                _upload_buffer(collection, buffer, input_file, file_handle.tell() / offset_end)
-                buffer = []
-                canonical_identifiers = []
+        if len(buffer) >= buffer_size:
+            if conflation_lookup is not None:
+                buffer = _update_buffer_with_conflations(buffer, conflation_lookup)
+            yield buffer, identifiers, position / offset_end
+            buffer = []
+            identifiers = []
 
-        if len(buffer) > 0:
-            if conflation_connection is not None:
-                buffer = _update_buffer_with_conflations(buffer, canonical_identifiers, conflation_connection)
-            _upload_buffer(collection, buffer, input_file, file_handle.tell() / offset_end)
-    return identifiers
+    if len(buffer) > 0:
+        if conflation_lookup is not None:
+            buffer = _update_buffer_with_conflations(buffer, conflation_lookup)
+        yield buffer, identifiers, position / offset_end
 
 
-def _update_buffer_with_conflations(
-    buffer: list[dict], canonical_identifiers: list[str], conflation_database: sqlite3.Connection
-) -> list[str]:
+def create_duplicate_detector(data_folder: Union[str, Path]) -> CurieDuplicateDetector:
     """
-    Batch updates the buffer documents with the conflation identifiers found
+    Creates the duplicate detection of the upload, its bloom filter in shared memory being sized
+    from the estimated number of identifiers to upload
+    """
+    identifier_count = _estimate_identifier_count(data_folder)
+    duplicate_detector = CurieDuplicateDetector(capacity=identifier_count, shared=True)
+    bloom_filter = duplicate_detector.bloom_filter
+    logger.info(
+        "Duplicate detection bloom filter of %s MiB for ~%s identifiers | expected false positive rate %.4f",
+        bloom_filter.num_bits // (8 * 1024 * 1024),
+        identifier_count,
+        BloomFilter.expected_false_positive_rate(bloom_filter.num_bits, bloom_filter.num_hashes, identifier_count),
+    )
+    return duplicate_detector
+
+
+def upload_worker_arguments(duplicate_detector: CurieDuplicateDetector) -> tuple:
+    """
+    The arguments of _initialize_upload_worker attaching a worker process to the shared bloom filter
+    """
+    bloom_filter = duplicate_detector.bloom_filter
+    return (bloom_filter.shared_bits, bloom_filter.num_bits, bloom_filter.num_hashes, multiprocessing.Lock())
+
+
+def _initialize_upload_worker(shared_bits, num_bits: int, num_hashes: int, lock) -> None:
+    global _DUPLICATE_FILTER, _DUPLICATE_FILTER_LOCK
+    _DUPLICATE_FILTER = BloomFilter(num_bits, num_hashes, shared_bits)
+    _DUPLICATE_FILTER_LOCK = lock
+
+
+def _find_duplicate_candidates(identifiers: list[str]) -> list[str]:
+    if _DUPLICATE_FILTER is None:
+        return []
+    return find_duplicate_candidates(identifiers, _DUPLICATE_FILTER, _DUPLICATE_FILTER_LOCK)
 
-    Performs a lookup against the conflation database to find all conflation identifiers
-    We then create an index table so we can quickly lookup up the buffer index based off the
-    canonical identifier
 
-    We iterate over the discovered conflation identifier results and update the buffer with the
-    conflation information before returning the newly updated buffer
+def _trim_identical_identifiers(document_identifiers: list[dict]) -> list[dict]:
     """
-    identifiers_repr = ", ".join("?" for _ in canonical_identifiers)
-    search_statement = f"SELECT identifiers, type FROM conflations WHERE conflation in ({identifiers_repr})"
-    identifier_results = conflation_database.execute(search_statement, canonical_identifiers)
+    Removes the repeated identical identifier entries within a document while streaming, keeping
+    the first occurrence. Entries sharing a CURIE with different content are kept and left to the
+    duplicate detection
+    """
+    if len({identifier["i"] for identifier in document_identifiers}) == len(document_identifiers):
+        return document_identifiers
+
+    trimmed_identifiers = []
+    for identifier in document_identifiers:
+        if identifier not in trimmed_identifiers:
+            trimmed_identifiers.append(identifier)
+    return trimmed_identifiers
+
+
+def _update_buffer_with_conflations(buffer: list[dict], conflation_lookup: ConflationMap) -> list[dict]:
+    """
+    Batch updates the buffer documents with the conflation identifiers found
 
-    lookup_buffer_index = {document["identifiers"][0]["i"]: index for index, document in enumerate(buffer)}
+    Performs an in-memory lookup of each canonical identifier against the shared conflation map.
+    Documents of the same conflation set within the buffer share the decoded identifiers list
+    """
+    decoded_sets = {}
+    for document in buffer:
+        curie_id = conflation_lookup.find_curie_id(document["identifiers"][0]["i"])
+        if curie_id is None:
+            continue
 
-    for conflation_result in identifier_results.fetchall():
-        if conflation_result is not None:
-            identifiers = conflation_result[0].strip().split(",")
-            conflation_type = conflation_result[1]
+        set_id = conflation_lookup.set_of(curie_id)
+        conflation = decoded_sets.get(set_id)
+        if conflation is None:
+            conflation = conflation_lookup.conflation_set(set_id)
+            decoded_sets[set_id] = conflation
 
-            for identifier in identifiers:
-                buffer_index = lookup_buffer_index.get(identifier, None)
-                if buffer_index is not None:
-                    for identifier in buffer[buffer_index]["identifiers"]:
-                        if conflation_type == "GeneProtein":
-                            identifier["c"]["gp"] = identifiers
-                        elif conflation_type == "DrugChemical":
-                            identifier["c"]["dc"] = identifiers
+        conflation_type, identifiers = conflation
+        conflation_key = CONFLATION_TYPE_KEYS[conflation_type]
+        for identifier in document["identifiers"]:
+            identifier["c"][conflation_key] = identifiers
     return buffer
 
 
+def _open_conflation_map(conflation_map: Union[str, Path]) -> ConflationMap:
+    conflation_map = str(conflation_map)
+    conflation_lookup = _CONFLATION_MAPS.get(conflation_map)
+    if conflation_lookup is None:
+        conflation_lookup = ConflationMap(conflation_map)
+        _CONFLATION_MAPS[conflation_map] = conflation_lookup
+    return conflation_lookup
+
+
+def create_conflation_map(data_folder: Union[str, Path]) -> None:
+    """
+    Builds the conflation map shared by the upload workers from the conflation database
+    generated by the dumper
+    """
+    data_folder = Path(data_folder).resolve().absolute()
+    conflation_database = data_folder.joinpath(CONFLATION_LOOKUP_DATABASE)
+    conflation_map = data_folder.joinpath(CONFLATION_LOOKUP_MAP)
+    if not conflation_database.exists():
+        logger.warning("Unable to find the conflation database %s", conflation_database)
+        return
+
+    logger.debug("Creating conflation map %s", conflation_map)
+    t0 = time.perf_counter()
+    build_conflation_map_from_database(conflation_database, conflation_map)
+    logger.debug("Created conflation map %s in %.1fs", conflation_map, time.perf_counter() - t0)
+
+
 def _upload_buffer(
     collection: pymongo.collection.Collection, buffer: list[dict], input_file: Union[str, Path], progress: float
 ):
@@ -361,18 +531,6 @@ def create_identifiers_table(data_folder: Union[str, Path]) -> None:
     identifier_connection.close()
 
 
-def create_identifiers_index(data_folder: Union[str, Path]) -> None:
-    logger.debug("Creating sqlite3 identifiers database index")
-    identifier_database = Path(data_folder).resolve().absolute().joinpath(IDENTIFIER_LOOKUP_DATABASE)
-    identifier_connection = sqlite3.connect(str(identifier_database))
-    cursor = identifier_connection.cursor()
-
-    identifier_index = "CREATE INDEX IF NOT EXISTS idx_identifiers ON identifiers (identifier, count);"
-    cursor.execute(identifier_index)
-    identifier_connection.commit()
-    identifier_connection.close()
-
-
 def create_mongo_identifiers_index(collection_name: str) -> None:
     logger.debug("Creating mongodb identifiers.i database index")
     upload_database = get_src_db()
@@ -380,14 +538,34 @@ def create_mongo_identifiers_index(collection_name: str) -> None:
     collection.create_index("identifiers.i")
 
 
-def update_identifier_collection(data_folder: Union[str, Path], identifiers: list[str]):
+def connect_identifier_database(data_folder: Union[str, Path]) -> sqlite3.Connection:
     """
-    Temporarily stopgap to identify our CURIE duplication issue
+    Opens the long-lived connection of the upload process to the identifiers database
 
-    Stores all identifiers in a sqlite3 database for post-update fixing
+    Write-ahead logging with a relaxed synchronous mode avoids the fsync of the rollback journal
+    on every commit while keeping every transaction atomic
     """
-    identifier_database = Path(data_folder).joinpath(IDENTIFIER_LOOKUP_DATABASE)
+    identifier_database = Path(data_folder).resolve().absolute().joinpath(IDENTIFIER_LOOKUP_DATABASE)
     identifier_connection = sqlite3.connect(str(identifier_database))
+    identifier_connection.execute("PRAGMA journal_mode=WAL;")
+    identifier_connection.execute("PRAGMA synchronous=NORMAL;")
+    return identifier_connection
+
+
+def update_identifier_collection(
+    identifier_connection: sqlite3.Connection, identifiers: list[str], checkpoint: tuple = None
+):
+    """
+    Temporarily stopgap to identify our CURIE duplication issue
+
+    Stores the duplicate candidate identifiers found by the in-stream duplicate detection
+    in a sqlite3 database for post-update fixing
+
+    The checkpoint (input file, offset start, offset end, file signature, identifier count) of the
+    partition the identifiers belong to is recorded in the same transaction, so the identifier
+    counts always match the set of partitions a resumed upload skips. Only the duplicate candidates
+    reach the main process, so this is a single small bulk insert per partition
+    """
     cursor = identifier_connection.cursor()
 
     upsert_statement = (
@@ -398,7 +576,133 @@ def update_identifier_collection(data_folder: Union[str, Path], identifiers: lis
     )
     identifier_information = [{"identifier": identifier} for identifier in identifiers]
 
-    cursor.executemany(upsert_statement, identifier_information)
+    with identifier_connection:
+        cursor.executemany(upsert_statement, identifier_information)
+        if checkpoint is not None:
+            cursor.execute("INSERT OR REPLACE INTO upload_partitions VALUES (?, ?, ?, ?, ?);", checkpoint)
+
+
+def rebuild_duplicate_detector(
+    duplicate_detector: CurieDuplicateDetector, data_folder: Union[str, Path], collection_name: str
+) -> None:
+    """
+    Restores the duplicate detection state of an interrupted upload from the documents already
+    uploaded and the duplicate candidates recorded so far
+
+    The documents of the partitions interrupted midway are fed as well, so their identifiers are
+    reported as candidates when uploaded again. These are false positives resolved as no-ops
+    """
+    identifier_database = Path(data_folder).resolve().absolute().joinpath(IDENTIFIER_LOOKUP_DATABASE)
+    identifier_connection = sqlite3.connect(str(identifier_database))
+    results = identifier_connection.execute("SELECT identifier FROM identifiers;")
+    duplicate_detector.candidates.update(result[0] for result in results.fetchall())
+    identifier_connection.close()
+
+    logger.info("Rebuilding the duplicate detection from collection %s", collection_name)
+    collection = _connect_upload_collection(collection_name)
+    for document in collection.find({}, {"identifiers.i": 1}):
+        duplicate_detector.add(entry["i"] for entry in document["identifiers"])
+
+
+def _estimate_identifier_count(data_folder: Union[str, Path]) -> int:
+    """
+    Estimates the number of identifiers to upload to size the bloom filter of the duplicate detection,
+    extrapolating the number of identifier entries in the head of each file to its whole size
+    """
+    identifier_count = 0
+    for filename in NODENORM_UPLOAD_CHUNKS:
+        filepath = Path(data_folder).joinpath(filename)
+        if not filepath.exists():
+            continue
+        with open(filepath, "rb") as handle:
+            sample = handle.read(IDENTIFIER_SAMPLE_BYTES)
+        if sample:
+            sample_count = len(IDENTIFIER_ENTRY_PATTERN.findall(sample))
+            identifier_count += sample_count * filepath.stat().st_size // len(sample)
+    return max(identifier_count, 1_000_000)
+
+
+def prepare_upload_checkpoint(data_folder: Union[str, Path], collection_name: str) -> dict:
+    """
+    Prepares the checkpoint store for the upload and returns the completed partitions of a
+    previously interrupted upload as {(input file, offset start, offset end): identifier count}
+
+    The checkpoint lives in the identifiers database alongside the identifier counts. An interrupted
+    upload is resumed when its collection still exists and none of its files have changed since.
+    The hub creates a new temporary collection for every upload attempt, so the previous collection
+    is renamed to the new collection name. Otherwise we start over from scratch with a fresh
+    identifiers table
+    """
+    identifier_database = Path(data_folder).resolve().absolute().joinpath(IDENTIFIER_LOOKUP_DATABASE)
+    identifier_connection = sqlite3.connect(str(identifier_database))
+    cursor = identifier_connection.cursor()
+    partition_columns = [column[1] for column in cursor.execute("PRAGMA table_info(upload_partitions);")]
+    if len(partition_columns) > 0 and "identifier_count" not in partition_columns:
+        # checkpoint written before the column rename, the upload starts over
+        cursor.execute("DROP TABLE upload_partitions;")
+    cursor.execute(
+        "CREATE TABLE IF NOT EXISTS upload_partitions("
+        "input_file text NOT NULL, offset_start INT NOT NULL, offset_end INT NOT NULL, "
+        "signature text NOT NULL, identifier_count INT NOT NULL, "
+        "PRIMARY KEY (input_file, offset_start, offset_end));"
+    )
+    cursor.execute("CREATE TABLE IF NOT EXISTS upload_state(key text PRIMARY KEY NOT NULL, value text);")
+    identifier_connection.commit()
+
+    previous_collection = cursor.execute("SELECT value FROM upload_state WHERE key = 'collection';").fetchone()
+    partitions = cursor.execute(
+        "SELECT input_file, offset_start, offset_end, signature, identifier_count FROM upload_partitions;"
+    ).fetchall()
+    identifier_connection.close()
+
+    completed_partitions = {}
+    if previous_collection is not None and len(partitions) > 0:
+        previous_collection = previous_collection[0]
+        upload_database = get_src_db()
+
+        file_signatures = {}
+        resumable = previous_collection in upload_database.list_collection_names()
+        for input_file, offset_start, offset_end, signature, identifier_count in partitions:
+            if not resumable:
+                break
+            if input_file not in file_signatures:
+                file_signatures[input_file] = generate_file_signature(input_file) if Path(input_file).exists() else None
+            resumable = file_signatures[input_file] == signature
+            completed_partitions[(input_file, offset_start, offset_end)] = identifier_count
+
+        if resumable:
+            if previous_collection != collection_name:
+                logger.info("Renaming interrupted upload collection %s to %s", previous_collection, collection_name)
+                upload_database[previous_collection].rename(collection_name, dropTarget=True)
+            logger.info(
+                "Resuming interrupted upload | %s completed partitions | %s identifiers",
+                len(completed_partitions),
+                sum(completed_partitions.values()),
+            )
+        else:
+            logger.info("Unable to resume the interrupted upload into %s. Starting over", previous_collection)
+            completed_partitions = {}
+
+    if len(completed_partitions) == 0:
+        create_identifiers_table(data_folder)
+        clear_upload_checkpoint(data_folder)
+
+    identifier_connection = sqlite3.connect(str(identifier_database))
+    identifier_connection.execute(
+        "INSERT OR REPLACE INTO upload_state VALUES ('collection', ?);",
+        (collection_name,),
+    )
+    identifier_connection.commit()
+    identifier_connection.close()
+    return completed_partitions
+
+
+def clear_upload_checkpoint(data_folder: Union[str, Path]) -> None:
+    identifier_database = Path(data_folder).resolve().absolute().joinpath(IDENTIFIER_LOOKUP_DATABASE)
+    identifier_connection = sqlite3.connect(str(identifier_database))
+    cursor = identifier_connection.cursor()
+    cursor.execute("DELETE FROM upload_partitions;")
+    cursor.execute("DELETE FROM upload_state;")
     identifier_connection.commit()
     identifier_connection.close()
 
@@ -406,6 +710,11 @@ def update_identifier_collection(data_folder: Union[str, Path], identifiers: lis
 def cleanup_curie_duplication(data_folder: Union[str, Path], collection_name: str):
     """
     Handle the CURIE duplication directly in the mongodb database
+
+    The duplicate candidates were detected in-stream while uploading, so we only have to fetch the
+    documents of each batch of candidates with a single query and write the resolution of the batch
+    with a single bulk operation. The batches are resolved one after another, so a document shared
+    by the cliques of several candidates is never modified concurrently
     """
     logger.info("Handling CURIE duplication issue")
 
@@ -413,36 +722,30 @@ def cleanup_curie_duplication(data_folder: Union[str, Path], collection_name: st
     identifier_connection = sqlite3.connect(str(identifier_database))
     cursor = identifier_connection.cursor()
 
-    identifier_table = "SELECT identifier FROM identifiers WHERE count > 1;"
+    identifier_table = "SELECT identifier FROM identifiers;"
     results = cursor.execute(identifier_table)
-    duplicate_curies = tuple(results.fetchall())
+    duplicate_curies = tuple(result[0] for result in results.fetchall())
     identifier_connection.close()
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=1 * os.cpu_count()) as executor:
-        process_futures = []
-        for index, curie_batch in enumerate(iter_n(duplicate_curies, 1000)):
-            arguments = {"task_id": index, "curies": curie_batch, "collection_name": collection_name}
-            future = executor.submit(_curie_duplication_batch_handler, **arguments)
-            process_futures.append(future)
-
-        total_correction_count = 0
-        for future in concurrent.futures.as_completed(process_futures):
-            try:
-                task_id, num_corrections = future.result()
-            except Exception as gen_exc:
-                logger.exception(gen_exc)
-            else:
-                total_correction_count += num_corrections
-                logger.debug(
-                    "Task %s completed | Corrected %s documents | Total corrections %s",
-                    task_id,
-                    num_corrections,
-                    total_correction_count,
-                )
+    collection = _connect_upload_collection(collection_name)
 
+    total_correction_count = 0
+    for task_id, curie_batch in enumerate(iter_n(duplicate_curies, 1000)):
+        try:
+            num_corrections = _curie_duplication_batch_handler(task_id, curie_batch, collection)
+        except Exception as gen_exc:
+            logger.exception(gen_exc)
+        else:
+            total_correction_count += num_corrections
+            logger.debug(
+                "Task %s completed | Corrected %s documents | Total corrections %s",
+                task_id,
+                num_corrections,
+                total_correction_count,
+            )
 
-def _curie_duplication_batch_handler(task_id: int, curies: list[str], collection_name: str):
 
+def _connect_upload_collection(collection_name: str) -> pymongo.collection.Collection:
     num_retry = 10
     counter = 0
     collection = None
@@ -467,26 +770,78 @@ def _curie_duplication_batch_handler(task_id: int, curies: list[str], collection
                 collection_name,
                 num_retry - counter,
             )
+    return collection
 
-    buffer = []
-    for result in curies:
-        identifier = result[0]
 
-        cursor = collection.find({"identifiers.i": identifier})
-        documents = list(cursor)
+def _curie_duplication_batch_handler(task_id: int, curies: list[str], collection: pymongo.collection.Collection) -> int:
+    """
+    Resolves the duplication of a batch of CURIEs
+
+    All the documents containing any of the CURIEs are fetched in one query and the final state of
+    every modified document is then written in one bulk operation
+    """
+    candidate_documents = collection.find({"identifiers.i": {"$in": list(curies)}})
+    replaced, deleted = resolve_curie_duplication(task_id, curies, candidate_documents)
+
+    buffer = [pymongo.DeleteOne({"_id": _id}) for _id in deleted]
+    buffer.extend(pymongo.ReplaceOne({"_id": document["_id"]}, document) for document in replaced)
+    if len(buffer) > 0:
+        logger.debug("[Task %d] Bulk writing %s changes to collection", task_id, len(buffer))
+        collection.bulk_write(buffer, ordered=False)
+    else:
+        logger.debug("[Task %d] Bulk writing found no changes to collection to apply", task_id)
+    return len(buffer)
+
+
+def resolve_curie_duplication(
+    task_id: int, curies: list[str], candidate_documents: Iterable[dict]
+) -> tuple[list, list]:
+    """
+    Resolves the duplication of a batch of CURIEs over the documents containing any of them
+
+    The resolutions are applied to these in-memory documents, so the CURIEs of the same clique
+    (documents sharing several duplicated CURIEs) see the outcome of the previous resolutions.
+    Returns the documents to replace and the _id of the documents to delete
+    """
+    curies = set(curies)
+    documents = {}
+    curie_documents = defaultdict(list)
+    for document in candidate_documents:
+        documents[document["_id"]] = document
+        for identifier in {entry["i"] for entry in document["identifiers"]}:
+            if identifier in curies:
+                curie_documents[identifier].append(document["_id"])
+
+    replaced = set()
+    deleted = set()
+
+    def _replace_document(document: dict) -> None:
+        documents[document["_id"]] = document
+        replaced.add(document["_id"])
+
+    def _delete_document(document: dict) -> None:
+        deleted.add(document["_id"])
+
+    for identifier, document_ids in curie_documents.items():
+        identifier_documents = [documents[_id] for _id in document_ids if _id not in deleted]
 
         # Handle case where the identifier.i is duplicated within the same document
-        if len(documents) == 1:
+        if len(identifier_documents) == 1:
+            document = identifier_documents[0]
+            identifier_entries = [entry for entry in document["identifiers"] if entry["i"] == identifier]
+            if len(identifier_entries) < 2:
+                # False positive of the duplicate detection or already resolved
+                continue
 
             # We need to generate every comparison within the same document. itertools.combinations
             # produces every combination, but we need to store it on a per identifier level so we
             # can determine if any of the identifiers match any of the others. This is the goal
             # behind the comparison matrix we build to make every inner comparison possible
-            identifier_combinations = tuple(itertools.combinations(documents[0]["identifiers"], 2))
+            identifier_combinations = tuple(itertools.combinations(document["identifiers"], 2))
 
             comparison_matrix = defaultdict(list)
-            for index, identifier in enumerate(documents[0]["identifiers"]):
-                comparison_filter = [identifier in entry for entry in identifier_combinations]
+            for index, entry in enumerate(document["identifiers"]):
+                comparison_filter = [entry in combination for combination in identifier_combinations]
                 comparison_matrix[index] = tuple(itertools.compress(identifier_combinations, comparison_filter))
 
             removal_index = []
@@ -500,30 +855,25 @@ def _curie_duplication_batch_handler(task_id: int, curies: list[str], collection
                 logger.debug(
                     "[Task %d] Ignore 1 document due to initial upload BulkWriteError caught duplicate _id. Likely identical documents merged on the type field: %s",
                     task_id,
-                    documents[0],
+                    document,
                 )
             elif not any(removal_index) and len(removal_index) > 1:
-                original_document = copy.deepcopy(documents[0])
-                documents[0]["identifiers"] = [documents[0]["identifiers"][0]]
-
-                buffer.append(pymongo.ReplaceOne(original_document, documents[0]))
+                document["identifiers"] = [document["identifiers"][0]]
+                _replace_document(document)
                 logger.debug(
                     "[Task %d] Replace 1 document to trim all identifiers except the first due to them all being identical: %s",
                     task_id,
-                    documents[0],
+                    document,
                 )
             else:
-                original_document = copy.deepcopy(documents[0])
-                documents[0]["identifiers"] = list(itertools.compress(documents[0]["identifiers"], removal_index))
-                buffer.append(pymongo.ReplaceOne(original_document, documents[0]))
-                logger.debug(
-                    "[Task %d] Replace 1 document to trim some duplicate identifiers: %s", task_id, documents[0]
-                )
+                document["identifiers"] = list(itertools.compress(document["identifiers"], removal_index))
+                _replace_document(document)
+                logger.debug("[Task %d] Replace 1 document to trim some duplicate identifiers: %s", task_id, document)
 
         # Handle case where the identifier.i is spread across 2 documents
-        elif len(documents) == 2:
+        elif len(identifier_documents) == 2:
 
-            def _evaluate_document_subset(more_identifiers_doc: dict, less_identifiers_doc: dict) -> pymongo.DeleteOne:
+            def _evaluate_document_subset(more_identifiers_doc: dict, less_identifiers_doc: dict) -> bool:
                 """
                 If it passes the subset check, then we can safely delete the document while keeping
                 the other document. It must be a complete subset, otherwise we have to perform
@@ -534,13 +884,13 @@ def _curie_duplication_batch_handler(task_id: int, curies: list[str], collection
                 for subset_identifier in less_identifiers_doc["identifiers"]:
                     subset_check.append(subset_identifier in more_identifiers_doc["identifiers"])
 
-                operation = None
                 if all(subset_check):
-                    operation = pymongo.DeleteOne(less_identifiers_doc)
+                    _delete_document(less_identifiers_doc)
                     logger.debug("[Task %d] Delete 1 document: %s", task_id, less_identifiers_doc)
-                return operation
+                    return True
+                return False
 
-            def _evaluate_document_intersection(more_identifiers_doc: dict, less_identifiers_doc: dict):
+            def _evaluate_document_intersection(more_identifiers_doc: dict, less_identifiers_doc: dict) -> bool:
                 """
                 One crucial assumption here is that at least one of these documents is has a type of
                 biolink:Protein.
@@ -548,7 +898,6 @@ def _curie_duplication_batch_handler(task_id: int, curies: list[str], collection
                 If the type biolink:Protein isn't found then we cannot make any assumptions about
                 how to handle the intersection between the two documents
                 """
-                operation = None
                 if (
                     more_identifiers_doc["type"] == "biolink:Protein"
                     or less_identifiers_doc["type"] == "biolink:Protein"
@@ -565,44 +914,34 @@ def _curie_duplication_batch_handler(task_id: int, curies: list[str], collection
                         subset_mask.append(subset_identifier not in main_document["identifiers"])
 
                     if any(subset_mask):
-                        original_document = copy.deepcopy(side_document)
                         side_document["identifiers"] = list(
                             itertools.compress(side_document["identifiers"], subset_mask)
                         )
-                        operation = pymongo.ReplaceOne(original_document, side_document)
+                        _replace_document(side_document)
                         logger.debug(
                             "[Task %d] Replace 1 document to trim the intersection of identifiers with another document: %s",
                             task_id,
                             side_document,
                         )
-                return operation
-
-            operation = None
-            more_identifiers_doc = None
-            less_identifiers_doc = None
-            if len(documents[0]["identifiers"]) > len(documents[1]["identifiers"]):
-                more_identifiers_doc = documents[0]
-                less_identifiers_doc = documents[1]
+                        return True
+                return False
+
+            if len(identifier_documents[0]["identifiers"]) > len(identifier_documents[1]["identifiers"]):
+                more_identifiers_doc = identifier_documents[0]
+                less_identifiers_doc = identifier_documents[1]
             else:
-                more_identifiers_doc = documents[1]
-                less_identifiers_doc = documents[0]
+                more_identifiers_doc = identifier_documents[1]
+                less_identifiers_doc = identifier_documents[0]
 
-            operation = _evaluate_document_subset(more_identifiers_doc, less_identifiers_doc)
-            if operation is None:
-                operation = _evaluate_document_intersection(more_identifiers_doc, less_identifiers_doc)
+            resolved = _evaluate_document_subset(more_identifiers_doc, less_identifiers_doc)
+            if not resolved:
+                resolved = _evaluate_document_intersection(more_identifiers_doc, less_identifiers_doc)
 
-            if operation is None:
+            if not resolved:
                 logger.critical(
                     "[Task %d] Unable to evaluate identifer %s subset or intersection between documents",
                     task_id,
                     identifier,
                 )
-            buffer.append(operation)
 
-    if buffer is not None and len(buffer) > 0:
-        logger.debug("[Task %d] Bulk writing %s changes to collection", task_id, len(buffer))
-        collection.bulk_write(buffer)
-        return task_id, len(buffer)
-    else:
-        logger.debug("[Task %d] Bulk writing found no changes to collection to apply", task_id)
-        return task_id, 0
+    return [documents[_id] for _id in replaced if _id not in deleted], list(deleted)
@@ -58,3 +58,28 @@ def test_04_reversible():
     assert not graph.reversible()
     with pytest.raises(TypeError):
         graph.reverse()
+
+
+def test_05_reversed():
+    source = dict(reference)
+    graph = GraphObject.from_dict(source)
+    reversed_graph = graph.reversed()
+    assert reversed_graph.predicate == "negatively_regulated_by_entity_to_entity"
+    assert reversed_graph.subject == reference["object"]
+    # neither the graph object nor its source are modified
+    assert graph.predicate == "negatively_regulates_entity_to_entity"
+    assert source["association"]["edge_label"] == "negatively_regulates_entity_to_entity"
+    with pytest.raises(TypeError):
+        graph.subject["id"] = "CHEBI:0"
+
+
+def test_06_canonical_direction():
+    doc = GraphObject.add_canonical_direction(dict(reference))
+    reversed_doc = GraphObject.add_canonical_direction(GraphObject.from_dict(reference).reversed().to_dict())
+    assert doc["canonical"] == reversed_doc["canonical"]
+    assert doc["canonical"]["association"] == {"edge_label": "negatively_regulated_by_entity_to_entity"}
+    assert doc["canonical"]["subject"] == reference["object"]
+
+    symmetric = dict(reference)
+    symmetric["association"] = {"edge_label": "related_to"}
+    assert "canonical" not in GraphObject.add_canonical_direction(symmetric)
@@ -0,0 +1,113 @@
+from copy import deepcopy
+
+from web.graph import GraphObject, GraphQueries, GraphQuery
+from web.pipeline import CanonicalGraphQueryBuilder, GraphResultTransform, PendingQueryBuilder
+
+edge = {
+    "subject": {"id": "CHEBI:100147", "type": "ChemicalSubstance"},
+    "object": {"id": "PR:000023452", "type": "GeneOrGeneProduct"},
+    "association": {"edge_label": "negatively_regulates_entity_to_entity", "evidence_count": "1"},
+}
+reversed_edge = GraphObject.from_dict(edge).reversed().to_dict()
+
+
+def search_response(*documents):
+    hits = [{"_id": str(index), "_score": 1.0, "_source": deepcopy(doc)} for index, doc in enumerate(documents)]
+    return {"hits": {"total": {"value": len(hits)}, "max_score": 1.0, "hits": hits}}
+
+
+def field_values(doc, field):
+    values = [doc]
+    for key in field.split("."):
+        values = [value[key] for value in values if isinstance(value, dict) and key in value]
+        values = [item for value in values for item in (value if isinstance(value, list) else [value])]
+    return values
+
+
+def matches(query, doc):
+    """Evaluate the multi_match and bool clauses built by the graph query builders on a document"""
+    (kind, clause), *_ = query.items()
+    if kind == "multi_match":
+        return str(clause["query"]) in [str(value) for value in field_values(doc, clause["fields"])]
+    if "should" in clause:
+        return any(matches(should, doc) for should in clause["should"])
+    return all(matches(must, doc) for must in clause["must"])
+
+
+def test_01_canonical_field_removed():
+    """The canonical direction is only indexed for the queries"""
+    doc = GraphObject.add_canonical_direction(deepcopy(edge))
+    assert GraphObject.CANONICAL_FIELD in doc
+
+    query = GraphQuery.from_dict({"subject.id": "CHEBI:100147"})
+    result = GraphResultTransform().transform(search_response(doc), _q=query, reverse=False, reversed=True)
+    assert GraphObject.CANONICAL_FIELD not in result["hits"][0]
+
+
+def test_02_opposite_hits_reversed():
+    """Only the hits stored opposite to the query direction are rewritten"""
+    query = GraphQuery.from_dict(
+        {"subject.id": "PR:000023452", "association.edge_label": "negatively_regulated_by_entity_to_entity"}
+    )
+    response = search_response(edge, reversed_edge)
+    result = GraphResultTransform().transform(response, _q=query, reverse=True, reversed=True)
+
+    for hit in result["hits"]:
+        assert hit["subject"] == reversed_edge["subject"]
+        assert hit["object"] == reversed_edge["object"]
+        assert hit["association"] == reversed_edge["association"]
+
+
+def test_03_hits_left_in_stored_direction():
+    """Without a reverse query, or with the reversed option off"""
+    query = GraphQuery.from_dict(
+        {"subject.id": "PR:000023452", "association.edge_label": "negatively_regulated_by_entity_to_entity"}
+    )
+    for options in (dict(reverse=False, reversed=True), dict(reverse=True, reversed=False)):
+        result = GraphResultTransform().transform(search_response(edge), _q=query, **options)
+        assert result["hits"][0]["subject"] == edge["subject"]
+        assert result["hits"][0]["association"] == edge["association"]
+
+
+def test_04_batch_hits_left_in_stored_direction():
+    """The hits of a batch of graph queries are left in their stored direction"""
+    queries = GraphQueries(
+        [
+            GraphQuery.from_dict(
+                {"subject.id": "PR:000023452", "association.edge_label": "negatively_regulated_by_entity_to_entity"}
+            )
+        ]
+    )
+    response = [search_response(edge)]
+    result = GraphResultTransform().transform(response, _q=queries, reverse=True, reversed=True)
+    assert result[0]["subject"] == edge["subject"]
+    assert result[0]["association"] == edge["association"]
+
+
+def test_05_canonical_reverse_query():
+    """The canonical reverse query matches the documents of the OR-ed reverse query"""
+    docs = [
+        GraphObject.add_canonical_direction(deepcopy(edge)),
+        GraphObject.add_canonical_direction(deepcopy(reversed_edge)),
+        GraphObject.add_canonical_direction({**deepcopy(edge), "object": {"id": "PR:000000001"}}),
+    ]
+    queries = [
+        {"subject.id": "CHEBI:100147", "association": {"edge_label": "negatively_regulates_entity_to_entity"}},
+        {"subject.id": "PR:000023452", "association": {"edge_label": "negatively_regulated_by_entity_to_entity"}},
+        {"object.id": "PR:000023452", "association": {"edge_label": "negatively_regulates_entity_to_entity"}},
+        # the association fields other than the predicate
+        {
+            "subject.id": "PR:000023452",
+            "association.edge_label": "negatively_regulated_by_entity_to_entity",
+            "association.evidence_count": "2",
+        },
+    ]
+    expected_matches = [[0, 1, 2], [0, 1], [0, 1], []]
+
+    for query, expected in zip(queries, expected_matches):
+        graph_query = GraphQuery.from_dict(query)
+        canonical_query = CanonicalGraphQueryBuilder().build(graph_query, reverse=True).to_dict()["query"]
+        or_query = PendingQueryBuilder().build(graph_query, reverse=True).to_dict()["query"]
+        assert "should" not in canonical_query.get("bool", {})
+        assert [index for index, doc in enumerate(docs) if matches(canonical_query, doc)] == expected
+        assert [index for index, doc in enumerate(docs) if matches(or_query, doc)] == expected
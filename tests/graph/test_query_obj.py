@@ -1,5 +1,6 @@
 import pytest
-from web.graph import GraphQuery
+from web.graph import GraphQueries, GraphQuery
+from web.pipeline import CanonicalGraphQueryBuilder
 
 
 def test_01_import():
@@ -102,3 +103,30 @@ def test2():
     assert "subject" in q
     assert "object" in q
     assert "association" in q
+
+
+def test3():
+    """Identical queries of a batch"""
+    queries = GraphQueries(
+        GraphQuery.from_dict(q)
+        for q in (
+            {"subject.id": "NCBIGene:1017", "object.type": "Disease"},
+            {"subject.id": "NCBIGene:1018"},
+            {"object": {"type": "Disease"}, "subject": {"id": "NCBIGene:1017"}},
+        )
+    )
+    distinct_queries, positions = queries.deduplicate()
+    assert list(distinct_queries) == [queries[0], queries[1]]
+    assert positions == [0, 1, 0]
+
+
+def test4():
+    """Reverse query on the canonical direction"""
+    builder = CanonicalGraphQueryBuilder()
+    query = GraphQuery.from_dict(
+        {"subject.id": "PR:000023452", "association": {"edge_label": "affects", "evidence_count": "1"}}
+    )
+    search = builder.build(query, reverse=True).to_dict()
+    fields = [clause["multi_match"]["fields"] for clause in search["query"]["bool"]["must"]]
+    assert fields == ["canonical.object.id", "canonical.association.edge_label", "association.evidence_count"]
+    assert search["query"]["bool"]["must"][1]["multi_match"]["query"] == "affected_by"
@@ -0,0 +1,36 @@
+"""
+Tests for the JSON response writing of the shared base handler
+"""
+
+import math
+from unittest import mock
+
+import tornado.web
+
+from web.handlers.base import PendingBaseAPIHandler
+
+
+def unstarted_handler() -> PendingBaseAPIHandler:
+    # the writing is tested without a request, tornado.web.RequestHandler.write being mocked
+    handler = PendingBaseAPIHandler.__new__(PendingBaseAPIHandler)
+    handler.format = "json"
+    handler.set_header = mock.Mock()
+    return handler
+
+
+def test_write_serialized_bytes():
+    handler = unstarted_handler()
+    with mock.patch.object(tornado.web.RequestHandler, "write") as write:
+        handler.write({"ngd": math.inf})
+    write.assert_called_once_with(handler, b'{"ngd":null}')
+    handler.set_header.assert_called_once_with("Content-Type", "application/json; charset=UTF-8")
+
+
+def test_write_serialization_error():
+    """As BaseAPIHandler.write, the chunk is handed over to tornado as is"""
+    handler = unstarted_handler()
+    chunk = {"value": object()}
+    with mock.patch.object(tornado.web.RequestHandler, "write") as write:
+        handler.write(chunk)
+    write.assert_called_once_with(handler, chunk)
+    handler.set_header.assert_not_called()
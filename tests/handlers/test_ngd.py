@@ -0,0 +1,182 @@
+"""
+Tests for the NGD matrix and the NGD cache admin handlers of the semmeddb plugin
+
+The NGD computations (Elasticsearch) are mocked, only the request handling is tested
+"""
+
+import json
+from unittest import mock
+
+import numpy as np
+import tornado
+from tornado.testing import AsyncHTTPTestCase
+
+from web.handlers import EXTRA_HANDLERS
+from web.handlers.ngd import SemmedNGDCacheHandler, SemmedNGDHandler
+from web.application import PendingAPI
+from web.service.ngd_service import NGDService
+from web.settings.configuration import load_configuration
+from web.utils import INFINITY_STR, UNDEFINED_STR
+
+INDEX_BUILD = "pending-semmeddb_20260101"
+
+
+class NGDHandlerTestCase(AsyncHTTPTestCase):
+    def get_app(self) -> tornado.web.Application:
+        configuration = load_configuration("config_web")
+        app_handlers = EXTRA_HANDLERS
+        app_settings = {"static_path": "static"}
+        application = PendingAPI.get_app(configuration, app_settings, app_handlers)
+        return application
+
+    def setUp(self):
+        super().setUp()
+        # the caches are shared by the handlers and created on the first request
+        SemmedNGDHandler.doc_stats_cache = None
+        SemmedNGDHandler.ngd_cache = None
+        SemmedNGDHandler.term_set_store = None
+        SemmedNGDHandler.cache_index_build = None
+
+        async def resolve_index_build(handler):
+            return INDEX_BUILD
+
+        index_build_patch = mock.patch.object(SemmedNGDHandler, "resolve_index_build", resolve_index_build)
+        index_build_patch.start()
+        self.addCleanup(index_build_patch.stop)
+
+    def fetch_json(self, path: str, method: str = "GET", body: dict = None, headers: dict = None):
+        headers = {"Content-Type": "application/json", **(headers or {})}
+        if body is not None:
+            body = json.dumps(body)
+        return self.fetch(path, method=method, body=body, headers=headers)
+
+
+class TestSemmedNGDMatrixHandler(NGDHandlerTestCase):
+    endpoint = "/semmeddb/query/ngd/matrix"
+
+    def setUp(self):
+        super().setUp()
+        ngd_matrix = np.array([[0.5, np.inf], [np.nan, 1.25]])
+        self.calculate_ngd_matrix = mock.AsyncMock(return_value=ngd_matrix)
+        matrix_patch = mock.patch.object(NGDService, "calculate_ngd_matrix", self.calculate_ngd_matrix)
+        matrix_patch.start()
+        self.addCleanup(matrix_patch.stop)
+
+    def test_dense_layout(self):
+        body = {"umls_x": ["C0000001", "C0000002"], "umls_y": ["C0000003", "C0000004"], "expand": "left"}
+        response = self.fetch_json(self.endpoint, method="POST", body=body)
+        self.assertEqual(response.code, 200)
+
+        result = json.loads(response.body)
+        self.assertEqual(result["layout"], "dense")
+        self.assertEqual(result["expand"], "left")
+        self.assertEqual(result["ngd"], [[0.5, INFINITY_STR], [UNDEFINED_STR, 1.25]])
+
+        terms_x, terms_y = self.calculate_ngd_matrix.await_args.args
+        self.assertEqual([(term.root, term.expandable) for term in terms_x], [("C0000001", True), ("C0000002", True)])
+        self.assertEqual([(term.root, term.expandable) for term in terms_y], [("C0000003", False), ("C0000004", False)])
+
+    def test_sparse_layout(self):
+        body = {"umls_x": ["C0000001", "C0000002"], "umls_y": ["C0000003", "C0000004"], "layout": "sparse"}
+        response = self.fetch_json(self.endpoint, method="POST", body=body)
+        self.assertEqual(response.code, 200)
+
+        result = json.loads(response.body)
+        self.assertNotIn("expand", result)
+        # only the finite distances are listed
+        self.assertEqual(
+            result["ngd"],
+            [{"umls": ["C0000001", "C0000003"], "ngd": 0.5}, {"umls": ["C0000002", "C0000004"], "ngd": 1.25}],
+        )
+
+    def test_terms_limit(self):
+        body = {"umls_x": [f"C{index:07d}" for index in range(1001)], "umls_y": ["C0000001"]}
+        response = self.fetch_json(self.endpoint, method="POST", body=body)
+        self.assertEqual(response.code, 400)
+        self.calculate_ngd_matrix.assert_not_awaited()
+
+    def test_get_not_allowed(self):
+        response = self.fetch(f"{self.endpoint}?umls_x=C0000001&umls_y=C0000002")
+        self.assertEqual(response.code, 405)
+
+
+class TestSemmedNGDCacheHandler(NGDHandlerTestCase):
+    endpoint = "/semmeddb/admin/ngd/cache"
+    admin_token = "s3cret"
+
+    def setUp(self):
+        super().setUp()
+        initialize = SemmedNGDCacheHandler.initialize
+
+        # the admin token of the URLSpec, read from the environment by config_web/semmeddb.py
+        def initialize_with_token(handler, admin_token=None, **kwargs):
+            initialize(handler, admin_token=self.admin_token, **kwargs)
+
+        token_patch = mock.patch.object(SemmedNGDCacheHandler, "initialize", initialize_with_token)
+        token_patch.start()
+        self.addCleanup(token_patch.stop)
+
+        self.calculate_ngd = mock.AsyncMock(return_value=0.5)
+        self.doc_total = mock.AsyncMock(return_value=1000)
+        for name, method in (("calculate_ngd", self.calculate_ngd), ("doc_total", self.doc_total)):
+            service_patch = mock.patch.object(NGDService, name, method)
+            service_patch.start()
+            self.addCleanup(service_patch.stop)
+
+    def authorization(self, token: str) -> dict:
+        return {"Authorization": f"Bearer {token}"}
+
+    def test_get_stats(self):
+        response = self.fetch(self.endpoint)
+        self.assertEqual(response.code, 200)
+
+        result = json.loads(response.body)
+        self.assertEqual(result["index_build"], INDEX_BUILD)
+        self.assertIn("doc_stats", result)
+        self.assertIn("ngd", result)
+        self.assertIn("term_set_sizes", result)
+
+    def test_admin_actions_disabled(self):
+        self.admin_token = None
+        response = self.fetch_json(self.endpoint, method="POST", body={"action": "flush"})
+        self.assertEqual(response.code, 403)
+
+    def test_admin_token_required(self):
+        for headers in ({}, self.authorization("wrong"), {"Authorization": f"Basic {self.admin_token}"}):
+            response = self.fetch_json(self.endpoint, method="POST", body={"action": "flush"}, headers=headers)
+            self.assertEqual(response.code, 401)
+            self.assertEqual(response.headers.get("WWW-Authenticate"), "Bearer")
+
+    def test_flush(self):
+        # the caches are created by a first request
+        self.assertEqual(self.fetch(self.endpoint).code, 200)
+        SemmedNGDHandler.ngd_cache.write_distance(("C0000001", "C0000002"), 0.5)
+        SemmedNGDHandler.cache_index_build = "pending-semmeddb_20250101"
+
+        headers = self.authorization(self.admin_token)
+        response = self.fetch_json(self.endpoint, method="POST", body={"action": "flush"}, headers=headers)
+        self.assertEqual(response.code, 200)
+
+        result = json.loads(response.body)
+        self.assertEqual(result["cache_index_build"], INDEX_BUILD)
+        self.assertEqual(result["ngd"]["distance"]["size"], 0)
+
+    def test_warm(self):
+        body = {"action": "warm", "umls": [["C0000001", "C0000002"], ["C0000003", "C0000004"]], "expand": "both"}
+        headers = self.authorization(self.admin_token)
+        response = self.fetch_json(self.endpoint, method="POST", body=body, headers=headers)
+        self.assertEqual(response.code, 200)
+
+        # the caches are flushed first, being filled from another index build
+        self.assertEqual(json.loads(response.body)["cache_index_build"], INDEX_BUILD)
+        self.doc_total.assert_awaited_once()
+        warmed_pairs = [tuple(term.root for term in call.args[0]) for call in self.calculate_ngd.await_args_list]
+        self.assertEqual(sorted(warmed_pairs), [("C0000001", "C0000002"), ("C0000003", "C0000004")])
+
+    def test_warm_invalid_terms(self):
+        body = {"action": "warm", "umls": [["C0000001"]]}
+        headers = self.authorization(self.admin_token)
+        response = self.fetch_json(self.endpoint, method="POST", body=body, headers=headers)
+        # as with the other NGD handlers, the error is written in the response body
+        self.assertEqual(json.loads(response.body)["code"], 400)
+        self.calculate_ngd.assert_not_awaited()
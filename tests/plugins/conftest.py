@@ -0,0 +1,64 @@
+"""
+The hub plugins import the hub configuration (`from biothings import config`), which biothings loads from a
+`config` module. As in a hub deployment, this `config` module imports config_hub and defines the variables it
+leaves to the application, here pointing to a temporary folder and to an in-memory hub database
+
+The `config` module is only installed while the hub and the plugins are imported, biothings keeping its own
+reference to it. Where they can't be loaded (e.g. python < 3.12), each test module reports itself as skipped
+(`pytest.importorskip`)
+"""
+
+import logging
+import sys
+import tempfile
+import types
+
+
+def _hub_config() -> types.ModuleType:
+    import config_hub
+
+    root = tempfile.mkdtemp(prefix="pending-hub-")
+    config = types.ModuleType("config")
+    # the application folder, where the config.py of a deployment lives
+    config.__file__ = config_hub.__file__
+    config.__dict__.update({key: value for key, value in vars(config_hub).items() if not key.startswith("__")})
+    config.__dict__.update(
+        DATA_SRC_SERVER="localhost",
+        DATA_SRC_PORT=27017,
+        DATA_SRC_DATABASE="pending_src",
+        DATA_SRC_SERVER_USERNAME=None,
+        DATA_SRC_SERVER_PASSWORD=None,
+        DATA_TARGET_SERVER="localhost",
+        DATA_TARGET_PORT=27017,
+        DATA_TARGET_DATABASE="pending_target",
+        DATA_TARGET_SERVER_USERNAME=None,
+        DATA_TARGET_SERVER_PASSWORD=None,
+        HUB_DB_BACKEND={"module": "biothings.utils.sqlite3", "sqlite_db_folder": root},
+        DATA_ARCHIVE_ROOT=root,
+        DATA_PLUGIN_FOLDER=root,
+        DATA_UPLOAD_FOLDER=root,
+        DIFF_PATH=root,
+        RELEASE_PATH=root,
+        LOG_FOLDER=root,
+        ES_BACKUPS_FOLDER=root,
+        logger=logging.getLogger("pending-hub"),
+    )
+    return config
+
+
+def _import_hub_plugins() -> None:
+    installed_config = "config" not in sys.modules
+    if installed_config:
+        sys.modules["config"] = _hub_config()
+    try:
+        import biothings.hub  # noqa: F401
+        import plugins.nameres  # noqa: F401
+        import plugins.nodenorm  # noqa: F401
+    except Exception as hub_exception:
+        logging.getLogger(__name__).warning("Unable to load the hub plugins: %s", hub_exception)
+    finally:
+        if installed_config:
+            del sys.modules["config"]
+
+
+_import_hub_plugins()
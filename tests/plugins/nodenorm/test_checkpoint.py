@@ -0,0 +1,115 @@
+import os
+import sqlite3
+
+import pytest
+
+pytest.importorskip("plugins.nodenorm", exc_type=ImportError)
+
+from plugins.nodenorm import worker
+from plugins.nodenorm.static import IDENTIFIER_LOOKUP_DATABASE
+
+
+class FakeCollection:
+    def __init__(self, database: "FakeDatabase", name: str):
+        self.database = database
+        self.name = name
+
+    def rename(self, new_name: str, dropTarget: bool = False):
+        self.database.collection_names.remove(self.name)
+        self.database.collection_names.add(new_name)
+
+
+class FakeDatabase:
+    """
+    A stub of the hub source database listing and renaming the upload collections
+    """
+
+    def __init__(self):
+        self.collection_names = set()
+
+    def list_collection_names(self):
+        return list(self.collection_names)
+
+    def __getitem__(self, name: str):
+        return FakeCollection(self, name)
+
+
+@pytest.fixture
+def upload_database(monkeypatch):
+    database = FakeDatabase()
+    monkeypatch.setattr(worker, "get_src_db", lambda: database)
+    return database
+
+
+def identifiers(data_folder) -> list:
+    connection = sqlite3.connect(str(data_folder / IDENTIFIER_LOOKUP_DATABASE))
+    try:
+        return connection.execute("SELECT identifier, count FROM identifiers;").fetchall()
+    finally:
+        connection.close()
+
+
+def record_partition(data_folder, input_file, offset_start, offset_end, identifier_count, duplicate_candidates):
+    connection = worker.connect_identifier_database(data_folder)
+    checkpoint = (
+        str(input_file),
+        offset_start,
+        offset_end,
+        worker.generate_file_signature(input_file),
+        identifier_count,
+    )
+    worker.update_identifier_collection(connection, duplicate_candidates, checkpoint)
+    connection.close()
+
+
+def test_resume_interrupted_upload(tmp_path, upload_database):
+    input_file = tmp_path / "Disease.txt"
+    input_file.write_bytes(b'{"identifiers": [{"i": "MONDO:1"}]}\n' * 100)
+
+    # fresh upload
+    assert worker.prepare_upload_checkpoint(tmp_path, "upload_1") == {}
+    upload_database.collection_names.add("upload_1")
+    record_partition(tmp_path, input_file, 0, 1800, 50, ["MONDO:1"])
+
+    # interrupted, then retried by the hub into a new temporary collection
+    completed_partitions = worker.prepare_upload_checkpoint(tmp_path, "upload_2")
+    assert completed_partitions == {(str(input_file), 0, 1800): 50}
+    assert upload_database.collection_names == {"upload_2"}
+    # the duplicate candidates of the completed partitions are kept
+    assert identifiers(tmp_path) == [("MONDO:1", 1)]
+
+    # a file changed since, so the upload starts over
+    record_partition(tmp_path, input_file, 1800, 3600, 50, ["MONDO:2"])
+    input_file.write_bytes(b'{"identifiers": [{"i": "MONDO:3"}]}\n' * 100)
+    os.utime(input_file, ns=(0, 0))
+    assert worker.prepare_upload_checkpoint(tmp_path, "upload_3") == {}
+    assert identifiers(tmp_path) == []
+
+
+def test_no_resume_without_collection(tmp_path, upload_database):
+    input_file = tmp_path / "Disease.txt"
+    input_file.write_bytes(b'{"identifiers": [{"i": "MONDO:1"}]}\n' * 100)
+
+    assert worker.prepare_upload_checkpoint(tmp_path, "upload_1") == {}
+    record_partition(tmp_path, input_file, 0, 1800, 50, ["MONDO:1"])
+
+    # the collection of the interrupted upload is gone
+    assert worker.prepare_upload_checkpoint(tmp_path, "upload_2") == {}
+    assert identifiers(tmp_path) == []
+
+
+def test_previous_checkpoint_schema(tmp_path, upload_database):
+    connection = sqlite3.connect(str(tmp_path / IDENTIFIER_LOOKUP_DATABASE))
+    connection.execute(
+        "CREATE TABLE upload_partitions(input_file text NOT NULL, offset_start INT NOT NULL, "
+        "offset_end INT NOT NULL, signature text NOT NULL, document_count INT NOT NULL, "
+        "PRIMARY KEY (input_file, offset_start, offset_end));"
+    )
+    connection.execute("INSERT INTO upload_partitions VALUES ('Disease.txt', 0, 1800, 'signature', 50);")
+    connection.execute("CREATE TABLE upload_state(key text PRIMARY KEY NOT NULL, value text);")
+    connection.execute("INSERT INTO upload_state VALUES ('collection', 'upload_1');")
+    connection.commit()
+    connection.close()
+
+    upload_database.collection_names.add("upload_1")
+    assert worker.prepare_upload_checkpoint(tmp_path, "upload_2") == {}
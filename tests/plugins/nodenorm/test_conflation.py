@@ -0,0 +1,61 @@
+import sqlite3
+
+import pytest
+
+pytest.importorskip("plugins.nodenorm", exc_type=ImportError)
+
+from plugins.nodenorm.conflation import ConflationMap, build_conflation_map, build_conflation_map_from_database
+
+
+def test_conflation_map_round_trip(tmp_path):
+    conflation_sets = [
+        (["NCBIGene:1", "UniProtKB:P04217", "PR:P04217"], "GeneProtein"),
+        (["CHEBI:15377", "UNII:059QF0KO0R"], "DrugChemical"),
+        # UniProtKB:P04217 is already in the first set, which the lookup keeps finding
+        (["UniProtKB:P04217", "NCBIGene:2"], "GeneProtein"),
+        (["CHEBI:café"], "DrugChemical"),
+    ]
+    filepath = build_conflation_map(conflation_sets, tmp_path / "conflation.map")
+
+    conflation_map = ConflationMap(filepath)
+    try:
+        assert conflation_map.num_sets == 4
+        assert conflation_map.lookup("PR:P04217") == ("GeneProtein", ["NCBIGene:1", "UniProtKB:P04217", "PR:P04217"])
+        assert conflation_map.lookup("UNII:059QF0KO0R") == ("DrugChemical", ["CHEBI:15377", "UNII:059QF0KO0R"])
+        assert conflation_map.lookup("UniProtKB:P04217") == conflation_map.lookup("NCBIGene:1")
+        assert conflation_map.lookup("NCBIGene:2") == ("GeneProtein", ["UniProtKB:P04217", "NCBIGene:2"])
+        # the set of each CURIE is stored, rather than searched over the set ranges
+        curie_sets = [conflation_map.set_of(curie_id) for curie_id in range(conflation_map.num_curies)]
+        assert curie_sets == [0, 0, 0, 1, 1, 2, 2, 3]
+        assert conflation_map.lookup("CHEBI:café") == ("DrugChemical", ["CHEBI:café"])
+        assert conflation_map.lookup("NCBIGene:3") is None
+    finally:
+        conflation_map.close()
+
+
+def test_empty_conflation_map(tmp_path):
+    conflation_map = ConflationMap(build_conflation_map([], tmp_path / "conflation.map"))
+    try:
+        assert conflation_map.lookup("NCBIGene:1") is None
+    finally:
+        conflation_map.close()
+
+
+def test_conflation_map_from_database(tmp_path):
+    conflation_database = tmp_path / "conflation.db"
+    connection = sqlite3.connect(str(conflation_database))
+    connection.execute("CREATE TABLE conflation_sets (set_id INTEGER PRIMARY KEY, type text, identifiers text);")
+    connection.executemany(
+        "INSERT INTO conflation_sets VALUES (?, ?, ?)",
+        [(1, "DrugChemical", "CHEBI:15377,UNII:059QF0KO0R"), (0, "GeneProtein", "NCBIGene:1,PR:P04217")],
+    )
+    connection.commit()
+    connection.close()
+
+    conflation_map = ConflationMap(build_conflation_map_from_database(conflation_database, tmp_path / "conflation.map"))
+    try:
+        # the sets keep the order of their ids
+        assert conflation_map.conflation_set(0) == ("GeneProtein", ["NCBIGene:1", "PR:P04217"])
+        assert conflation_map.lookup("CHEBI:15377") == ("DrugChemical", ["CHEBI:15377", "UNII:059QF0KO0R"])
+    finally:
+        conflation_map.close()
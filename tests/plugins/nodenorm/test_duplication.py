@@ -0,0 +1,138 @@
+import pymongo
+import pytest
+
+pytest.importorskip("plugins.nodenorm", exc_type=ImportError)
+
+from plugins.nodenorm.duplication import (
+    MAX_FILTER_BYTES,
+    BloomFilter,
+    CurieDuplicateDetector,
+    find_duplicate_candidates,
+)
+from plugins.nodenorm import worker
+from plugins.nodenorm.worker import _curie_duplication_batch_handler, _estimate_identifier_count
+
+
+class FakeCollection:
+    """
+    A stub of the upload collection supporting the `$in` query on the identifiers and the bulk writes
+    of the duplicate cleanup
+    """
+
+    def __init__(self, documents: list[dict]):
+        self.documents = {document["_id"]: document for document in documents}
+        self.queries = []
+
+    def find(self, query: dict):
+        self.queries.append(query)
+        curies = set(query["identifiers.i"]["$in"])
+        return [
+            {**document, "identifiers": [dict(entry) for entry in document["identifiers"]]}
+            for document in self.documents.values()
+            if any(entry["i"] in curies for entry in document["identifiers"])
+        ]
+
+    def bulk_write(self, requests: list, ordered: bool = True):
+        for request in requests:
+            if isinstance(request, pymongo.DeleteOne):
+                del self.documents[request._filter["_id"]]
+            else:
+                self.documents[request._filter["_id"]] = request._doc
+
+
+def test_bloom_filter_size_is_capped():
+    num_bits, num_hashes = BloomFilter.optimal_size(1_000_000, 0.01)
+    assert num_bits == 9_585_059
+    assert num_hashes == 7
+
+    # a multi-GB input doesn't allocate more than the cap, at the cost of a higher false positive rate
+    num_bits, num_hashes = BloomFilter.optimal_size(2_000_000_000, 0.01)
+    assert num_bits == MAX_FILTER_BYTES * 8
+    assert BloomFilter.expected_false_positive_rate(num_bits, num_hashes, 2_000_000_000) > 0.01
+
+    bloom_filter = BloomFilter.from_capacity(10_000, shared=True, max_bytes=1024)
+    assert bloom_filter.num_bits == 1024 * 8
+    assert len(bloom_filter.shared_bits) == 1024
+
+
+def test_estimate_identifier_count(tmp_path):
+    line = b'{"type": "biolink:Gene", "identifiers": [{"i": "NCBIGene:1", "l": "A1BG"}, {"i": "HGNC:5"}]}\n'
+    (tmp_path / "Disease.txt").write_bytes(line * 1_000_000)
+    # extrapolated from the head of the file, which ends in the middle of a line
+    assert abs(_estimate_identifier_count(tmp_path) - 2_000_000) < 10
+
+
+def test_duplicate_candidates():
+    detector = CurieDuplicateDetector(capacity=1000)
+    assert detector.add(["MONDO:1", "MONDO:2"]) == []
+    assert detector.add(["MONDO:2", "MONDO:3"]) == ["MONDO:2"]
+    # a candidate is only reported once
+    assert detector.add(["MONDO:2"]) == []
+    assert detector.add_candidates(["MONDO:2", "MONDO:4"]) == ["MONDO:4"]
+    assert detector.candidates == {"MONDO:2", "MONDO:4"}
+
+
+def test_find_duplicate_candidates_with_shared_filter():
+    bloom_filter = BloomFilter.from_capacity(1000, shared=True)
+    # a worker process attaches to the same bits
+    worker_filter = BloomFilter(bloom_filter.num_bits, bloom_filter.num_hashes, bloom_filter.shared_bits)
+
+    # repeated within the batch
+    assert find_duplicate_candidates(["CHEBI:1", "CHEBI:2", "CHEBI:1"], worker_filter) == ["CHEBI:1"]
+    # seen by another batch
+    assert find_duplicate_candidates(["CHEBI:2", "CHEBI:3"], bloom_filter) == ["CHEBI:2"]
+    assert "CHEBI:3" in worker_filter
+
+
+def test_curie_duplication_batch_cleanup():
+    collection = FakeCollection(
+        [
+            # duplicated within a document
+            {"_id": "A", "type": "biolink:Gene", "identifiers": [{"i": "X:1"}, {"i": "X:1"}]},
+            # a subset of another document
+            {"_id": "B", "type": "biolink:Gene", "identifiers": [{"i": "Y:1"}, {"i": "Y:2"}]},
+            {"_id": "C", "type": "biolink:Gene", "identifiers": [{"i": "Y:1"}]},
+            # intersecting a protein document
+            {"_id": "D", "type": "biolink:Protein", "identifiers": [{"i": "Z:1"}, {"i": "Z:2"}]},
+            {"_id": "E", "type": "biolink:Gene", "identifiers": [{"i": "Z:1"}, {"i": "Z:3"}]},
+            # false positive of the bloom filter
+            {"_id": "F", "type": "biolink:Gene", "identifiers": [{"i": "W:1"}]},
+        ]
+    )
+
+    corrections = _curie_duplication_batch_handler(0, ["X:1", "Y:1", "Z:1", "W:1"], collection)
+    assert corrections == 3
+
+    # all the candidates of the batch are fetched in a single query
+    assert len(collection.queries) == 1
+    assert collection.documents["A"]["identifiers"] == [{"i": "X:1"}]
+    assert "C" not in collection.documents
+    assert collection.documents["B"]["identifiers"] == [{"i": "Y:1"}, {"i": "Y:2"}]
+    assert collection.documents["D"]["identifiers"] == [{"i": "Z:1"}, {"i": "Z:2"}]
+    assert collection.documents["E"]["identifiers"] == [{"i": "Z:3"}]
+    assert collection.documents["F"]["identifiers"] == [{"i": "W:1"}]
+
+
+def test_upload_workers_report_identifier_counts_and_candidates(tmp_path, monkeypatch):
+    uploaded_documents = []
+    monkeypatch.setattr(worker, "get_src_db", lambda: pymongo.MongoClient(connect=False)["pending_src"])
+    monkeypatch.setattr(worker, "_upload_buffer", lambda collection, buffer, *args: uploaded_documents.extend(buffer))
+
+    input_file = tmp_path / "Disease.txt"
+    input_file.write_bytes(
+        b'{"type": "biolink:Disease", "ic": "100", "identifiers": [{"i": "MONDO:1"}, {"i": "DOID:1"}]}\n'
+        b'{"type": "biolink:Disease", "ic": "100", "identifiers": [{"i": "MONDO:2"}, {"i": "DOID:1"}]}\n'
+        b'{"type": "biolink:Disease", "ic": "100", "identifiers": [{"i": "MONDO:3"}]}\n'
+        b'{"type": "biolink:Disease", "ic": "100", "identifiers": [{"i": "MONDO:4"}, {"i": "MONDO:1"}]}\n'
+    )
+    split = input_file.read_bytes().index(b'{"type": "biolink:Disease", "ic": "100", "identifiers": [{"i": "MONDO:3"}')
+
+    # the workers of both partitions share the same filter
+    bloom_filter = BloomFilter.from_capacity(1000, shared=True)
+    monkeypatch.setattr(worker, "_DUPLICATE_FILTER", bloom_filter)
+    first_partition = worker.subset_upload_worker(input_file, 1, 0, split, "upload")
+    second_partition = worker.subset_upload_worker(input_file, 1, split, input_file.stat().st_size, "upload")
+
+    assert len(uploaded_documents) == 4
+    assert first_partition == (4, ["DOID:1"])
+    assert second_partition == (3, ["MONDO:1"])
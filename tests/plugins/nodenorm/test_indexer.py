@@ -0,0 +1,149 @@
+from pathlib import Path
+
+import orjson
+import pytest
+
+pytest.importorskip("plugins.nodenorm", exc_type=ImportError)
+
+from plugins.nodenorm import indexer
+from plugins.nodenorm.duplication import CurieDuplicateDetector
+
+
+class FakeIndices:
+    def __init__(self, aliases: dict[str, list[str]]):
+        self.aliases = aliases
+        self.created = []
+        self.deleted = []
+        self.refreshed = 0
+
+    def create(self, index: str, settings: dict, mappings: dict):
+        self.created.append(index)
+
+    def exists_alias(self, name: str) -> bool:
+        return name in self.aliases
+
+    def get_alias(self, name: str) -> dict:
+        return {index: {"aliases": {name: {}}} for index in self.aliases[name]}
+
+    def update_aliases(self, actions: list[dict]):
+        for action in actions:
+            if "remove" in action:
+                self.aliases[action["remove"]["alias"]].remove(action["remove"]["index"])
+            else:
+                self.aliases.setdefault(action["add"]["alias"], []).append(action["add"]["index"])
+
+    def delete(self, index: str, ignore_unavailable: bool = False):
+        self.deleted.append(index)
+
+    def refresh(self, index: str):
+        self.refreshed += 1
+
+
+class FakeElasticsearch:
+    """
+    A stub of the client over a single index, answering the `_bulk` requests with the given item errors
+    """
+
+    def __init__(self, documents: list[dict] = (), aliases: dict[str, list[str]] = None, errors: dict = None):
+        self.documents = {document["_id"]: document for document in documents}
+        self.indices = FakeIndices(aliases or {})
+        self.errors = errors or {}
+
+    def bulk(self, operations: str) -> dict:
+        lines = [orjson.loads(line) for line in operations.splitlines() if line]
+        items = []
+        while lines:
+            action, metadata = next(iter(lines.pop(0).items()))
+            source = lines.pop(0) if action != "delete" else None
+            result = {"_id": metadata["_id"], "status": 200}
+            if metadata["_id"] in self.errors:
+                result.update(status=400, error=self.errors[metadata["_id"]])
+            elif action == "create" and metadata["_id"] in self.documents:
+                result.update(status=409, error={"type": "version_conflict_engine_exception"})
+            elif action == "delete":
+                del self.documents[metadata["_id"]]
+            else:
+                self.documents[metadata["_id"]] = {**source, "_id": metadata["_id"]}
+            items.append({action: result})
+        return {"errors": any("error" in next(iter(item.values())) for item in items), "items": items}
+
+    def mget(self, index: str, ids: list[str]) -> dict:
+        return {"docs": [{"_id": _id, "_source": self.documents[_id]} for _id in ids]}
+
+    def scan(self, client, index: str, query: dict):
+        curies = set(query["query"]["terms"]["identifiers.i"])
+        for document in list(self.documents.values()):
+            if any(entry["i"] in curies for entry in document["identifiers"]):
+                source = {key: value for key, value in document.items() if key != "_id"}
+                yield {"_id": document["_id"], "_source": orjson.loads(orjson.dumps(source))}
+
+
+def test_swap_index_alias_keeps_previous_indices():
+    client = FakeElasticsearch(aliases={"pending-nodenorm": ["pending-nodenorm_1"]})
+    indexer.swap_index_alias(client, "pending-nodenorm", "pending-nodenorm_2")
+    assert client.indices.aliases["pending-nodenorm"] == ["pending-nodenorm_2"]
+    assert client.indices.deleted == []
+
+    indexer.swap_index_alias(client, "pending-nodenorm", "pending-nodenorm_3", delete_previous=True)
+    assert client.indices.aliases["pending-nodenorm"] == ["pending-nodenorm_3"]
+    assert client.indices.deleted == ["pending-nodenorm_2"]
+
+
+def test_bulk_conflicts_errors_are_raised():
+    existing = {"_id": "MONDO:1", "type": "biolink:Disease", "identifiers": [{"i": "MONDO:1"}]}
+    client = FakeElasticsearch([existing], errors={"MONDO:1": {"type": "mapper_parsing_exception"}})
+    with pytest.raises(RuntimeError, match="Unable to index document MONDO:1"):
+        indexer._handle_bulk_conflicts(client, "pending-nodenorm_1", {"MONDO:1": [{"ic": 100.0}]})
+
+
+def test_index_buffer_merges_every_copy_of_an_id():
+    client = FakeElasticsearch()
+    buffer = [
+        {"_id": "NCBIGene:1", "type": "biolink:Gene", "identifiers": [{"i": "NCBIGene:1"}]},
+        {"_id": "NCBIGene:1", "type": "biolink:Gene", "identifiers": [{"i": "NCBIGene:1"}, {"i": "HGNC:5"}]},
+        {"_id": "NCBIGene:1", "type": "biolink:Gene", "identifiers": [{"i": "NCBIGene:1"}, {"i": "ENSEMBL:1"}]},
+        {"_id": "NCBIGene:2", "type": "biolink:Gene", "identifiers": [{"i": "NCBIGene:2"}]},
+    ]
+    indexer._index_buffer(client, "pending-nodenorm_1", buffer, Path("Gene.txt"), 1.0)
+
+    assert sorted(client.documents) == ["NCBIGene:1", "NCBIGene:2"]
+    identifiers = [entry["i"] for entry in client.documents["NCBIGene:1"]["identifiers"]]
+    assert sorted(identifiers) == ["ENSEMBL:1", "HGNC:5", "NCBIGene:1"]
+
+
+def test_failed_upload_deletes_the_index(tmp_path, monkeypatch):
+    client = FakeElasticsearch(aliases={"pending-nodenorm": ["pending-nodenorm_1"]})
+    monkeypatch.setattr(indexer, "_es_client", lambda es_upload: client)
+
+    def create_conflation_map(data_folder):
+        raise OSError("Unable to locate conflation file")
+
+    monkeypatch.setattr(indexer, "create_conflation_map", create_conflation_map)
+    with pytest.raises(OSError):
+        indexer.es_upload_process(tmp_path, {"host": "http://localhost:9200", "alias": "pending-nodenorm"}, {})
+
+    assert len(client.indices.created) == 1
+    assert client.indices.deleted == client.indices.created
+    assert client.indices.aliases["pending-nodenorm"] == ["pending-nodenorm_1"]
+
+
+def test_index_curie_duplication_cleanup(monkeypatch):
+    client = FakeElasticsearch(
+        [
+            # a subset of another document
+            {"_id": "B", "type": "biolink:Gene", "identifiers": [{"i": "Y:1"}, {"i": "Y:2"}]},
+            {"_id": "C", "type": "biolink:Gene", "identifiers": [{"i": "Y:1"}]},
+            # intersecting a protein document
+            {"_id": "D", "type": "biolink:Protein", "identifiers": [{"i": "Z:1"}, {"i": "Z:2"}]},
+            {"_id": "E", "type": "biolink:Gene", "identifiers": [{"i": "Z:1"}, {"i": "Z:3"}]},
+        ]
+    )
+    monkeypatch.setattr(indexer, "scan", client.scan)
+
+    duplicate_detector = CurieDuplicateDetector(capacity=1000)
+    duplicate_detector.add_candidates(["Y:1", "Z:1"])
+    indexer.cleanup_index_curie_duplication(client, "pending-nodenorm_1", duplicate_detector)
+
+    assert sorted(client.documents) == ["B", "D", "E"]
+    assert client.documents["E"]["identifiers"] == [{"i": "Z:3"}]
+    assert client.indices.refreshed == 1
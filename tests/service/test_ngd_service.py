@@ -0,0 +1,294 @@
+import asyncio
+import math
+
+import numpy as np
+import pytest
+from elastic_transport import ApiResponseMeta, HttpHeaders, NodeConfig
+from elasticsearch import AuthorizationException
+
+from web.service.ngd_precompute import PrecomputedNGDTable
+from web.service.ngd_service import (
+    DocStatsCache,
+    DocStatsService,
+    ExpandedTermSetStore,
+    NGDCache,
+    NGDService,
+    Term,
+    TermPair,
+    TermExpansionService,
+)
+from web.utils import INFINITY_STR, NGDZeroDocFreqException
+
+
+class NoExpansionService(TermExpansionService):
+    def expand(self, term):
+        return []
+
+
+class CountingDocStatsService:
+    """
+    A stub of `DocStatsService` that counts the queries it receives instead of sending them to ES.
+    Each query yields to the event loop so that concurrent callers can interleave, as with a real ES round-trip.
+    """
+
+    def __init__(self, unary_doc_freqs: dict, bipartite_doc_freq: int, doc_total: int):
+        self.unary_doc_freqs = unary_doc_freqs
+        self.bipartite_doc_freq_value = bipartite_doc_freq
+        self.doc_total_value = doc_total
+
+        self.unary_calls = 0
+        self.bipartite_calls = 0
+        self.total_calls = 0
+        self.bulk_unary_calls = 0
+        self.bulk_bipartite_calls = 0
+
+    async def unary_doc_freq(self, term: Term) -> int:
+        self.unary_calls += 1
+        await asyncio.sleep(0.01)
+        return self.unary_doc_freqs[term.root]
+
+    async def bipartite_doc_freq(self, term_pair: TermPair) -> int:
+        self.bipartite_calls += 1
+        await asyncio.sleep(0.01)
+        return self.bipartite_doc_freq_value
+
+    async def doc_total(self) -> int:
+        self.total_calls += 1
+        await asyncio.sleep(0.01)
+        return self.doc_total_value
+
+    async def bulk_unary_doc_freq(self, terms: list) -> list:
+        self.bulk_unary_calls += 1
+        await asyncio.sleep(0.01)
+        return [self.unary_doc_freqs[term.root] for term in terms]
+
+    async def bulk_bipartite_doc_freq(self, term_x: Term, terms_y: list) -> list:
+        self.bulk_bipartite_calls += 1
+        await asyncio.sleep(0.01)
+        return [self.bipartite_doc_freq_value for _ in terms_y]
+
+
+def make_ngd_service(doc_stats_service: CountingDocStatsService) -> NGDService:
+    return NGDService(
+        doc_stats_service=doc_stats_service,
+        term_expansion_service=NoExpansionService(),
+        doc_stats_cache=DocStatsCache(unary_capacity=16, bipartite_capacity=16),
+        ngd_cache=NGDCache(capacity=16),
+    )
+
+
+def make_term_pair(term_x: str, term_y: str) -> TermPair:
+    return TermPair(term_x=Term(root=term_x, expandable=False), term_y=Term(root=term_y, expandable=False))
+
+
+def test_concurrent_identical_requests_query_es_once():
+    doc_stats_service = CountingDocStatsService({"C0001": 100, "C0002": 200}, bipartite_doc_freq=10, doc_total=10000)
+    ngd_service = make_ngd_service(doc_stats_service)
+
+    async def calculate_all():
+        tasks = [ngd_service.calculate_ngd(make_term_pair("C0001", "C0002")) for _ in range(50)]
+        return await asyncio.gather(*tasks)
+
+    distances = asyncio.run(calculate_all())
+
+    assert len(set(distances)) == 1
+    assert doc_stats_service.unary_calls == 2
+    assert doc_stats_service.bipartite_calls == 1
+    assert doc_stats_service.total_calls == 1
+
+
+def test_concurrent_pairs_share_unary_doc_freq_queries():
+    doc_stats_service = CountingDocStatsService(
+        {"C0001": 100, "C0002": 200, "C0003": 300}, bipartite_doc_freq=0, doc_total=10000
+    )
+    ngd_service = make_ngd_service(doc_stats_service)
+
+    async def calculate_all():
+        # "C0001" is the popular term shared by both pairs
+        tasks = [
+            ngd_service.calculate_ngd(make_term_pair("C0001", "C0002")),
+            ngd_service.calculate_ngd(make_term_pair("C0001", "C0003")),
+        ]
+        return await asyncio.gather(*tasks)
+
+    distances = asyncio.run(calculate_all())
+
+    assert distances == [INFINITY_STR, INFINITY_STR]
+    assert doc_stats_service.unary_calls == 3
+    assert doc_stats_service.bipartite_calls == 2
+    assert doc_stats_service.total_calls == 0  # f_xy == 0, so no need to query the total
+
+
+def test_concurrent_undefined_ngd_is_propagated_and_not_cached():
+    doc_stats_service = CountingDocStatsService({"C0001": 0, "C0002": 200}, bipartite_doc_freq=10, doc_total=10000)
+    ngd_service = make_ngd_service(doc_stats_service)
+
+    async def calculate_all():
+        tasks = [ngd_service.calculate_ngd(make_term_pair("C0001", "C0002")) for _ in range(10)]
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    results = asyncio.run(calculate_all())
+
+    assert all(isinstance(result, NGDZeroDocFreqException) for result in results)
+    assert doc_stats_service.unary_calls == 1
+    assert ngd_service.ngd_cache.read_distance(make_term_pair("C0001", "C0002").cache_key) is None
+
+    with pytest.raises(NGDZeroDocFreqException):
+        # the unary doc freq of "C0001" is cached, but the NGD is still undefined
+        asyncio.run(ngd_service.calculate_ngd(make_term_pair("C0001", "C0002")))
+    assert doc_stats_service.unary_calls == 1
+
+
+def test_ngd_matrix_queries_in_bulk():
+    doc_stats_service = CountingDocStatsService(
+        {"C0001": 100, "C0002": 0, "C0003": 300, "C0004": 400}, bipartite_doc_freq=10, doc_total=10000
+    )
+    ngd_service = make_ngd_service(doc_stats_service)
+
+    terms_x = [Term(root=root, expandable=False) for root in ("C0001", "C0002")]
+    terms_y = [Term(root=root, expandable=False) for root in ("C0003", "C0004")]
+    ngd_matrix = asyncio.run(ngd_service.calculate_ngd_matrix(terms_x, terms_y))
+
+    assert ngd_matrix.shape == (2, 2)
+    assert np.isnan(ngd_matrix[1]).all()  # "C0002" has zero document frequency
+    assert np.isfinite(ngd_matrix[0]).all()
+    assert doc_stats_service.bulk_unary_calls == 2  # one for terms_x and one for terms_y
+    assert doc_stats_service.bulk_bipartite_calls == 1  # the row of "C0002" is skipped
+
+    # the bulk results are cached for the pairwise endpoint
+    distance = asyncio.run(ngd_service.calculate_ngd(make_term_pair("C0001", "C0004")))
+    assert math.isclose(distance, ngd_matrix[0, 1])
+    assert doc_stats_service.unary_calls == 0
+    assert doc_stats_service.bipartite_calls == 0
+
+
+class RecordingESClient:
+    """
+    A stub of `AsyncElasticsearch` that records the indexed documents and the search bodies.
+    """
+
+    def __init__(self):
+        self.indexed = []
+        self.searched = []
+
+    async def index(self, index, id, document):
+        self.indexed.append((index, id, document))
+        await asyncio.sleep(0.01)
+
+    async def search(self, body, index):
+        self.searched.append(body)
+        await asyncio.sleep(0.01)
+        return {"aggregations": {"agg": {"value": 42.0}}}
+
+
+def test_large_expanded_term_set_is_stored_once_and_looked_up():
+    es_client = RecordingESClient()
+    term_set_store = ExpandedTermSetStore(index_name="term-sets", min_size=3)
+    doc_stats_service = DocStatsService(
+        es_async_client=es_client,
+        es_index_name="semmeddb",
+        subject_field_name="subject.umls",
+        object_field_name="object.umls",
+        doc_freq_agg_name="agg",
+        term_set_store=term_set_store,
+    )
+
+    large_term = Term(root="C0001", expandable=True)
+    large_term.expand(["C0002", "C0003", "C0004"])
+    small_term = Term(root="C0005", expandable=False)
+
+    async def query_all():
+        tasks = [doc_stats_service.unary_doc_freq(large_term) for _ in range(5)]
+        tasks.append(doc_stats_service.bipartite_doc_freq(TermPair(term_x=large_term, term_y=small_term)))
+        return await asyncio.gather(*tasks)
+
+    assert asyncio.run(query_all()) == [42] * 6
+    assert es_client.indexed == [("term-sets", "C0001*", {"umls": ["C0001", "C0002", "C0003", "C0004"]})]
+
+    lookup = {"index": "term-sets", "id": "C0001*", "path": "umls"}
+    last_body = es_client.searched[-1]
+    must = last_body["query"]["bool"]["filter"][0]["bool"]["should"][0]["bool"]["must"]
+    assert {"terms": {"subject.umls": lookup}} in must
+    assert {"terms": {"object.umls": ["C0005"]}} in must
+
+    size_metrics = term_set_store.size_metrics.to_dict()
+    assert size_metrics["count"] == 7
+    assert size_metrics["max"] == 4
+
+
+def test_precomputed_table_is_checked_before_es(tmp_path):
+    filepath = str(tmp_path / "top_pairs.json.gz")
+    PrecomputedNGDTable(distances={"C0001,C0002": 0.5}, metadata={"top_k": 1}).dump(filepath)
+    precomputed_ngd_table = PrecomputedNGDTable.load(filepath)
+
+    doc_stats_service = CountingDocStatsService({"C0001": 100, "C0003": 300}, bipartite_doc_freq=10, doc_total=10000)
+    ngd_service = NGDService(
+        doc_stats_service=doc_stats_service,
+        term_expansion_service=NoExpansionService(),
+        doc_stats_cache=DocStatsCache(unary_capacity=16, bipartite_capacity=16),
+        ngd_cache=NGDCache(capacity=16),
+        precomputed_ngd_table=precomputed_ngd_table,
+    )
+
+    assert asyncio.run(ngd_service.calculate_ngd(make_term_pair("C0002", "C0001"))) == 0.5
+    assert doc_stats_service.unary_calls == 0
+
+    asyncio.run(ngd_service.calculate_ngd(make_term_pair("C0001", "C0003")))
+    assert doc_stats_service.unary_calls == 2
+
+    stats = precomputed_ngd_table.stats()
+    assert stats["top_k"] == 1
+    assert stats["lookups"] == 2
+    assert stats["coverage"] == 0.5
+
+
+def test_precomputed_table_is_disabled_on_another_index_build():
+    precomputed_ngd_table = PrecomputedNGDTable(
+        distances={"C0001,C0002": 0.5}, metadata={"index_build": "semmeddb_20230101"}
+    )
+
+    # e.g. the index was rebuilt since the table was precomputed
+    assert not precomputed_ngd_table.check_index_build("semmeddb_20240101")
+    assert precomputed_ngd_table.lookup("C0001,C0002") is None
+    assert precomputed_ngd_table.stats()["lookups"] == 0
+
+    assert precomputed_ngd_table.check_index_build("semmeddb_20230101")
+    assert precomputed_ngd_table.lookup("C0001,C0002") == 0.5
+
+
+class FailingIndexESClient(RecordingESClient):
+    """
+    A stub of `AsyncElasticsearch` failing to index the documents with the given exception.
+    """
+
+    def __init__(self, exception: Exception):
+        super().__init__()
+        self.exception = exception
+
+    async def index(self, index, id, document):
+        self.indexed.append((index, id, document))
+        raise self.exception
+
+
+def test_term_set_storing_failures_are_not_retried():
+    large_terms = [Term(root=f"C000{i}", expandable=True) for i in range(3)]
+    for term in large_terms:
+        term.expand(["C0010", "C0011", "C0012"])
+
+    # a failing term set is sent inline without trying to store it again
+    es_client = FailingIndexESClient(ConnectionError("timeout"))
+    term_set_store = ExpandedTermSetStore(index_name="term-sets", min_size=3)
+    for _ in range(3):
+        asyncio.run(term_set_store.store(es_client, large_terms[0]))
+    assert len(es_client.indexed) == 1
+    assert not term_set_store.is_stored(large_terms[0])
+    assert not term_set_store.disabled
+
+    # an index which can't be written turns the store off for all the term sets
+    meta = ApiResponseMeta(403, "1.1", HttpHeaders(), 0.0, NodeConfig("http", "localhost", 9200))
+    es_client = FailingIndexESClient(AuthorizationException("read-only user", meta=meta, body={}))
+    term_set_store = ExpandedTermSetStore(index_name="term-sets", min_size=3)
+    for term in large_terms:
+        asyncio.run(term_set_store.store(es_client, term))
+    assert len(es_client.indexed) == 1
+    assert term_set_store.disabled
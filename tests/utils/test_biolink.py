@@ -0,0 +1,67 @@
+import sys
+import types
+
+from web.utils import biolink
+from web.utils.biolink import BiolinkModel
+
+
+class FakeToolkit:
+    elements = {
+        "named thing": {"class_uri": "biolink:NamedThing"},
+        "gene or gene product": {"class_uri": "biolink:GeneOrGeneProduct"},
+        "gene": {"class_uri": "biolink:Gene"},
+        "RNA product": {"class_uri": "biolink:RNAProduct"},
+    }
+    ancestors = {
+        "named thing": ["named thing"],
+        "gene or gene product": ["gene or gene product"],
+        "gene": ["gene", "gene or gene product", "named thing"],
+        "RNA product": ["RNA product", "named thing"],
+    }
+
+    def get_all_classes(self):
+        return list(self.elements)
+
+    def get_element(self, name):
+        return self.elements[name]
+
+    def get_ancestors(self, name):
+        return self.ancestors[name]
+
+
+def test_biolink_model_ancestors(tmp_path):
+    artifact = tmp_path / "biolink-model-v0.0.1.json"
+    BiolinkModel.from_toolkit("v0.0.1", FakeToolkit()).dump(artifact)
+    biolink_model = BiolinkModel.load(artifact)
+
+    assert biolink_model.version == "v0.0.1"
+    expected_ancestors = ["biolink:Gene", "biolink:GeneOrGeneProduct", "biolink:NamedThing"]
+    for name in ("biolink:Gene", "Gene", "gene"):
+        assert biolink_model.get_ancestor_class_uris(name) == expected_ancestors
+
+    assert biolink_model.get_ancestor_class_uris("biolink:RNAProduct") == ["biolink:RNAProduct", "biolink:NamedThing"]
+    assert biolink_model.get_ancestor_class_uris("RNA_product") == ["biolink:RNAProduct", "biolink:NamedThing"]
+    assert biolink_model.get_ancestor_class_uris("biolink:Unknown") == []
+
+
+def test_biolink_model_cache_not_writable(tmp_path, monkeypatch):
+    # the cache folder can't be created below a file, as with a read-only assets folder
+    (tmp_path / "assets").write_text("")
+    monkeypatch.setattr(biolink, "BIOLINK_CACHE_DIRECTORY", tmp_path / "assets" / "biolink")
+    toolkits = []
+
+    def toolkit(model_url: str) -> FakeToolkit:
+        toolkits.append(model_url)
+        return FakeToolkit()
+
+    monkeypatch.setitem(sys.modules, "bmt", types.SimpleNamespace(Toolkit=toolkit))
+
+    biolink.get_biolink_model.cache_clear()
+    try:
+        biolink_model = biolink.get_biolink_model("v0.0.1")
+        assert biolink_model.get_ancestor_class_uris("gene")[0] == "biolink:Gene"
+        # built once and kept in memory
+        assert biolink.get_biolink_model("v0.0.1") is biolink_model
+        assert len(toolkits) == 1
+    finally:
+        biolink.get_biolink_model.cache_clear()
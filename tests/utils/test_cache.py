@@ -0,0 +1,50 @@
+import asyncio
+
+from web.utils import LRUCache, SingleFlight
+
+
+def test_lru_cache_stats():
+    cache = LRUCache(capacity=2)
+
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)  # evicts "b", the least recently used key
+    assert cache.get("b") is None
+
+    stats = cache.stats()
+    assert stats["size"] == 2
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_ratio"] == 0.5
+    assert stats["evictions"] == 1
+    assert stats["approximate_memory_bytes"] > 0
+
+    cache.clear()
+    stats = cache.stats()
+    assert stats["size"] == 0
+    assert stats["hits"] == stats["misses"] == stats["evictions"] == 0
+    assert stats["hit_ratio"] is None
+
+
+def test_single_flight_cancelled_caller():
+    single_flight = SingleFlight()
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "value"
+
+    async def run():
+        first = asyncio.ensure_future(single_flight.do("key", loader))
+        second = asyncio.ensure_future(single_flight.do("key", loader))
+        await asyncio.sleep(0)
+        # the first caller going away must not fail the call it shares with the second one
+        first.cancel()
+        assert await second == "value"
+        assert first.cancelled()
+
+    asyncio.run(run())
+    assert len(calls) == 1
+    assert "key" not in single_flight
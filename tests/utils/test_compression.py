@@ -0,0 +1,60 @@
+import gzip
+
+import tornado.httputil
+
+from web.utils.compression import CompressionContentEncoding, CompressionStatistics, negotiate_encoding
+
+
+def test_negotiate_encoding():
+    encodings = ["zstd", "br", "gzip"]
+    assert negotiate_encoding("gzip, deflate, br", encodings) == "br"
+    assert negotiate_encoding("gzip;q=1.0, br;q=0.5", encodings) == "gzip"
+    assert negotiate_encoding("br;q=0, *", encodings) == "zstd"
+    assert negotiate_encoding("deflate", encodings) is None
+    assert negotiate_encoding("", encodings) is None
+
+
+def compression_transform(accept_encoding: str, statistics: CompressionStatistics) -> CompressionContentEncoding:
+    request = tornado.httputil.HTTPServerRequest(
+        method="GET",
+        uri="/nodenorm/get_normalized_nodes",
+        headers=tornado.httputil.HTTPHeaders({"Accept-Encoding": accept_encoding}),
+    )
+    request.endpoint = "nodenorm/NormalizedNodesHandler"
+    return CompressionContentEncoding(request, ["gzip"], 1024, statistics)
+
+
+def test_compression_content_encoding():
+    statistics = CompressionStatistics()
+    json_headers = {"Content-Type": "application/json; charset=UTF-8"}
+
+    # under the minimum length
+    transform = compression_transform("gzip", statistics)
+    _, headers, chunk = transform.transform_first_chunk(200, tornado.httputil.HTTPHeaders(json_headers), b"{}", True)
+    assert "Content-Encoding" not in headers
+    assert chunk == b"{}"
+
+    # streamed response, compressed incrementally
+    transform = compression_transform("gzip", statistics)
+    body = [b'{"NCBIGene:1017":' * 100, b'{"id":"NCBIGene:1017"}' * 100, b"}"]
+    _, headers, first_chunk = transform.transform_first_chunk(
+        200, tornado.httputil.HTTPHeaders(json_headers), body[0], False
+    )
+    assert headers["Content-Encoding"] == "gzip"
+    assert headers["Vary"] == "Accept-Encoding"
+    chunks = [first_chunk, transform.transform_chunk(body[1], False), transform.transform_chunk(body[2], True)]
+    assert gzip.decompress(b"".join(chunks)) == b"".join(body)
+
+    # not accepted by the client
+    transform = compression_transform("identity", statistics)
+    _, headers, chunk = transform.transform_first_chunk(
+        200, tornado.httputil.HTTPHeaders(json_headers), b"[]" * 1024, True
+    )
+    assert "Content-Encoding" not in headers
+
+    endpoint_statistics = statistics.endpoints["nodenorm/NormalizedNodesHandler"]
+    assert endpoint_statistics.compressed_responses == 1
+    assert endpoint_statistics.uncompressed_bytes == sum(len(chunk) for chunk in body)
+    assert endpoint_statistics.compressed_bytes == sum(len(chunk) for chunk in chunks)
+    assert endpoint_statistics.skipped_responses == 1
+    assert endpoint_statistics.encodings == {"gzip": 1}
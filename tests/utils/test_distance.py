@@ -0,0 +1,33 @@
+import math
+
+import numpy as np
+
+from web.utils import normalized_google_distance, normalized_google_distance_matrix
+
+
+def test_matrix_matches_pairwise_distance():
+    n = 10**6
+    f_x = np.array([100, 2000, 30000])
+    f_y = np.array([50, 700])
+    f_xy = np.array([[10, 20], [30, 0], [1, 700]])
+
+    ngd_matrix = normalized_google_distance_matrix(n=n, f_x=f_x, f_y=f_y, f_xy=f_xy)
+
+    assert ngd_matrix.shape == (3, 2)
+    for i in range(3):
+        for j in range(2):
+            expected = normalized_google_distance(n=n, f_x=int(f_x[i]), f_y=int(f_y[j]), f_xy=int(f_xy[i, j]))
+            if math.isinf(expected):
+                assert np.isposinf(ngd_matrix[i, j])
+            else:
+                assert math.isclose(ngd_matrix[i, j], expected)
+
+
+def test_matrix_zero_doc_freq_is_undefined():
+    ngd_matrix = normalized_google_distance_matrix(
+        n=10**6, f_x=np.array([0, 100]), f_y=np.array([50, 0]), f_xy=np.array([[0, 0], [10, 0]])
+    )
+
+    assert np.isnan(ngd_matrix[0]).all()
+    assert np.isnan(ngd_matrix[:, 1]).all()
+    assert math.isclose(ngd_matrix[1, 0], normalized_google_distance(n=10**6, f_x=100, f_y=50, f_xy=10))
@@ -0,0 +1,25 @@
+import asyncio
+import threading
+
+from web.utils.executor import OffloadExecutor
+
+
+def current_thread_name(_: list) -> str:
+    return threading.current_thread().name
+
+
+def test_offload_executor_threshold():
+    offload_executor = OffloadExecutor("thread", max_workers=1)
+
+    async def run_all():
+        small = await offload_executor.run(current_thread_name, [1], size=1, threshold=10)
+        large = await offload_executor.run(current_thread_name, list(range(10)), size=10, threshold=10)
+        return small, large
+
+    small, large = asyncio.run(run_all())
+    offload_executor.shutdown()
+
+    assert small == threading.current_thread().name
+    assert large.startswith("offload")
+    assert offload_executor.inline_calls == 1
+    assert offload_executor.offloaded_calls == 1
@@ -0,0 +1,42 @@
+import datetime
+import math
+from collections import UserDict
+
+import pytest
+
+from biothings.utils.serializer import to_json
+
+from web.utils.serializer import to_json_bytes
+
+
+def test_to_json_bytes_matches_biothings():
+    response = {
+        "NCBIGene:1017": {"id": {"identifier": "NCBIGene:1017", "label": "CDK2"}, "information_content": 100.0},
+        "MONDO:0005148": {"id": {"label": "type 2 diabetes mellitus (été)"}, "information_content": 0.1 + 0.2},
+        "unknown": None,
+        1: UserDict({"z": 1, "a": [1.5e-10, 3]}),
+    }
+    body = to_json_bytes(response)
+
+    assert isinstance(body, bytes)
+    assert body == to_json(response).encode("utf-8")
+    assert body.startswith(b'{"NCBIGene:1017":{"id":{"identifier"')
+    assert b"0.30000000000000004" in body
+
+
+def test_to_json_bytes_special_values():
+    response = {
+        "nan": math.nan,
+        "inf": -math.inf,
+        "created": datetime.datetime(2026, 1, 2, 3, 4, 5),
+        "released": datetime.date(2026, 1, 2),
+    }
+    body = to_json_bytes(response)
+
+    assert body == to_json(response).encode("utf-8")
+    assert body == b'{"nan":null,"inf":null,"created":"2026-01-02T03:04:05+00:00","released":"2026-01-02"}'
+
+
+def test_to_json_bytes_unsupported_type():
+    with pytest.raises(TypeError):
+        to_json_bytes({"value": object()})
@@ -0,0 +1,118 @@
+import asyncio
+import re
+
+from biothings.web.query import ESQueryBuilder, ESResultFormatter
+
+from web.engine import NodeExpansionBackend, NodeExpansionQueryPipeline
+
+
+# same as config_web.node_expansion, whose package can't be imported on its own
+ES_INDEX = ["pending-go", "pending-doid", "pending-mondo", "pending-chebi"]
+ES_DOC_TYPE = "node"
+ANNOTATION_ID_REGEX_LIST = [(re.compile(r"(GO|DOID|MONDO|CHEBI)\:[0-9]+", re.I), ["_id"])]
+ANNOTATION_DEFAULT_SCOPES = ["_id"]
+
+
+class FakeElasticsearch:
+    """
+    A stub of the async Elasticsearch client answering from the documents of each index.
+    Each request yields to the event loop so that concurrent requests can interleave, as with a real ES round-trip.
+    """
+
+    def __init__(self, documents: dict):
+        self.documents = documents
+        self.requests = []
+        self.pending = 0
+        self.max_pending = 0
+
+    def _search(self, index, body):
+        # only the match queries over _id find a document
+        _id = body["query"].get("multi_match", {}).get("query")
+        hits = [
+            {"_index": _index, "_id": _id, "_score": 1.0, "_source": {}}
+            for _index in index.split(",")
+            if _id in self.documents.get(_index, ())
+        ]
+        return {"hits": {"total": len(hits), "max_score": 1.0, "hits": hits}}
+
+    async def _request(self, index):
+        self.requests.append(index)
+        self.pending += 1
+        self.max_pending = max(self.max_pending, self.pending)
+        await asyncio.sleep(0.01)
+        self.pending -= 1
+
+    async def search(self, index, **body):
+        await self._request(index)
+        return self._search(index, body)
+
+    async def msearch(self, body, index):
+        await self._request(index)
+        # the header and the body of each search alternate
+        return {
+            "responses": [
+                self._search(header.get("index", index), query) for header, query in zip(body[::2], body[1::2])
+            ]
+        }
+
+
+def make_pipeline(client):
+    indices = {ES_DOC_TYPE: ",".join(ES_INDEX)}
+    builder = ESQueryBuilder(scopes_regexs=ANNOTATION_ID_REGEX_LIST, scopes_default=ANNOTATION_DEFAULT_SCOPES)
+    backend = NodeExpansionBackend(client, indices)
+    return NodeExpansionQueryPipeline(builder, backend, ESResultFormatter())
+
+
+def test_route_by_prefix():
+    backend = NodeExpansionBackend(None, {ES_DOC_TYPE: ES_INDEX})
+    assert backend.route("GO:0008150", ES_DOC_TYPE) == "pending-go"
+    assert backend.route("mondo:0005737", ES_DOC_TYPE) == "pending-mondo"
+    assert backend.route("HP:0006990", ES_DOC_TYPE) is None
+    assert backend.route("asthma", ES_DOC_TYPE) is None
+
+
+def test_fetch_single_index():
+    client = FakeElasticsearch({"pending-doid": ["DOID:2841"]})
+    pipeline = make_pipeline(client)
+
+    result = asyncio.run(pipeline.fetch("DOID:2841", biothing_type=ES_DOC_TYPE))
+    assert result["_id"] == "DOID:2841"
+    assert client.requests == ["pending-doid"]
+
+
+def test_query_string_all_indices():
+    client = FakeElasticsearch({})
+    pipeline = make_pipeline(client)
+
+    asyncio.run(pipeline.search("asthma", biothing_type=ES_DOC_TYPE))
+    assert client.requests == [",".join(ES_INDEX)]
+
+
+def test_batch_split_by_prefix():
+    client = FakeElasticsearch(
+        {
+            "pending-go": ["GO:0008150"],
+            "pending-mondo": ["MONDO:0005737", "MONDO:0004979"],
+            "pending-chebi": ["CHEBI:15377"],
+        }
+    )
+    pipeline = make_pipeline(client)
+
+    q = ["MONDO:0005737", "GO:0008150", "HP:0006990", "CHEBI:15377", "MONDO:0004979", "GO:0000000"]
+    result = asyncio.run(pipeline.search(q, scopes=["_id"], biothing_type=ES_DOC_TYPE))
+
+    # one concurrent multi-search per index, the unknown prefixes being sent to all the indices
+    assert sorted(client.requests) == sorted(["pending-mondo", "pending-go", "pending-chebi", ",".join(ES_INDEX)])
+    assert client.max_pending == 4
+
+    # the responses keep the order of the batch
+    assert [hit["query"] for hit in result] == q
+    assert [hit.get("_id") for hit in result] == [
+        "MONDO:0005737",
+        "GO:0008150",
+        None,
+        "CHEBI:15377",
+        "MONDO:0004979",
+        None,
+    ]
+    assert result[2]["notfound"] and result[5]["notfound"]
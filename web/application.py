@@ -5,16 +5,44 @@ the default builder provided by the biothings.api package
 Responsible for generating the tornado.web.Application instance
 """
 
+import asyncio
+import logging
+import time
+from collections import defaultdict
+
+import tornado.httputil
+import tornado.routing
+import tornado.web
+
 from biothings.web.applications import TornadoBiothingsAPI
 from biothings.web.services.namespace import BiothingsNamespace
 from biothings.web.settings.configs import ConfigPackage
 
 from web.settings.configuration import PendingAPIConfigModule
+from web.utils.compression import compression_transform
+
+logger = logging.getLogger(__name__)
 
 
 class PendingAPI(TornadoBiothingsAPI):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+    def __init__(self, handlers=None, default_host=None, transforms=None, **settings):
+        # the `compression_encodings` setting of the launcher replaces the gzip only `compress_response`
+        compression_encodings = settings.get("compression_encodings")
+        if transforms is None and compression_encodings:
+            transforms = [compression_transform(compression_encodings, settings.get("compression_min_length", 1024))]
+        super().__init__(handlers, default_host, transforms, **settings)
+
+    def get_handler_delegate(
+        self,
+        request: tornado.httputil.HTTPServerRequest,
+        target_class: type[tornado.web.RequestHandler],
+        *args,
+        **kwargs,
+    ):
+        # names the endpoint of the request for the per endpoint compression statistics
+        app_prefix = getattr(self.biothings.config, "APP_PREFIX", "")
+        request.endpoint = f"{app_prefix}/{target_class.__name__}" if app_prefix else target_class.__name__
+        return super().get_handler_delegate(request, target_class, *args, **kwargs)
 
     @classmethod
     def get_app(cls, config, settings=None, handlers=None):
@@ -33,7 +61,12 @@ class PendingAPI(TornadoBiothingsAPI):
             return app
         if isinstance(config, ConfigPackage):
             biothings = BiothingsNamespace(config.root)
-            _handlers = [(f"/{c.APP_PREFIX}/.*", cls.get_app(c, settings)) for c in config.modules]
+            if getattr(config.root, "LAZY_SUB_APPLICATIONS", False):
+                sub_applications = [(c.APP_PREFIX, LazyPendingAPI(cls, c, settings)) for c in config.modules]
+            else:
+                sub_applications = [(c.APP_PREFIX, cls.get_app(c, settings)) for c in config.modules]
+                cls._log_elasticsearch_clients(sub_applications)
+            _handlers = [(f"/{prefix}/.*", sub_app) for prefix, sub_app in sub_applications]
             _settings = TornadoBiothingsAPI._get_settings(biothings, settings)
             app = cls(_handlers + handlers or [], **_settings)
             app.biothings = biothings
@@ -43,3 +76,80 @@ class PendingAPI(TornadoBiothingsAPI):
             app._populate_handlers(_handlers + handlers or [])
             return app
         raise TypeError("Invalid config type. Must be a ConfigModule or ConfigPackage.")
+
+    @staticmethod
+    def _log_elasticsearch_clients(sub_applications: list[tuple]) -> None:
+        """
+        The sub-applications pointing to the same ES_HOST are expected to share one async client,
+        and so one connection pool, configured centrally by the ES_ARGS of the config package.
+        Warns about the hosts whose pool is split by sub-applications overriding ES_ARGS
+        """
+        host_clients = defaultdict(lambda: defaultdict(list))
+        for prefix, sub_app in sub_applications:
+            elasticsearch = getattr(sub_app.biothings, "elasticsearch", None)
+            if elasticsearch is not None:
+                host_clients[sub_app.biothings.config.ES_HOST][id(elasticsearch.async_client)].append(prefix)
+
+        for host, clients in host_clients.items():
+            num_sub_applications = sum(len(prefixes) for prefixes in clients.values())
+            logger.info(
+                "%s sub-applications share %s Elasticsearch client(s) for %s", num_sub_applications, len(clients), host
+            )
+            if len(clients) > 1:
+                logger.warning(
+                    "Multiple connection pools for %s, grouped by sub-application: %s", host, list(clients.values())
+                )
+
+    @property
+    def lazy_sub_applications(self) -> list["LazyPendingAPI"]:
+        return [handler for handler in self.biothings.handlers.values() if isinstance(handler, LazyPendingAPI)]
+
+    async def warmup(self) -> None:
+        """
+        Builds the lazy sub-applications not requested yet one at a time, yielding
+        to the IOLoop in between so the requests keep being served meanwhile
+        """
+        for lazy_application in self.lazy_sub_applications:
+            if not lazy_application.initialized:
+                try:
+                    lazy_application.application
+                except Exception:
+                    continue
+            await asyncio.sleep(0)
+        logger.info("Warmup of %s sub-applications completed", len(self.lazy_sub_applications))
+
+
+class LazyPendingAPI(tornado.routing.Router):
+    """
+    Route target standing in for the sub-application of a config module when the config
+    package sets LAZY_SUB_APPLICATIONS. The sub-application, with its BiothingsNamespace
+    (ES clients, metadata refresh), is only built on the first request routed to it or by
+    the warmup task of the parent application
+    """
+
+    def __init__(self, application_class: type[PendingAPI], config: PendingAPIConfigModule, settings: dict = None):
+        self.application_class = application_class
+        self.config = config
+        self.settings = settings
+        self._application = None
+
+    @property
+    def initialized(self) -> bool:
+        return self._application is not None
+
+    @property
+    def application(self) -> PendingAPI:
+        if self._application is None:
+            t0 = time.perf_counter()
+            try:
+                self._application = self.application_class.get_app(self.config, self.settings)
+            except Exception as gen_exc:
+                logger.exception("Unable to initialize the %s sub-application: %s", self.config.APP_PREFIX, gen_exc)
+                raise gen_exc
+            logger.info("Initialized the %s sub-application in %.3fs", self.config.APP_PREFIX, time.perf_counter() - t0)
+        return self._application
+
+    def find_handler(
+        self, request: tornado.httputil.HTTPServerRequest, **kwargs
+    ) -> tornado.httputil.HTTPMessageDelegate:
+        return self.application.find_handler(request, **kwargs)
@@ -1 +1,2 @@
+from .node_expansion import NodeExpansionBackend, NodeExpansionQueryPipeline  # noqa: F401
 from .pfocr import PFOCRBackend  # noqa: F401
@@ -0,0 +1,142 @@
+"""
+Prefix routing of the node-expansion queries across its ontology indices
+
+The node-expansion API serves the nodes of several ontologies, each in its own index
+(pending-go, pending-doid, pending-mondo, pending-chebi). Without routing every query is a
+search over all of them, though a node is only stored in the index of its CURIE prefix.
+
+Example: <url>:<port>/node-expansion/query?q=MONDO:0005737&scopes=_id
+only searches pending-mondo. A batch (POST or annotation batch) mixing several prefixes is
+split into one multi-search per index, sent concurrently, and its responses are put back
+in the order of the batch. Queries which can't be routed (query string queries, queries over
+other fields than `_id`, unknown prefixes) are still sent to all the indices
+"""
+
+import asyncio
+import logging
+import re
+from typing import Dict, Optional
+
+from biothings.web.query import AsyncESQueryPipeline
+from biothings.web.query.engine import AsyncESQueryBackend
+from biothings.web.query.pipeline import capturesESExceptions
+
+
+logger = logging.getLogger(__name__)
+
+
+class NodeExpansionBackend(AsyncESQueryBackend):
+    """
+    Overridden AsyncESQueryBackend implementation
+
+    The prefix of a CURIE is mapped to the index named after it, `pending-<prefix>`,
+    among the indices of the biothing type. The index selected by NodeExpansionQueryPipeline
+    is passed along in the `routed_index` option
+    """
+
+    INDEX_PREFIX_PATTERN = re.compile(r"pending-(\w+)")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._routes = {}
+
+    def routes(self, biothing_type: str = None) -> Dict[str, str]:
+        """
+        Maps the upper case CURIE prefixes to their index, for the indices of `biothing_type`
+        """
+        if biothing_type not in self._routes:
+            indices = self.indices.get(biothing_type) or []
+            if isinstance(indices, str):
+                indices = indices.split(",")
+
+            routes = {}
+            for index in indices:
+                match = self.INDEX_PREFIX_PATTERN.fullmatch(index.strip())
+                if match:
+                    routes[match.group(1).upper()] = index.strip()
+            self._routes[biothing_type] = routes
+        return self._routes[biothing_type]
+
+    def route(self, curie, biothing_type: str = None) -> Optional[str]:
+        """
+        Returns the index of the CURIE prefix, or None when the query can't be routed
+        """
+        if not isinstance(curie, str):
+            return None
+        prefix, separator, _ = curie.partition(":")
+        if not separator:
+            return None
+        return self.routes(biothing_type).get(prefix.upper())
+
+    def adjust_index(self, original_index: str, query, **options: Dict) -> str:
+        """
+        Index modification for the queries routed by prefix
+        """
+        return options.get("routed_index") or original_index
+
+
+class NodeExpansionQueryPipeline(AsyncESQueryPipeline):
+    def _routable(self, q, options: Dict) -> bool:
+        """
+        Only the queries matched against `_id` alone are routed, an ontology cross references
+        the CURIEs of the others in its other fields
+        """
+        if options.get("scopes"):
+            scopes = options["scopes"]
+        elif options.get("autoscope"):
+            # same scope inference as ESQueryBuilder._build_one
+            _, scopes = self.builder.parser.parse(str(q), self.builder.metadata)
+        else:
+            return False
+
+        if isinstance(scopes, str):
+            scopes = [scopes]
+        return list(scopes) == ["_id"]
+
+    def _route(self, q, options: Dict) -> Optional[str]:
+        if not isinstance(self.backend, NodeExpansionBackend):
+            return None
+        if not self._routable(q, options):
+            return None
+        return self.backend.route(q, options.get("biothing_type"))
+
+    @capturesESExceptions
+    async def search(self, q, **options):
+        # scroll requests continue the query they were started from
+        if options.get("scroll_id"):
+            return await super().search(q, **options)
+
+        if not isinstance(q, list):
+            query = self.builder.build(q, **options)
+            response = await self.backend.execute(query, routed_index=self._route(q, options), **options)
+            return self.formatter.transform(response, **options)
+
+        # multisearch
+        options["templates"] = (dict(query=_q) for _q in q)
+        options["template_miss"] = dict(notfound=True)
+        options["template_hit"] = dict()
+
+        # the positions of the batch per index, None being all the indices
+        batches = {}
+        for position, _q in enumerate(q):
+            batches.setdefault(self._route(_q, options), []).append(position)
+
+        # a raw response is the one of a single multi-search
+        if len(batches) == 1 or options.get("raw") or options.get("rawquery"):
+            index = next(iter(batches)) if len(batches) == 1 else None
+            query = self.builder.build(q, **options)
+            response = await self.backend.execute(query, routed_index=index, **options)
+            return self.formatter.transform(response, **options)
+
+        async def execute(index, positions):
+            query = self.builder.build([q[position] for position in positions], **options)
+            return await self.backend.execute(query, routed_index=index, **options)
+
+        logger.debug("Splitting a batch of %s queries over the indices %s", len(q), list(batches))
+        batch_responses = await asyncio.gather(*(execute(index, positions) for index, positions in batches.items()))
+
+        response = [None] * len(q)
+        for positions, responses in zip(batches.values(), batch_responses):
+            for position, _response in zip(positions, responses):
+                response[position] = _response
+        return self.formatter.transform(response, **options)
@@ -2,6 +2,7 @@ import copy
 import json
 from collections import defaultdict
 from collections import UserList
+from types import MappingProxyType
 
 
 class GraphObject:
@@ -9,6 +10,10 @@ class GraphObject:
     Representing a graph object stored in db.
     Does not perform in-depth validation,
     only use it with existing records.
+
+    The subject, object and association are read-only views
+    of the dicts it is created from, which are not copied.
+    Reversing rebinds them without modifying those dicts.
     """
 
     try:  # the mapping is already expanded to both ways
@@ -17,23 +22,38 @@ class GraphObject:
     except (FileNotFoundError, json.JSONDecodeError):
         PREDICATE_MAPPING = {}
 
+    # field of the documents holding the edge in its canonical direction
+    CANONICAL_FIELD = "canonical"
+
     def __init__(self, subject, object_, associ):
 
         assert isinstance(subject, dict)
         assert isinstance(object_, dict)
         assert isinstance(associ, dict)
 
-        self.subject = copy.deepcopy(subject)
-        self.object = copy.deepcopy(object_)
-        self.associ = copy.deepcopy(associ)
+        self._subject = subject
+        self._object = object_
+        self._associ = associ
+
+    @property
+    def subject(self):
+        return MappingProxyType(self._subject)
+
+    @property
+    def object(self):
+        return MappingProxyType(self._object)
+
+    @property
+    def associ(self):
+        return MappingProxyType(self._associ)
 
     @property
     def predicate(self):
-        return self.associ.get("edge_label")
+        return self._associ.get("edge_label")
 
     @predicate.setter
     def predicate(self, val):
-        self.associ["edge_label"] = val
+        self._associ = {**self._associ, "edge_label": val}
 
     @classmethod
     def from_dict(cls, dic):
@@ -49,7 +69,13 @@ class GraphObject:
         Check if it's reversible basing on our mapping.
         Typically call this first before calling reverse().
         """
-        return self.predicate in self.PREDICATE_MAPPING
+        return isinstance(self.predicate, str) and self.predicate in self.PREDICATE_MAPPING
+
+    def symmetric(self):
+        """
+        Check if the predicate is its own reverse, like "related_to".
+        """
+        return self.reversible() and self.PREDICATE_MAPPING[self.predicate] == self.predicate
 
     def reverse(self):
         """
@@ -57,16 +83,55 @@ class GraphObject:
         Raise error on non-reversible ones basing on the mapping file.
         """
         if self.reversible():
-            self.subject, self.object = self.object, self.subject
+            self._subject, self._object = self._object, self._subject
             self.predicate = self.PREDICATE_MAPPING[self.predicate]
         else:  # reversed relationship is not defined
             raise TypeError("Not reversible.")
 
+    def reversed(self):
+        """
+        Return a reversed graph object, leaving this one unchanged.
+        """
+        graph_object = copy.copy(self)  # only copies the references to the dicts
+        graph_object.reverse()
+        return graph_object
+
+    def canonical(self):
+        """
+        Return the graph object in the canonical direction of its predicate,
+        the lowest of the predicate and its reverse, or itself if not reversible.
+        Both directions of an edge have the same canonical graph object.
+        """
+        if self.reversible() and self.PREDICATE_MAPPING[self.predicate] < self.predicate:
+            return self.reversed()
+        return self
+
+    @classmethod
+    def add_canonical_direction(cls, doc):
+        """
+        Add the canonical direction of the edge of a document to index, under
+        CANONICAL_FIELD, queried by web.pipeline.CanonicalGraphQueryBuilder.
+        Symmetric edges have no canonical direction, so are left unchanged.
+        """
+        graph_object = cls.from_dict(doc)
+        if graph_object.reversible() and not graph_object.symmetric():
+            canonical = graph_object.canonical()
+            doc[cls.CANONICAL_FIELD] = {
+                "subject": canonical._subject,
+                "object": canonical._object,
+                "association": {"edge_label": canonical.predicate},
+            }
+        return doc
+
     def to_dict(self):
+        """
+        The returned dicts are shared with the graph object
+        and its source, do not modify them.
+        """
         return {
-            "subject": copy.deepcopy(self.subject),
-            "object": copy.deepcopy(self.object),
-            "association": copy.deepcopy(self.associ),
+            "subject": self._subject,
+            "object": self._object,
+            "association": self._associ,
         }
 
 
@@ -167,6 +232,27 @@ class GraphQuery(GraphObject):
                 raise ValueError(f"Invalid entry for key '{key}'.")
         return _dic
 
+    @property
+    def key(self):
+        """
+        Identical graph queries, whatever the order of their fields, have the same key.
+        """
+        return json.dumps(self.to_dict(), sort_keys=True)
+
 
 class GraphQueries(UserList):
-    pass
+    def deduplicate(self):
+        """
+        Return the distinct graph queries, in order of first occurrence,
+        and the position of each graph query among the distinct ones.
+        """
+        positions = {}
+        distinct_queries = GraphQueries()
+        query_positions = []
+        for graph_query in self.data:
+            key = graph_query.key
+            if key not in positions:
+                positions[key] = len(distinct_queries)
+                distinct_queries.append(graph_query)
+            query_positions.append(positions[key])
+        return distinct_queries, query_positions
@@ -13,10 +13,10 @@ from config_web import (
     OPENTELEMETRY_SERVICE_NAME,
 )
 
-from .api import ApiListHandler
+from .api import ApiListHandler, CompressionStatisticsHandler
 from .diseases import DiseasesHandler
 from .graph import GraphQueryHandler  # noqa # pylint: disable=unused-import
-from .ngd import SemmedNGDHandler  # noqa # pylint: disable=unused-import
+from .ngd import SemmedNGDHandler, SemmedNGDMatrixHandler, SemmedNGDCacheHandler  # noqa # pylint: disable=unused-import
 from .nodenorm import NormalizedNodesHandler, SetIdentifierHandler  # noqa # pylint: disable=unused-import
 from .status import StatusDefaultHandler
 from .version import VersionHandler
@@ -56,5 +56,6 @@ EXTRA_HANDLERS = [
     (r"/status", StatusDefaultHandler),
     (r"/version", VersionHandler),
     (r"/api/list", ApiListHandler),
+    (r"/api/compression", CompressionStatisticsHandler),
     (r"/DISEASES(?:/.*)?", DiseasesHandler),
 ]
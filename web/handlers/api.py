@@ -4,19 +4,32 @@ Handlers for metrics related to the pending webapi's
 
 import logging
 
-from biothings.web.handlers import BaseAPIHandler
-from web.application import PendingAPI
+from web.application import LazyPendingAPI, PendingAPI
+from web.handlers.base import PendingBaseAPIHandler
+from web.utils.compression import compression_statistics
 
 logger = logging.getLogger(__name__)
 
 
-class ApiListHandler(BaseAPIHandler):
+class ApiListHandler(PendingBaseAPIHandler):
     name = "api-list"
 
     async def get(self):
         application_handlers = self.application.biothings.handlers
         api_endpoints = set()
         for endpoint, handler_object in application_handlers.items():
-            if isinstance(handler_object, PendingAPI):
+            if isinstance(handler_object, (PendingAPI, LazyPendingAPI)):
                 api_endpoints.add(endpoint.strip(".*/"))
         self.write(sorted(api_endpoints))
+
+
+class CompressionStatisticsHandler(PendingBaseAPIHandler):
+    """
+    Response compression statistics of the process per endpoint, to tune the
+    `--compression_min_length` of the launcher against the CPU time spent
+    """
+
+    name = "api-compression"
+
+    async def get(self):
+        self.write(compression_statistics.summary())
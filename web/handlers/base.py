@@ -0,0 +1,64 @@
+"""
+Shared base handler for the pending.api specific handlers
+"""
+
+import logging
+from typing import Union
+
+import tornado.web
+from biothings.web.handlers import BaseAPIHandler
+
+from web.utils.executor import offload
+from web.utils.serializer import to_json_bytes
+
+logger = logging.getLogger(__name__)
+
+
+class PendingBaseAPIHandler(BaseAPIHandler):
+    # number of top-level entries of a JSON response from which it is serialized out of the IOLoop
+    SERIALIZATION_OFFLOAD_THRESHOLD = 1000
+
+    def write(self, chunk):
+        """
+        Writes JSON responses as the UTF-8 bytes of the serializer, rather than going through
+        the `str` of `BaseAPIHandler.write`. The other formats are left to `BaseAPIHandler`
+
+        As with `BaseAPIHandler.write`, a serialization error is only logged and the chunk is handed
+        over to tornado as is, the error handling being left to the upper layers
+        """
+        if self.format == "json" and isinstance(chunk, (dict, list)):
+            try:
+                body = to_json_bytes(chunk)
+            except Exception as exc:
+                logger.warning(exc)
+                tornado.web.RequestHandler.write(self, chunk)
+            else:
+                self.write_serialized(body)
+        else:
+            super().write(chunk)
+
+    def write_serialized(self, body: bytes):
+        self.set_header("Content-Type", "application/json; charset=UTF-8")
+        # the body is already serialized, so bypass the formatting of BaseAPIHandler.write
+        tornado.web.RequestHandler.write(self, body)
+
+    async def finish_offloaded(self, chunk: Union[dict, list], size: int = None):
+        """
+        Finishes the request like `finish(chunk)`, but a large JSON response is serialized in the
+        offload executor rather than on the IOLoop. `size` defaults to the number of top-level entries
+        """
+        if self.format == "json" and isinstance(chunk, (dict, list)):
+            if size is None:
+                size = len(chunk)
+            if size >= self.SERIALIZATION_OFFLOAD_THRESHOLD:
+                try:
+                    body = await offload(
+                        to_json_bytes, chunk, size=size, threshold=self.SERIALIZATION_OFFLOAD_THRESHOLD
+                    )
+                except Exception as exc:
+                    logger.warning(exc)
+                    tornado.web.RequestHandler.write(self, chunk)
+                else:
+                    self.write_serialized(body)
+                return await self.finish()
+        return await self.finish(chunk)
@@ -1,7 +1,7 @@
-from biothings.web.handlers import BaseAPIHandler
+from web.handlers.base import PendingBaseAPIHandler
 
 
-class DiseasesHandler(BaseAPIHandler):
+class DiseasesHandler(PendingBaseAPIHandler):
     name = "diseases"
 
     def prepare(self):
@@ -7,17 +7,17 @@ https://github.com/biothings/pending.api/issues/20
 
 import copy
 
-from biothings.web.handlers import BaseAPIHandler
 from biothings.web.settings.default import COMMON_KWARGS
 from tornado.web import HTTPError
 from web.graph import GraphQueries, GraphQuery
+from web.handlers.base import PendingBaseAPIHandler
 
 
-class GraphQueryHandler(BaseAPIHandler):
+class GraphQueryHandler(PendingBaseAPIHandler):
 
     name = "graph"
     kwargs = {"*": copy.deepcopy(COMMON_KWARGS)}
-    kwargs["*"].update(BaseAPIHandler.kwargs["*"])
+    kwargs["*"].update(PendingBaseAPIHandler.kwargs["*"])
     kwargs["*"]["reverse"] = {"type": bool, "default": False}
     kwargs["*"]["reversed"] = {"type": bool, "default": True}
 
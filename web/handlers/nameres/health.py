@@ -1,11 +1,11 @@
 from urllib.parse import urlparse
 
-from biothings.web.handlers import BaseAPIHandler
 
-from web.handlers.nameres.biolink import BIOLINK_MODEL_VERSION
+from web.handlers.base import PendingBaseAPIHandler
+from web.utils.biolink import BIOLINK_MODEL_VERSION
 
 
-class NameResolutionHealthHandler(BaseAPIHandler):
+class NameResolutionHealthHandler(PendingBaseAPIHandler):
     """
     Important Endpoints
     * /_cat/nodes
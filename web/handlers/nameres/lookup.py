@@ -9,10 +9,11 @@ import logging
 import re
 from typing import Optional
 
-from biothings.web.handlers import BaseAPIHandler
 from biothings.web.services.namespace import BiothingsNamespace
 from tornado.web import HTTPError
 
+from web.handlers.base import PendingBaseAPIHandler
+
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -43,7 +44,7 @@ class LookupResult:
     clique_identifier_count: int
 
 
-class BaseNameResolutionLookupHandler(BaseAPIHandler):
+class BaseNameResolutionLookupHandler(PendingBaseAPIHandler):
     """
     Base class for both the lookup and bulklookup endpoints
 
@@ -343,7 +344,7 @@ class NameResolutionLookupHandler(BaseNameResolutionLookupHandler):
         self.finish(lookup_result)
 
 
-class NameResolutionBulkLookupHandler(BaseAPIHandler):
+class NameResolutionBulkLookupHandler(PendingBaseAPIHandler):
     """
     Mirror implementation to the renci implementation found at
     https://name-resolution-sri.renci.org/docs#/
@@ -4,14 +4,15 @@ Handler for the synonyms endpoint for nameres
 
 import logging
 
-from biothings.web.handlers import BaseAPIHandler
 from tornado.web import HTTPError
 
+from web.handlers.base import PendingBaseAPIHandler
+
 
 logger = logging.getLogger(__name__)
 
 
-class NameResolutionSynonymsHandler(BaseAPIHandler):
+class NameResolutionSynonymsHandler(PendingBaseAPIHandler):
     """
     Handles looking up synonyms based off a particular CURIE.
 
@@ -1,14 +1,21 @@
 import asyncio
+import hmac
 
 from enum import Flag, auto
-from biothings.web.handlers.query import BaseAPIHandler
+from typing import Optional
 
-from web.utils import NGDZeroDocFreqException, UNDEFINED_STR
+import numpy as np
+import tornado.web
+
+from web.handlers.base import PendingBaseAPIHandler
+from web.utils import NGDZeroDocFreqException, INFINITY_STR, UNDEFINED_STR
+from web.service.ngd_precompute import PrecomputedNGDTable
 from web.service.ngd_service import (
     NGDService,
     DocStatsService,
     NGDCache,
     DocStatsCache,
+    ExpandedTermSetStore,
     Term,
     TermPair,
     TermExpansionService,
@@ -56,12 +63,24 @@ class ErrorReason:
     def terms_not_a_list(cls, terms):
         return f"A list of 2 UMLS terms is required. Got {terms}, a {type(terms).__name__}."
 
+    @classmethod
+    def terms_not_strings(cls, arg_name: str, terms: list):
+        return f"Parameter '{arg_name}' must be a list of UMLS terms as strings. Got {terms}."
+
+    @classmethod
+    def admin_actions_disabled(cls):
+        return "The admin actions are disabled, no admin token is configured."
+
+    @classmethod
+    def admin_token_required(cls):
+        return "A valid admin token is required as a bearer token in the Authorization header."
+
 
-class SemmedNGDHandler(BaseAPIHandler):
+class SemmedNGDHandler(PendingBaseAPIHandler):
     name = "ngd"
 
     kwargs = {
-        **BaseAPIHandler.kwargs,
+        **PendingBaseAPIHandler.kwargs,
         "GET": {
             "umls": {
                 "type": list,
@@ -78,9 +97,14 @@ class SemmedNGDHandler(BaseAPIHandler):
         },
     }
 
-    # Suppose each term ID is an 8-char string and each doc freq is an integer. An OrderedDict of size 102400 takes ~10MB in RAM
-    doc_stats_cache = DocStatsCache(unary_capacity=102400, bipartite_capacity=102400)
-    ngd_cache = NGDCache(capacity=102400)
+    # Shared by all the handler instances, but created on the first request since their arguments are injected from
+    # the URLSpec. See `SemmedNGDCacheHandler` for their statistics and the actual memory usage.
+    doc_stats_cache: DocStatsCache = None
+    ngd_cache: NGDCache = None
+    term_set_store: ExpandedTermSetStore = None
+
+    # The concrete index (behind the `ES_INDEX` alias) from which the caches above are filled, if known
+    cache_index_build: str = None
 
     def initialize(
         self,
@@ -88,16 +112,32 @@ class SemmedNGDHandler(BaseAPIHandler):
         object_field_name: str,
         doc_freq_agg_name: str,
         term_expansion_service: TermExpansionService,
+        term_set_lookup_index: str = None,
+        term_set_lookup_min_size: int = 1024,
+        cache_capacity: int = 102400,
+        precomputed_ngd_table: PrecomputedNGDTable = None,
     ):
         super().initialize()
 
-        # The following 5 arguments are injected from the URLSpec in config_web/<plugin_name>.py
+        # The following arguments are injected from the URLSpec in config_web/<plugin_name>.py
         self.subject_field_name = subject_field_name
         self.object_field_name = object_field_name
         self.doc_freq_agg_name = doc_freq_agg_name
         self.term_expansion_service = term_expansion_service
-
-    def prepare(self):
+        self.precomputed_ngd_table = precomputed_ngd_table
+
+        if SemmedNGDHandler.doc_stats_cache is None:
+            SemmedNGDHandler.doc_stats_cache = DocStatsCache(
+                unary_capacity=cache_capacity, bipartite_capacity=cache_capacity
+            )
+        if SemmedNGDHandler.ngd_cache is None:
+            SemmedNGDHandler.ngd_cache = NGDCache(capacity=cache_capacity)
+        if SemmedNGDHandler.term_set_store is None:
+            SemmedNGDHandler.term_set_store = ExpandedTermSetStore(
+                index_name=term_set_lookup_index, min_size=term_set_lookup_min_size
+            )
+
+    async def prepare(self):
         super().prepare()
 
         self.doc_stats_service = DocStatsService(
@@ -106,6 +146,7 @@ class SemmedNGDHandler(BaseAPIHandler):
             subject_field_name=self.subject_field_name,
             object_field_name=self.object_field_name,
             doc_freq_agg_name=self.doc_freq_agg_name,
+            term_set_store=self.term_set_store,
         )
 
         self.ngd_service = NGDService(
@@ -113,8 +154,33 @@ class SemmedNGDHandler(BaseAPIHandler):
             term_expansion_service=self.term_expansion_service,
             doc_stats_cache=self.doc_stats_cache,
             ngd_cache=self.ngd_cache,
+            precomputed_ngd_table=self.precomputed_ngd_table,
         )
 
+        # the precomputed table is checked against the live index build before it's first used
+        if self.precomputed_ngd_table is not None and self.precomputed_ngd_table.checked_index_build is None:
+            index_build = await self.resolve_index_build()
+            if index_build is not None:
+                self.precomputed_ngd_table.check_index_build(index_build)
+
+    async def resolve_index_build(self) -> Optional[str]:
+        """
+        Resolve `ES_INDEX` (usually an alias) to the concrete index name(s) behind it, or None if it fails
+        """
+        try:
+            aliases = await self.biothings.elasticsearch.async_client.indices.get_alias(
+                index=self.biothings.config.ES_INDEX
+            )
+        except Exception:
+            return None
+        return ",".join(sorted(aliases.keys()))
+
+    async def current_index_build(self) -> str:
+        """
+        The concrete index name(s) behind `ES_INDEX`, or `ES_INDEX` itself if they cannot be resolved
+        """
+        return await self.resolve_index_build() or self.biothings.config.ES_INDEX
+
     @classmethod
     def pair_two_terms(cls, term_x_root: str, term_y_root: str, expansion_mode: ExpansionMode) -> TermPair:
         # "expansion_mode & ExpansionMode.LEFT" is true when expansion_mode is LEFT or BOTH
@@ -216,3 +282,190 @@ class SemmedNGDHandler(BaseAPIHandler):
 
         await self.finish(response_list)
         return
+
+
+class SemmedNGDMatrixHandler(SemmedNGDHandler):
+    """
+    Calculate the all-vs-all NGD matrix between two lists of UMLS terms, i.e. the NGD of each (umls_x[i], umls_y[j]) pair.
+
+    Document frequencies are gathered in bulk (see `NGDService.calculate_ngd_matrix()`), and the distances are
+    calculated with NumPy array operations. The matrix is returned in one of the two layouts:
+
+    - "dense": a list of len(umls_x) rows, each row being a list of len(umls_y) NGD values;
+    - "sparse": a list of {"umls": [x, y], "ngd": <value>} entries, only for the pairs with finite NGD values.
+    """
+
+    name = "ngd_matrix"
+
+    kwargs = {
+        **PendingBaseAPIHandler.kwargs,
+        "POST": {
+            "umls_x": {"type": list, "max": 1000, "required": True},
+            "umls_y": {"type": list, "max": 1000, "required": True},
+            "expand": {"type": str, "required": False},
+            "layout": {"type": str, "default": "dense", "enum": ("dense", "sparse")},
+        },
+    }
+
+    @classmethod
+    def dense_layout(cls, ngd_matrix: np.ndarray) -> list:
+        values = ngd_matrix.astype(object)
+        values[np.isposinf(ngd_matrix)] = INFINITY_STR
+        values[np.isnan(ngd_matrix)] = UNDEFINED_STR
+        return values.tolist()
+
+    @classmethod
+    def sparse_layout(cls, ngd_matrix: np.ndarray, umls_x: list, umls_y: list) -> list:
+        rows, columns = np.nonzero(np.isfinite(ngd_matrix))
+        distances = ngd_matrix[rows, columns].tolist()
+        return [
+            {"umls": [umls_x[row], umls_y[column]], "ngd": distance}
+            for row, column, distance in zip(rows.tolist(), columns.tolist(), distances)
+        ]
+
+    async def get(self, *args, **kwargs):
+        raise tornado.web.HTTPError(405)
+
+    async def post(self, *args, **kwargs):
+        arg_umls_x = self.args["umls_x"]
+        arg_umls_y = self.args["umls_y"]
+        arg_expand = self.args.get("expand")
+        arg_layout = self.args["layout"]
+
+        for arg_name, arg_umls in (("umls_x", arg_umls_x), ("umls_y", arg_umls_y)):
+            if not all(isinstance(term, str) for term in arg_umls):
+                self.write_error(status_code=400, reason=ErrorReason.terms_not_strings(arg_name, arg_umls))
+                return
+
+        try:
+            expansion_mode = ExpansionMode.mode_of(arg_expand)
+        except ValueError:
+            self.write_error(status_code=400, reason=ErrorReason.unknown_expansion_mode(arg_expand))
+            return
+
+        # "expansion_mode & ExpansionMode.LEFT" is true when expansion_mode is LEFT or BOTH, applied to umls_x;
+        # "expansion_mode & ExpansionMode.RIGHT" is true when expansion_mode is RIGHT or BOTH, applied to umls_y
+        terms_x = [Term(root=root, expandable=bool(expansion_mode & ExpansionMode.LEFT)) for root in arg_umls_x]
+        terms_y = [Term(root=root, expandable=bool(expansion_mode & ExpansionMode.RIGHT)) for root in arg_umls_y]
+        ngd_matrix = await self.ngd_service.calculate_ngd_matrix(terms_x, terms_y)
+
+        response = {"umls_x": arg_umls_x, "umls_y": arg_umls_y, "layout": arg_layout}
+        if expansion_mode is not ExpansionMode.NIL:
+            response["expand"] = expansion_mode.name.lower()
+
+        if arg_layout == "sparse":
+            response["ngd"] = self.sparse_layout(ngd_matrix, arg_umls_x, arg_umls_y)
+        else:
+            response["ngd"] = self.dense_layout(ngd_matrix)
+
+        await self.finish(response)
+        return
+
+
+class SemmedNGDCacheHandler(SemmedNGDHandler):
+    """
+    Admin endpoint of the NGD caches shared by `SemmedNGDHandler` and `SemmedNGDMatrixHandler`.
+
+    - GET reports the statistics (hits, misses, evictions, approximate memory) of each cache, the sizes of the
+      expanded term sets, the coverage of the precomputed NGD table, and the index build the caches are filled from.
+    - POST with `action=flush` empties the caches.
+    - POST with `action=warm` fills the caches with the NGDs of the `umls` pairs. If the index behind `ES_INDEX`
+      has been rebuilt since the caches were filled, the caches are flushed first.
+
+    GET is public, while the POST actions require the `admin_token` of the URLSpec as a bearer token in the
+    Authorization header. They are refused altogether when no admin token is configured.
+    """
+
+    name = "ngd_cache"
+
+    kwargs = {
+        **PendingBaseAPIHandler.kwargs,
+        "GET": {},
+        "POST": {
+            "action": {"type": str, "required": True, "enum": ("flush", "warm")},
+            "umls": {"type": list, "max": 1000, "default": []},
+            "expand": {"type": str, "required": False},
+        },
+    }
+
+    def initialize(self, admin_token: str = None, **kwargs):
+        super().initialize(**kwargs)
+        self.admin_token = admin_token
+
+    def check_admin_token(self):
+        if not self.admin_token:
+            raise tornado.web.HTTPError(403, reason=ErrorReason.admin_actions_disabled())
+
+        scheme, _, token = self.request.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), self.admin_token.encode()):
+            raise tornado.web.HTTPError(401, reason=ErrorReason.admin_token_required())
+
+    def write_error(self, status_code, **kwargs):
+        # set here as `send_error` clears the headers before writing the error
+        if status_code == 401:
+            self.set_header("WWW-Authenticate", "Bearer")
+        super().write_error(status_code, **kwargs)
+
+    def flush_caches(self, index_build: str):
+        self.doc_stats_cache.clear()
+        self.ngd_cache.clear()
+        SemmedNGDHandler.cache_index_build = index_build
+        if self.precomputed_ngd_table is not None:
+            self.precomputed_ngd_table.check_index_build(index_build)
+
+    def cache_stats(self, index_build: str) -> dict:
+        return {
+            "index": self.biothings.config.ES_INDEX,
+            "index_build": index_build,
+            "cache_index_build": self.cache_index_build,
+            "doc_stats": self.doc_stats_cache.stats(),
+            "ngd": self.ngd_cache.stats(),
+            "term_set_sizes": self.term_set_store.size_metrics.to_dict(),
+            "precomputed": self.precomputed_ngd_table.stats() if self.precomputed_ngd_table is not None else None,
+        }
+
+    async def get(self, *args, **kwargs):
+        index_build = await self.current_index_build()
+        await self.finish(self.cache_stats(index_build))
+
+    async def post(self, *args, **kwargs):
+        self.check_admin_token()
+
+        arg_action = self.args["action"]
+        index_build = await self.current_index_build()
+
+        if arg_action == "flush":
+            self.flush_caches(index_build)
+            await self.finish(self.cache_stats(index_build))
+            return
+
+        # arg_action == "warm"
+        arg_umls = self.args["umls"]
+        arg_expand = self.args.get("expand")
+        try:
+            expansion_mode = ExpansionMode.mode_of(arg_expand)
+        except ValueError:
+            self.write_error(status_code=400, reason=ErrorReason.unknown_expansion_mode(arg_expand))
+            return
+
+        for terms in arg_umls:
+            if not isinstance(terms, list):
+                self.write_error(status_code=400, reason=ErrorReason.terms_not_a_list(terms))
+                return
+            if len(terms) != 2:
+                self.write_error(status_code=400, reason=ErrorReason.wrong_terms_quantity(terms))
+                return
+
+        if index_build != self.cache_index_build:
+            self.flush_caches(index_build)
+
+        async def warm(terms):
+            term_pair = self.pair_two_terms(term_x_root=terms[0], term_y_root=terms[1], expansion_mode=expansion_mode)
+            try:
+                await self.ngd_service.calculate_ngd(term_pair)
+            except NGDZeroDocFreqException:
+                pass  # the unary doc freqs are cached anyway
+
+        await self.ngd_service.doc_total()
+        await asyncio.gather(*[warm(terms) for terms in arg_umls])
+        await self.finish(self.cache_stats(index_build))
@@ -1,12 +1,12 @@
 import logging
 
-from biothings.web.handlers import BaseAPIHandler
+from web.handlers.base import PendingBaseAPIHandler
 
 
 logger = logging.getLogger(__name__)
 
 
-class ValidConflationsHandler(BaseAPIHandler):
+class ValidConflationsHandler(PendingBaseAPIHandler):
     name = "allowed-conflations"
 
     async def get(self):
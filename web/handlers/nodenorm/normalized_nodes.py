@@ -3,15 +3,19 @@ import logging
 import time
 from typing import Union
 
-from biothings.web.handlers import BaseAPIHandler
 from biothings.web.services.namespace import BiothingsNamespace
 from tornado.web import HTTPError
 
-from web.handlers.nodenorm.biolink import toolkit
+from web.handlers.base import PendingBaseAPIHandler
+from web.utils.biolink import get_biolink_model
+from web.utils.executor import offload
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
+# number of nodes from which the normalized nodes are shaped out of the IOLoop
+NORMALIZATION_OFFLOAD_THRESHOLD = 1000
+
 
 @dataclasses.dataclass(frozen=True)
 class NormalizedNode:
@@ -24,7 +28,7 @@ class NormalizedNode:
     taxa: list[str]
 
 
-class NormalizedNodesHandler(BaseAPIHandler):
+class NormalizedNodesHandler(PendingBaseAPIHandler):
     """
     Mirror implementation to the renci implementation found at
     https://nodenormalization-sri.renci.org/docs
@@ -67,7 +71,7 @@ class NormalizedNodesHandler(BaseAPIHandler):
         if not normalized_nodes:
             raise HTTPError(detail="Error occurred during processing.", status_code=500)
 
-        self.finish(normalized_nodes)
+        await self.finish_offloaded(normalized_nodes)
 
     async def post(self):
         """
@@ -156,7 +160,7 @@ class NormalizedNodesHandler(BaseAPIHandler):
         if not normalized_nodes:
             raise HTTPError(detail="Error occurred during processing.", status_code=500)
 
-        self.finish(normalized_nodes)
+        await self.finish_offloaded(normalized_nodes)
 
 
 async def get_normalized_nodes(
@@ -176,15 +180,15 @@ async def get_normalized_nodes(
 
     nodes = await _lookup_curie_metadata(biothings_metadata, curies, conflations)
 
-    normal_nodes = {}
-    for aggregate_node in nodes:
-        normal_node = await create_normalized_node(
-            aggregate_node,
-            include_descriptions=include_descriptions,
-            include_individual_types=include_individual_types,
-            conflations=conflations,
-        )
-        normal_nodes[aggregate_node.curie] = normal_node
+    normal_nodes = await offload(
+        create_normalized_nodes,
+        nodes,
+        include_descriptions=include_descriptions,
+        include_individual_types=include_individual_types,
+        conflations=conflations,
+        size=len(nodes),
+        threshold=NORMALIZATION_OFFLOAD_THRESHOLD,
+    )
 
     end_time = time.perf_counter_ns()
     logger.debug(
@@ -197,7 +201,29 @@ async def get_normalized_nodes(
     return normal_nodes
 
 
-async def create_normalized_node(
+def create_normalized_nodes(
+    nodes: list[NormalizedNode],
+    include_descriptions: bool = True,
+    include_individual_types: bool = False,
+    conflations: dict = None,
+) -> dict:
+    """
+    Construct the output format of every aggregated node, keyed by the input CURIE
+
+    Pure CPU-bound step, so get_normalized_nodes can run it out of the IOLoop for large batches
+    """
+    normal_nodes = {}
+    for aggregate_node in nodes:
+        normal_nodes[aggregate_node.curie] = create_normalized_node(
+            aggregate_node,
+            include_descriptions=include_descriptions,
+            include_individual_types=include_individual_types,
+            conflations=conflations,
+        )
+    return normal_nodes
+
+
+def create_normalized_node(
     aggregate_node: NormalizedNode,
     include_descriptions: bool = True,
     include_individual_types: bool = False,
@@ -423,6 +449,7 @@ async def _populate_biolink_type_ancestors(biolink_type: Union[str, list[str]],
     if not isinstance(biolink_type, list):
         biolink_type = [biolink_type]
 
+    biolink_model = get_biolink_model()
     biolink_type_tree = []
     for bltype in biolink_type:
         if not bltype:
@@ -434,8 +461,7 @@ async def _populate_biolink_type_ancestors(biolink_type: Union[str, list[str]],
             )
             biolink_type_tree.append(fallback_type)
         else:
-            for anc in toolkit.get_ancestors(bltype):
-                biolink_type_tree.append(toolkit.get_element(anc)["class_uri"])
+            biolink_type_tree.extend(biolink_model.get_ancestor_class_uris(bltype))
 
     # We need to remove `biolink:Entity` from the types returned.
     # (See explanation at https://github.com/TranslatorSRI/NodeNormalization/issues/173)
@@ -1,10 +1,10 @@
-from biothings.web.handlers import BaseAPIHandler
 from tornado.web import HTTPError
 
-from web.handlers.nodenorm.biolink import toolkit
+from web.handlers.base import PendingBaseAPIHandler
+from web.utils.biolink import get_biolink_model
 
 
-class SemanticTypeHandler(BaseAPIHandler):
+class SemanticTypeHandler(PendingBaseAPIHandler):
     """
     Mirror implementation to the renci implementation found at
     https://nodenormalization-sri.renci.org/docs
@@ -28,12 +28,13 @@ class SemanticTypeHandler(BaseAPIHandler):
             )
             raise network_error from gen_exc
 
+        biolink_model = get_biolink_model()
         semantic_types = set()
         for bucket in type_aggregation_result.body["aggregations"]["unique_types"]["buckets"]:
             biolink_type = bucket["key"]
             semantic_types.add(biolink_type)
-            for ancestor in toolkit.get_ancestors(biolink_type):
-                semantic_types.add(toolkit.get_element(ancestor)["class_uri"].lower())
+            for ancestor_class_uri in biolink_model.get_ancestor_class_uris(biolink_type):
+                semantic_types.add(ancestor_class_uri.lower())
 
         semantic_type_response = {"semantic_types": {"types": list(semantic_types)}}
         self.finish(semantic_type_response)
@@ -5,10 +5,10 @@ import logging
 import uuid
 from typing import Optional
 
-from biothings.web.handlers import BaseAPIHandler
 from biothings.web.services.namespace import BiothingsNamespace
 from tornado.web import HTTPError
 
+from web.handlers.base import PendingBaseAPIHandler
 from web.handlers.nodenorm.normalized_nodes import get_normalized_nodes
 
 
@@ -22,7 +22,7 @@ class SetIDResponse:
     setid: Optional[str] = None
 
 
-class SetIdentifierHandler(BaseAPIHandler):
+class SetIdentifierHandler(PendingBaseAPIHandler):
     """
     Mirror implementation to the renci implementation found at
     https://nodenormalization-sri.renci.org/docs
@@ -1,13 +1,14 @@
 import logging
 
-from biothings.web.handlers import BaseAPIHandler
 from biothings.web.handlers.services import StatusHandler
 
+from web.handlers.base import PendingBaseAPIHandler
+
 
 logger = logging.getLogger(__name__)
 
 
-class StatusDefaultHandler(BaseAPIHandler):
+class StatusDefaultHandler(PendingBaseAPIHandler):
     name = "status"
 
     async def get(self, *args, **kwargs):
@@ -2,12 +2,12 @@ import logging
 import pathlib
 import git
 
-from biothings.web.handlers import BaseAPIHandler
+from web.handlers.base import PendingBaseAPIHandler
 
 logger = logging.getLogger(__name__)
 
 
-class VersionHandler(BaseAPIHandler):
+class VersionHandler(PendingBaseAPIHandler):
     name = "version"
 
     def get_github_commit_hash(self):
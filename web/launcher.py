@@ -6,14 +6,22 @@ and a command-line utility to provide both programmatic and
 command-line access to start Biothings APIs.
 """
 
+import asyncio
+import gc
 import logging
+import os
 import pathlib
+import signal
+import sys
 from pprint import pformat
 
 import tornado.httpserver
+import tornado.httputil
 import tornado.ioloop
 import tornado.log
+import tornado.netutil
 import tornado.options
+import tornado.process
 import tornado.web
 from swagger_ui import api_doc
 
@@ -22,32 +30,138 @@ from biothings.web.settings.configs import ConfigPackage
 
 from web.application import PendingAPI
 from web.settings.configuration import load_configuration, PendingAPIConfigModule
+from web.utils.biolink import get_biolink_model
+from web.utils.compression import COMPRESSORS
 
 logger = logging.getLogger(__name__)
 
 
+class InFlightRequests(tornado.httputil.HTTPServerConnectionDelegate):
+    """
+    Connection delegate wrapping the application to count the requests still being
+    served, so a worker shutting down can wait for them before closing its connections
+    """
+
+    def __init__(self, delegate: tornado.httputil.HTTPServerConnectionDelegate):
+        self.delegate = delegate
+        self.count = 0
+
+    def start_request(self, server_conn: object, request_conn: tornado.httputil.HTTPConnection):
+        return _InFlightMessageDelegate(self, self.delegate.start_request(server_conn, request_conn), request_conn)
+
+    def on_close(self, server_conn: object) -> None:
+        self.delegate.on_close(server_conn)
+
+
+class _InFlightMessageDelegate(tornado.httputil.HTTPMessageDelegate):
+    def __init__(
+        self,
+        tracker: InFlightRequests,
+        delegate: tornado.httputil.HTTPMessageDelegate,
+        request_conn: tornado.httputil.HTTPConnection,
+    ):
+        self.tracker = tracker
+        self.delegate = delegate
+        self.request_conn = request_conn
+        self.in_flight = False
+
+    def _request_done(self) -> None:
+        if self.in_flight:
+            self.in_flight = False
+            self.tracker.count -= 1
+
+    def headers_received(self, start_line, headers):
+        self.in_flight = True
+        self.tracker.count += 1
+
+        # the request is done once the response is written, not once its body is received
+        finish_response = self.request_conn.finish
+
+        def finish():
+            finish_response()
+            self._request_done()
+
+        self.request_conn.finish = finish
+        return self.delegate.headers_received(start_line, headers)
+
+    def data_received(self, chunk):
+        return self.delegate.data_received(chunk)
+
+    def finish(self) -> None:
+        self.delegate.finish()
+
+    def on_connection_close(self) -> None:
+        self._request_done()
+        self.delegate.on_connection_close()
+
+
 class PendingAPILauncher:
     """
     Specific launcher to the pending.api. Designed
     specifically for handling the volume of plugins
+
+    With more than one process (`--processes N`, 0 for one per CPU core), the server socket is
+    bound and the shared read-only data (config modules, Biolink model) is loaded in the parent
+    process, which then forks the workers so they share those pages copy-on-write. Each worker
+    builds its own application, IOLoop and Elasticsearch clients after the fork. The parent
+    restarts a worker exiting abnormally, and gives up after MAX_WORKER_CRASHES crashes:
+        * SIGTERM / SIGINT to a worker: stops accepting connections, drains and exits
+        * SIGHUP to a worker: same, then the parent starts a fresh worker in its place (not a crash)
+        * SIGTERM / SIGINT to the parent: sent to every worker, the parent waits for them to exit
+        * SIGHUP to the parent: rolling restart, each worker is sent SIGHUP once the replacement
+          of the previous one is started, so the other workers keep accepting connections
+
+    `--compression zstd,br,gzip` compresses the responses from `--compression_min_length` bytes
+    with the first of those encodings accepted by the client, see web.utils.compression
     """
 
+    # seconds given to the in-flight requests of a worker shutting down
+    WORKER_SHUTDOWN_TIMEOUT = 10
+
+    # exit status of a worker requesting the parent process to restart it
+    WORKER_RESTART_STATUS = 75
+
+    # abnormal worker exits after which the parent process stops restarting them
+    MAX_WORKER_CRASHES = 100
+
     def __init__(
         self, options: tornado.options.OptionParser, app_handlers: list[tuple], app_settings: dict, use_curl: bool
     ):
         logging.info("Biothings API %s", __version__)
         self.handlers = app_handlers
         self.host = options.address
+        self.processes = options.processes
         self.settings = self._configure_settings(options, app_settings)
         self.config = load_configuration(options.conf)
         self._configure_logging()
+        self._exit_status = None
+        self._task_id = None
+        self._workers = {}
+        self._stopping_workers = False
+        self._pending_restarts = []
+        self._restarting_worker = None
 
-        self.application = PendingAPI.get_app(self.config, self.settings, self.handlers)
-        self._configure_swagger(self.application)
+        self._preload_shared_data()
+        self.application = None
+        if self.processes == 1:
+            self.application = self._build_application()
 
         if use_curl:
             self.enable_curl_httpclient()
 
+    def _build_application(self) -> PendingAPI:
+        application = PendingAPI.get_app(self.config, self.settings, self.handlers)
+        self._configure_swagger(application)
+        return application
+
+    def _preload_shared_data(self) -> None:
+        """
+        Loads the large read-only structures at startup rather than on the first request needing
+        them, and before forking the workers so they share them. The config modules (UMLS
+        expansion data) are already imported by `load_configuration`
+        """
+        get_biolink_model()
+
     def _configure_swagger(self, application: tornado.web.Application) -> None:
         """
         Muliple swagger UI endpoints now:
@@ -74,6 +188,18 @@ class PendingAPILauncher:
         """
         app_settings.update(debug=options.debug)
         app_settings.update(autoreload=options.autoreload)
+        if options.processes != 1 and options.autoreload:
+            logger.warning("Autoreload isn't supported with multiple processes, disabling it")
+            app_settings.update(autoreload=False)
+
+        if options.compression:
+            compression_encodings = [encoding.strip() for encoding in options.compression.split(",")]
+            unavailable_encodings = [encoding for encoding in compression_encodings if encoding not in COMPRESSORS]
+            if unavailable_encodings:
+                logger.warning("Unsupported or not installed compression encodings: %s", unavailable_encodings)
+            app_settings.update(
+                compression_encodings=compression_encodings, compression_min_length=options.compression_min_length
+            )
         return app_settings
 
     def _configure_logging(self):
@@ -120,8 +246,21 @@ class PendingAPILauncher:
             port = 8000
         port = str(port)
 
-        http_server = tornado.httpserver.HTTPServer(self.application, xheaders=True)
-        http_server.listen(port, host)
+        if self.processes == 1:
+            http_server = tornado.httpserver.HTTPServer(self.application, xheaders=True)
+            http_server.listen(port, host)
+        else:
+            sockets = tornado.netutil.bind_sockets(port, host)
+            # keep the objects loaded so far out of the garbage collector, whose bookkeeping
+            # would otherwise write to (and so copy) their pages in every worker
+            gc.freeze()
+            self._task_id = self._fork_workers()
+            logger.info("Starting pending.api worker %s", self._task_id)
+            self.application = self._build_application()
+            in_flight_requests = InFlightRequests(self.application)
+            http_server = tornado.httpserver.HTTPServer(in_flight_requests, xheaders=True)
+            http_server.add_sockets(sockets)
+            self._configure_worker_signals(http_server, in_flight_requests)
 
         logger.info(
             "pending.api web server is running on %s:%s ...\n pending.api handlers:\n%s",
@@ -130,4 +269,174 @@ class PendingAPILauncher:
             pformat(self.application.biothings.handlers, width=200),
         )
         loop = tornado.ioloop.IOLoop.instance()
+        if self.application.lazy_sub_applications and getattr(self.config.root, "SUB_APPLICATION_WARMUP", False):
+            loop.add_callback(self.application.warmup)
         loop.start()
+
+        if self._exit_status is not None:
+            sys.exit(self._exit_status)
+
+    def _fork_workers(self) -> int:
+        """
+        Forks the worker processes and supervises them, in place of tornado.process.fork_processes
+        which counts the restarts requested by the workers (SIGHUP) as crashes and leaves the
+        signals sent to the parent unhandled
+
+        Only returns in a worker process, with the task id of the worker. The parent process
+        waits for its workers and exits once they're all stopped
+        """
+        num_processes = self.processes if self.processes > 0 else tornado.process.cpu_count()
+        logger.info("Starting %s pending.api worker processes", num_processes)
+        for task_id in range(num_processes):
+            if self._start_worker(task_id):
+                return task_id
+
+        for parent_signal in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            signal.signal(parent_signal, self._signal_workers)
+
+        crash_count = 0
+        while self._workers:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            if pid not in self._workers:
+                continue
+            task_id = self._workers.pop(pid)
+            exit_status = os.waitstatus_to_exitcode(status)
+            if self._stopping_workers:
+                logger.info("Worker %s (pid %s) stopped with exit status %s", task_id, pid, exit_status)
+                continue
+
+            if exit_status == 0:
+                logger.info("Worker %s (pid %s) exited normally", task_id, pid)
+            else:
+                if exit_status == self.WORKER_RESTART_STATUS:
+                    logger.info("Restarting worker %s (pid %s)", task_id, pid)
+                else:
+                    crash_count += 1
+                    logger.warning(
+                        "Worker %s (pid %s) exited with status %s, restarting it (%s/%s crashes)",
+                        task_id,
+                        pid,
+                        exit_status,
+                        crash_count,
+                        self.MAX_WORKER_CRASHES,
+                    )
+                    if crash_count >= self.MAX_WORKER_CRASHES:
+                        self._stopping_workers = True
+                        self._stop_workers(signal.SIGTERM)
+                        self._wait_workers()
+                        raise RuntimeError(f"Too many pending.api worker crashes ({crash_count}), giving up")
+
+                if self._start_worker(task_id):
+                    return task_id
+
+            # rolling restart, the replacement of the previous worker being started
+            if pid == self._restarting_worker:
+                self._restart_next_worker()
+        sys.exit(0)
+
+    def _wait_workers(self) -> None:
+        while self._workers:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            task_id = self._workers.pop(pid, None)
+            logger.info(
+                "Worker %s (pid %s) stopped with exit status %s", task_id, pid, os.waitstatus_to_exitcode(status)
+            )
+
+    def _start_worker(self, task_id: int) -> bool:
+        """
+        Forks the worker `task_id`. Returns True in the worker process
+        """
+        pid = os.fork()
+        if pid == 0:
+            # the signal handlers of the worker are installed along with its IOLoop
+            for worker_signal in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+                signal.signal(worker_signal, signal.SIG_DFL)
+            self._workers = {}
+            return True
+        self._workers[pid] = task_id
+        return False
+
+    def _signal_workers(self, signum: int, frame) -> None:
+        """
+        Signal handler of the parent process. SIGTERM / SIGINT are sent on to every worker to stop
+        them for good, while SIGHUP starts a rolling restart of the workers (see _restart_next_worker)
+        """
+        if signum == signal.SIGHUP:
+            logger.info("Restarting the pending.api workers one after another")
+            self._pending_restarts = [pid for pid in self._workers if pid != self._restarting_worker]
+            if self._restarting_worker is None:
+                self._restart_next_worker()
+            return
+
+        self._stopping_workers = True
+        logger.info("Sending %s to the pending.api workers", signal.Signals(signum).name)
+        self._stop_workers(signum)
+
+    def _restart_next_worker(self) -> None:
+        """
+        Sends SIGHUP to the next worker of the rolling restart. The parent calls it again once that
+        worker has exited and its replacement is forked
+        """
+        self._restarting_worker = None
+        while self._pending_restarts:
+            pid = self._pending_restarts.pop(0)
+            if pid not in self._workers:
+                continue
+            try:
+                os.kill(pid, signal.SIGHUP)
+            except ProcessLookupError:
+                continue
+            self._restarting_worker = pid
+            return
+
+    def _stop_workers(self, signum: int) -> None:
+        for pid in list(self._workers):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def _configure_worker_signals(
+        self, http_server: tornado.httpserver.HTTPServer, in_flight_requests: InFlightRequests
+    ) -> None:
+        asyncio_loop = asyncio.get_event_loop()
+        for shutdown_signal in (signal.SIGTERM, signal.SIGINT):
+            asyncio_loop.add_signal_handler(shutdown_signal, self._shutdown_worker, http_server, in_flight_requests, 0)
+        asyncio_loop.add_signal_handler(
+            signal.SIGHUP, self._shutdown_worker, http_server, in_flight_requests, self.WORKER_RESTART_STATUS
+        )
+
+    def _shutdown_worker(
+        self, http_server: tornado.httpserver.HTTPServer, in_flight_requests: InFlightRequests, exit_status: int
+    ) -> None:
+        """
+        Stops accepting connections, waits (up to WORKER_SHUTDOWN_TIMEOUT) for the in-flight
+        requests to be served, then closes the remaining idle connections and stops the IOLoop
+        """
+        if self._exit_status is not None:
+            return
+        self._exit_status = exit_status
+        logger.info("Shutting down pending.api worker %s", self._task_id)
+        http_server.stop()
+
+        async def drain_connections():
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self.WORKER_SHUTDOWN_TIMEOUT
+            while in_flight_requests.count > 0 and loop.time() < deadline:
+                await asyncio.sleep(0.1)
+            if in_flight_requests.count > 0:
+                logger.warning(
+                    "Worker %s shutdown timed out with %s requests in flight",
+                    self._task_id,
+                    in_flight_requests.count,
+                )
+            await http_server.close_all_connections()
+            tornado.ioloop.IOLoop.current().stop()
+
+        tornado.ioloop.IOLoop.current().spawn_callback(drain_connections)
@@ -3,25 +3,43 @@ from copy import deepcopy
 
 from biothings.utils.common import dotdict, traverse
 from biothings.web.query import AsyncESQueryPipeline, ESQueryBuilder, ESResultFormatter
-from elasticsearch_dsl import MultiSearch, Search
+from biothings.web.query.pipeline import capturesESExceptions
+from elasticsearch_dsl import MultiSearch, Q, Search
 
 from web.graph import GraphObject, GraphQueries, GraphQuery
 
 
 class PendingQueryPipeline(AsyncESQueryPipeline):
 
+    @capturesESExceptions
     async def graph_search(self, q, **options):
 
         # result formatter will consume this
         options["_q"] = q
 
-        # define multi-query response format
-        if isinstance(q, GraphQueries):
-            options["templates"] = (dict(query=_q.to_dict()) for _q in q)
-            options["template_miss"] = dict(notfound=True)
-            options["template_hit"] = dict()
+        if not isinstance(q, GraphQueries):
+            return await super().search(q, **options)
 
-        return await super().search(q, **options)
+        # define multi-query response format
+        options["templates"] = (dict(query=_q.to_dict()) for _q in q)
+        options["template_miss"] = dict(notfound=True)
+        options["template_hit"] = dict()
+
+        # identical graph queries of the batch are only sent once
+        distinct_queries, positions = q.deduplicate()
+        query = self.builder.build(distinct_queries, **options)
+        responses = await self.backend.execute(query, **options)
+
+        # the formatter transforms the responses in place, so a repeated one is copied
+        response = []
+        seen_positions = set()
+        for position in positions:
+            if position in seen_positions:
+                response.append(deepcopy(responses[position]))
+            else:
+                response.append(responses[position])
+                seen_positions.add(position)
+        return self.formatter.transform(response, **options)
 
 
 class PendingQueryBuilder(ESQueryBuilder):
@@ -50,9 +68,7 @@ class PendingQueryBuilder(ESQueryBuilder):
         query = self._build_graph_query(q)
 
         if reverse and q.reversible():
-            _q = deepcopy(q)
-            _q.reverse()
-            query = query | self._build_graph_query(_q)
+            query = query | self._build_graph_query(q.reversed())
 
         search = Search().query(query) if query else Search()
         search = self.apply_extras(search, dotdict(options))
@@ -64,22 +80,63 @@ class PendingQueryBuilder(ESQueryBuilder):
         Takes a GraphQuery object and return an ES Query object.
         """
         assert isinstance(graph_query, GraphQuery)
-        q = graph_query.to_dict()
-
-        _q = []
-        _scopes = []
+        return self._build_fields_query(graph_query.to_dict())
 
+    def _build_fields_query(self, q):
+        """
+        Takes a dict of the queried fields and return an ES Query object.
+        """
+        # the same query as self._build_match_query(_q, _scopes, dotdict()).query._proxied,
+        # built without cloning a Search object for every term, which dominates large batches
+        queries = []
         for k, v in traverse(q, True):
-            if isinstance(v, list):
-                for _v in v:
-                    _q.append(_v)
-                    _scopes.append(k)
-            else:
-                _q.append(v)
-                _scopes.append(k)
+            for _v in v if isinstance(v, list) else [v]:
+                if not (_v and k):
+                    raise ValueError("No search terms or scopes.")
+                queries.append(Q("multi_match", query=_v, fields=k, operator="AND", lenient=True))
+
+        if not queries:
+            return None
+        if len(queries) == 1:
+            return queries[0]
+        return Q("bool", must=queries)
+
 
-        # query proxy object does not support OR operator, thus using _proxied
-        return self._build_match_query(_q, _scopes, dotdict()).query._proxied
+class CanonicalGraphQueryBuilder(PendingQueryBuilder):
+    """
+    Graph query builder of the APIs whose documents are indexed with the canonical
+    direction of their edge, see GraphObject.add_canonical_direction.
+
+    Both directions of an edge have the same canonical direction, so a reverse query
+    matches the canonical fields with a single set of clauses, instead of OR-ing
+    the query with its reversed copy. Only the queries with a symmetric predicate,
+    which have no canonical direction, are still OR-ed.
+    """
+
+    def build_graph_query(self, q, reverse=False, **options):
+
+        if not (reverse and q.reversible() and not q.symmetric()):
+            return super().build_graph_query(q, reverse, **options)
+
+        canonical = q.canonical().to_dict()
+        association = dict(canonical["association"])
+        edge_label = association.pop("edge_label")
+        query = self._build_fields_query(
+            {
+                GraphObject.CANONICAL_FIELD: {
+                    "subject": canonical["subject"],
+                    "object": canonical["object"],
+                    "association": {"edge_label": edge_label},
+                },
+                # the other association fields are the same in both directions
+                "association": association,
+            }
+        )
+
+        search = Search().query(query)
+        search = self.apply_extras(search, dotdict(options))
+
+        return search
 
 
 class GraphResultTransform(ESResultFormatter):
@@ -87,20 +144,23 @@ class GraphResultTransform(ESResultFormatter):
     def transform_hit(self, path, doc, hit, options):
 
         if path == "":
-
-            if options.reversed and all(
-                (  # is reversed query
-                    options._q.predicate,
-                    options.reverse,
-                    options._q.predicate in options._q.PREDICATE_MAPPING,
-                )
+            # only indexed for the queries
+            if GraphObject.CANONICAL_FIELD in doc:
+                del doc[GraphObject.CANONICAL_FIELD]
+
+            # the hits of a batch of graph queries are left in their stored direction
+            graph_query = options._q
+            if (
+                options.reversed
+                and options.reverse
+                and isinstance(graph_query, GraphQuery)
+                and graph_query.reversible()
             ):
                 try:
                     obj = GraphObject.from_dict(doc)
-                    _predicate = options._q.PREDICATE_MAPPING[options._q.predicate]
-                    reversed = obj.predicate == _predicate
-                    if obj.reversible() and reversed:
+                    # a hit in the direction of the query is left as is
+                    if obj.predicate == graph_query.PREDICATE_MAPPING[graph_query.predicate]:
                         obj.reverse()
-                    doc.update(obj.to_dict())
+                        doc.update(obj.to_dict())
                 except Exception as exc:
                     logging.error(exc)
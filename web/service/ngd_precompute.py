@@ -0,0 +1,229 @@
+"""
+Offline precomputation of the Normalized Google Distances of the top co-occurring UMLS pairs in SemMedDB.
+
+`NGDPrecomputeJob` streams all the (subject, object) pairs with ES composite aggregations, keeps the top co-occurring
+candidates, calculates their exact bipartite document frequencies and NGDs, and writes them to a compact lookup
+artifact (gzipped JSON). `PrecomputedNGDTable` loads the artifact in the web process, so that `NGDService` can serve
+the popular pairs without any ES query.
+
+See `bin/ngd_precompute.py` for the command-line entrypoint.
+"""
+
+import gzip
+import heapq
+import json
+import logging
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from elasticsearch import AsyncElasticsearch
+from elasticsearch_dsl import A, Search
+
+from web.service.ngd_service import DocStatsService, Term, TermPair
+from web.utils import normalized_google_distance
+
+logger = logging.getLogger(__name__)
+
+
+class PrecomputedNGDTable:
+    """
+    A read-only lookup table from the cache key of a (non-expanded) term pair to its precomputed NGD.
+    Coverage is tracked as the fraction of lookups served from the table.
+
+    The table is only valid for the index build it was computed from (the "index_build" of its metadata). Once
+    `check_index_build` finds a different live build, e.g. after a reindex, the table is disabled and all its lookups
+    miss, until it's checked against a matching build again.
+    """
+
+    def __init__(self, distances: Dict[str, float], metadata: dict = None):
+        self.distances = distances
+        self.metadata = metadata or {}
+
+        self.enabled = True
+        self.checked_index_build = None  # the live index build the table was last checked against
+
+        self.lookups = 0
+        self.hits = 0
+
+    @classmethod
+    def load(cls, filepath: str) -> "PrecomputedNGDTable":
+        with gzip.open(filepath, "rt") as handle:
+            artifact = json.load(handle)
+        return cls(distances=artifact["ngd"], metadata=artifact["metadata"])
+
+    def dump(self, filepath: str):
+        with gzip.open(filepath, "wt") as handle:
+            json.dump({"metadata": self.metadata, "ngd": self.distances}, handle, separators=(",", ":"))
+
+    @property
+    def index_build(self) -> Optional[str]:
+        return self.metadata.get("index_build")
+
+    def check_index_build(self, index_build: str) -> bool:
+        """
+        Enable the table if it was computed from `index_build` (or if the build it was computed from is unknown),
+        and disable it otherwise. Returns whether the table is enabled.
+        """
+        self.checked_index_build = index_build
+        self.enabled = self.index_build is None or self.index_build == index_build
+        if not self.enabled:
+            logger.warning(
+                "Precomputed NGDs of index build %s are disabled, the live index build being %s",
+                self.index_build,
+                index_build,
+            )
+        return self.enabled
+
+    def lookup(self, key: str) -> Optional[float]:
+        if not self.enabled:
+            return None
+
+        self.lookups += 1
+        distance = self.distances.get(key)
+        if distance is not None:
+            self.hits += 1
+        return distance
+
+    def stats(self) -> dict:
+        return {
+            **self.metadata,
+            "enabled": self.enabled,
+            "checked_index_build": self.checked_index_build,
+            "size": len(self.distances),
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "coverage": (self.hits / self.lookups) if self.lookups else None,
+        }
+
+
+class NGDPrecomputeJob:
+    """
+    Compute the NGDs of the top-K co-occurring UMLS pairs.
+
+    1. Page through all the (subject, object) buckets with a composite aggregation, keeping the top
+       `candidate_factor * top_k` directional buckets by their sums of "predication_count".
+    2. Calculate the exact bipartite document frequencies (both directions) of the candidate pairs in bulk,
+       and keep the top-K pairs.
+    3. Calculate the unary document frequencies in bulk, and then the NGDs.
+    """
+
+    def __init__(
+        self,
+        doc_stats_service: DocStatsService,
+        top_k: int,
+        candidate_factor: int = 2,
+        page_size: int = 10000,
+        batch_size: int = 500,
+    ):
+        self.doc_stats_service = doc_stats_service
+        self.top_k = top_k
+        self.candidate_factor = candidate_factor
+        self.page_size = page_size  # number of composite buckets per ES request
+        self.batch_size = batch_size  # number of filters per bulk doc freq ES request
+
+    @property
+    def es_async_client(self) -> AsyncElasticsearch:
+        return self.doc_stats_service.es_async_client
+
+    def _composite_search(self, after_key: dict = None) -> Search:
+        sources = [
+            {"subject": {"terms": {"field": self.doc_stats_service.subject_field_name}}},
+            {"object": {"terms": {"field": self.doc_stats_service.object_field_name}}},
+        ]
+        composite_kwargs = {"size": self.page_size, "sources": sources}
+        if after_key is not None:
+            composite_kwargs["after"] = after_key
+
+        search = Search().extra(size=0)
+        _agg = A("composite", **composite_kwargs)
+        _agg.metric(self.doc_stats_service.doc_freq_agg_name, A("sum", field="predication_count"))
+        search.aggs.bucket("pairs", _agg)
+        return search
+
+    async def candidate_pairs(self) -> List[Tuple[str, str]]:
+        """
+        Return the distinct (sorted) pairs of the top co-occurring directional (subject, object) buckets
+        """
+        agg_name = self.doc_stats_service.doc_freq_agg_name
+        heap = []  # min-heap of (doc_freq, subject, object)
+        capacity = self.candidate_factor * self.top_k
+
+        after_key = None
+        while True:
+            search = self._composite_search(after_key)
+            resp = await self.es_async_client.search(body=search.to_dict(), index=self.doc_stats_service.es_index_name)
+            pairs_agg = resp["aggregations"]["pairs"]
+            for bucket in pairs_agg["buckets"]:
+                subject, object_ = bucket["key"]["subject"], bucket["key"]["object"]
+                if subject == object_:
+                    continue
+                item = (int(bucket[agg_name]["value"]), subject, object_)
+                if len(heap) < capacity:
+                    heapq.heappush(heap, item)
+                elif item > heap[0]:
+                    heapq.heapreplace(heap, item)
+
+            after_key = pairs_agg.get("after_key")
+            if not pairs_agg["buckets"] or after_key is None:
+                break
+
+        return sorted({tuple(sorted((subject, object_))) for _, subject, object_ in heap})
+
+    async def bipartite_doc_freqs(self, pairs: List[Tuple[str, str]]) -> Dict[Tuple[str, str], int]:
+        """
+        Exact bipartite document frequencies of the pairs, grouped by the first term of each pair
+        """
+        terms_by_x = defaultdict(list)
+        for x, y in pairs:
+            terms_by_x[x].append(y)
+
+        doc_freqs = {}
+        for x, ys in terms_by_x.items():
+            term_x = Term(root=x, expandable=False)
+            for start in range(0, len(ys), self.batch_size):
+                batch = ys[start : start + self.batch_size]
+                terms_y = [Term(root=y, expandable=False) for y in batch]
+                batch_doc_freqs = await self.doc_stats_service.bulk_bipartite_doc_freq(term_x, terms_y)
+                doc_freqs.update({(x, y): doc_freq for y, doc_freq in zip(batch, batch_doc_freqs)})
+        return doc_freqs
+
+    async def unary_doc_freqs(self, terms: List[str]) -> Dict[str, int]:
+        doc_freqs = {}
+        for start in range(0, len(terms), self.batch_size):
+            batch = terms[start : start + self.batch_size]
+            batch_doc_freqs = await self.doc_stats_service.bulk_unary_doc_freq(
+                [Term(root=term, expandable=False) for term in batch]
+            )
+            doc_freqs.update(zip(batch, batch_doc_freqs))
+        return doc_freqs
+
+    async def run(self) -> PrecomputedNGDTable:
+        start_time = time.time()
+
+        candidates = await self.candidate_pairs()
+        logger.info("Found %d candidate pairs in %.1fs", len(candidates), time.time() - start_time)
+
+        bipartite_doc_freqs = await self.bipartite_doc_freqs(candidates)
+        top_pairs = heapq.nlargest(self.top_k, bipartite_doc_freqs.items(), key=lambda item: item[1])
+        top_pairs = [(pair, doc_freq) for pair, doc_freq in top_pairs if doc_freq > 0]
+
+        unary_doc_freqs = await self.unary_doc_freqs(sorted({term for pair, _ in top_pairs for term in pair}))
+        n = await self.doc_stats_service.doc_total()
+
+        distances = {}
+        for (x, y), f_xy in top_pairs:
+            f_x, f_y = unary_doc_freqs[x], unary_doc_freqs[y]
+            if f_x > 0 and f_y > 0:
+                term_pair = TermPair(term_x=Term(root=x, expandable=False), term_y=Term(root=y, expandable=False))
+                distances[term_pair.cache_key] = normalized_google_distance(n=n, f_x=f_x, f_y=f_y, f_xy=f_xy)
+
+        metadata = {
+            "index": self.doc_stats_service.es_index_name,
+            "top_k": self.top_k,
+            "doc_total": n,
+            "min_bipartite_doc_freq": top_pairs[-1][1] if top_pairs else None,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        }
+        logger.info("Precomputed %d NGDs in %.1fs", len(distances), time.time() - start_time)
+        return PrecomputedNGDTable(distances=distances, metadata=metadata)
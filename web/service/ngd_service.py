@@ -1,11 +1,24 @@
-from typing import Union, List
+import asyncio
+import bisect
+import logging
+from typing import Union, List, Optional
 from abc import ABC, abstractmethod
 
-from elasticsearch import AsyncElasticsearch
+import numpy as np
+
+from elasticsearch import AsyncElasticsearch, AuthenticationException, AuthorizationException, NotFoundError
 from elasticsearch_dsl import Search, Q, A
 
-from web.utils import LRUCache
-from web.utils import normalized_google_distance, INFINITY_STR, NGDZeroDocFreqException, NGDInfinityException
+from web.utils import LRUCache, SingleFlight
+from web.utils import (
+    normalized_google_distance,
+    normalized_google_distance_matrix,
+    INFINITY_STR,
+    NGDZeroDocFreqException,
+    NGDInfinityException,
+)
+
+logger = logging.getLogger(__name__)
 
 
 class CacheKeyable:
@@ -94,6 +107,94 @@ class TermExpansionService(ABC):
         raise NotImplementedError
 
 
+class TermSetSizeMetrics:
+    """
+    Metrics of the sizes of the (expanded) term sets sent to ES, i.e. the number of terms in `Term.all_string_terms_within()`.
+    """
+
+    # upper bounds (inclusive) of the histogram buckets; the last bucket counts all the sizes above 10000
+    bucket_bounds = (1, 10, 100, 1000, 10000)
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.buckets = [0] * (len(self.bucket_bounds) + 1)
+
+    def observe(self, size: int):
+        self.count += 1
+        self.total += size
+        self.max = max(self.max, size)
+        self.buckets[bisect.bisect_left(self.bucket_bounds, size)] += 1
+
+    def to_dict(self) -> dict:
+        bucket_names = [f"<={bound}" for bound in self.bucket_bounds] + [f">{self.bucket_bounds[-1]}"]
+        return {
+            "count": self.count,
+            "mean": (self.total / self.count) if self.count else 0,
+            "max": self.max,
+            "histogram": dict(zip(bucket_names, self.buckets)),
+        }
+
+
+class ExpandedTermSetStore:
+    """
+    Store the large expanded term sets as documents in a lookup index, so that the `terms` filters on those sets
+    can reference the stored documents (i.e. ES "terms lookup") instead of carrying thousands of UMLS terms in every
+    query, which would otherwise be re-serialized and re-parsed per query.
+
+    A term set is stored the first time it's queried in this process, with the term's cache key as the document ID.
+    If `index_name` is None, or the storing fails, the term sets are always sent inline. A term set failing to be stored
+    is not tried again, and the store is turned off altogether once the index turns out not to be writable.
+    The sizes of all the term sets passing through are recorded in `size_metrics`.
+    """
+
+    def __init__(self, index_name: Optional[str], min_size: int, path: str = "umls"):
+        self.index_name = index_name  # e.g. "pending-semmeddb-term-sets"
+        self.min_size = min_size  # term sets smaller than this size are always sent inline
+        self.path = path  # the field holding the term set in the stored documents
+
+        self.stored_keys = set()
+        self.failed_keys = set()  # term sets which failed to be stored, always sent inline
+        self.disabled = False  # set when the lookup index can't be written at all
+        self.single_flight = SingleFlight()
+        self.size_metrics = TermSetSizeMetrics()
+
+    def is_stored(self, term: Term) -> bool:
+        return term.cache_key in self.stored_keys
+
+    def lookup(self, term: Term) -> dict:
+        """
+        Return the "terms lookup" body referencing the stored term set
+        """
+        return {"index": self.index_name, "id": term.cache_key, "path": self.path}
+
+    async def store(self, es_async_client: AsyncElasticsearch, term: Term):
+        all_terms = list(term.all_string_terms_within())
+        self.size_metrics.observe(len(all_terms))
+
+        if self.index_name is None or self.disabled or len(all_terms) < self.min_size:
+            return
+        if self.is_stored(term) or term.cache_key in self.failed_keys:
+            return
+
+        async def index_term_set():
+            try:
+                await es_async_client.index(index=self.index_name, id=term.cache_key, document={self.path: all_terms})
+            except (AuthenticationException, AuthorizationException, NotFoundError) as e:
+                # e.g. a read-only user, a missing index or a blocked cluster, which would fail all the term sets
+                self.disabled = True
+                logger.warning("Cannot write to index %s, sending all the term sets inline: %s", self.index_name, e)
+            except Exception as e:  # fall back to inline term sets
+                self.failed_keys.add(term.cache_key)
+                logger.warning("Cannot store the term set of %s to index %s: %s", term.cache_key, self.index_name, e)
+            else:
+                self.stored_keys.add(term.cache_key)
+
+        # concurrent queries of the same term set are coalesced into one storing request
+        await self.single_flight.do(term.cache_key, index_term_set)
+
+
 class DocStatsService:
     def __init__(
         self,
@@ -102,6 +203,7 @@ class DocStatsService:
         subject_field_name: str,
         object_field_name: str,
         doc_freq_agg_name: str,
+        term_set_store: ExpandedTermSetStore = None,
     ):
         # SemmedNGDHandler will receive configuration values from config_web/xxx.py, and initialize DocStatsService accordingly
         self.es_async_client = es_async_client
@@ -109,6 +211,18 @@ class DocStatsService:
         self.subject_field_name = subject_field_name  # e.g. "subject.umls"
         self.object_field_name = object_field_name  # e.g. "object.umls"
         self.doc_freq_agg_name = doc_freq_agg_name  # e.g. "sum_of_predication_counts"
+        self.term_set_store = term_set_store  # if not None, large expanded term sets are referenced by terms lookup
+
+    async def _store_term_sets(self, terms: List[Term]):
+        if self.term_set_store is None:
+            return
+
+        await asyncio.gather(*[self.term_set_store.store(self.es_async_client, term) for term in terms])
+
+    def _terms_query(self, field_name: str, term: Term) -> Q:
+        if self.term_set_store is not None and self.term_set_store.is_stored(term):
+            return Q("terms", **{field_name: self.term_set_store.lookup(term)})
+        return Q("terms", **{field_name: list(term.all_string_terms_within())})
 
     async def _query_doc_freq_in_es(self, search: Search) -> int:
         """
@@ -162,8 +276,7 @@ class DocStatsService:
             "size": 0
         }
         """
-        all_terms = list(term.all_string_terms_within())
-        _filter = Q("terms", **{self.subject_field_name: all_terms}) | Q("terms", **{self.object_field_name: all_terms})
+        _filter = self._unary_filter(term)
         # size=0 means the query result will include 0 hits (so only the aggregation value will be returned)
         search = Search().query("bool", filter=_filter).extra(size=0)
 
@@ -175,6 +288,7 @@ class DocStatsService:
         """
         Get the document frequency of all terms within the `term` object (i.e. count of the union of the documents containing any of the term within).
         """
+        await self._store_term_sets([term])
         search = self._unary_search(term)
         doc_freq = await self._query_doc_freq_in_es(search)
         return doc_freq
@@ -216,16 +330,9 @@ class DocStatsService:
             "size": 0
         }
         """
-        all_terms_x = list(term_pair[0].all_string_terms_within())
-        all_terms_y = list(term_pair[1].all_string_terms_within())
-        filter_xy = Q("terms", **{self.subject_field_name: all_terms_x}) & Q(
-            "terms", **{self.object_field_name: all_terms_y}
-        )
-        filter_yx = Q("terms", **{self.subject_field_name: all_terms_y}) & Q(
-            "terms", **{self.object_field_name: all_terms_x}
-        )
+        _filter = self._bipartite_filter(term_pair[0], term_pair[1])
         # size=0 means the query result will include 0 hits (so only the aggregation value will be returned)
-        search = Search().query("bool", filter=filter_xy | filter_yx).extra(size=0)
+        search = Search().query("bool", filter=_filter).extra(size=0)
 
         _agg = A("sum", field="predication_count")
         search.aggs.metric(self.doc_freq_agg_name, _agg)  # attach the aggregation with its name to the search object
@@ -236,10 +343,87 @@ class DocStatsService:
         Get the document frequency of all the term combinations within the term_pair object
         (i.e. count of the union of the documents containing any pair of terms within).
         """
+        await self._store_term_sets(list(term_pair))
         search = self._bipartite_search(term_pair)
         doc_freq = await self._query_doc_freq_in_es(search)
         return doc_freq
 
+    async def _query_bucketed_doc_freqs_in_es(self, search: Search, bucket_keys: List[str]) -> List[int]:
+        """
+        Query the search object (with a `filters` aggregation named `self.doc_freq_agg_name`) to ES and parse the
+        sum aggregation value in each bucket as a document frequency.
+
+        The response structure is like:
+
+            {
+                ...,
+                'aggregations': {
+                    '<agg_name>': {
+                        'buckets': {
+                            '<bucket_key_0>': {'doc_count': 12, '<agg_name>': {'value': 89.0}},
+                            '<bucket_key_1>': {'doc_count': 0, '<agg_name>': {'value': 0.0}},
+                            ...
+                        }
+                    }
+                }
+            }
+        """
+        resp = await self.es_async_client.search(body=search.to_dict(), index=self.es_index_name)
+
+        if "aggregations" not in resp:
+            raise ValueError(
+                f"No aggregation result in response. Got {search.to_dict()} to index {self.es_index_name}, response being {resp}"
+            )
+        buckets = resp["aggregations"][self.doc_freq_agg_name]["buckets"]
+        return [int(buckets[key][self.doc_freq_agg_name]["value"]) for key in bucket_keys]
+
+    def _bucketed_search(self, filters: List[Q]) -> Search:
+        """
+        Make a Search object with a `filters` aggregation, one bucket (keyed by its position in `filters`) per filter,
+        and a sum aggregation of "predication_count" in each bucket.
+        """
+        search = Search().extra(size=0)
+        _agg = A("filters", filters={str(index): _filter for index, _filter in enumerate(filters)})
+        _agg.metric(self.doc_freq_agg_name, A("sum", field="predication_count"))
+        search.aggs.bucket(self.doc_freq_agg_name, _agg)
+        return search
+
+    def _unary_filter(self, term: Term) -> Q:
+        return self._terms_query(self.subject_field_name, term) | self._terms_query(self.object_field_name, term)
+
+    def _bipartite_filter(self, term_x: Term, term_y: Term) -> Q:
+        filter_xy = self._terms_query(self.subject_field_name, term_x) & self._terms_query(
+            self.object_field_name, term_y
+        )
+        filter_yx = self._terms_query(self.subject_field_name, term_y) & self._terms_query(
+            self.object_field_name, term_x
+        )
+        return filter_xy | filter_yx
+
+    async def bulk_unary_doc_freq(self, terms: List[Term]) -> List[int]:
+        """
+        Get the document frequencies of multiple `term` objects in one ES query. Equivalent to calling
+        `unary_doc_freq()` on each term.
+        """
+        if not terms:
+            return []
+
+        await self._store_term_sets(terms)
+        search = self._bucketed_search([self._unary_filter(term) for term in terms])
+        return await self._query_bucketed_doc_freqs_in_es(search, [str(index) for index in range(len(terms))])
+
+    async def bulk_bipartite_doc_freq(self, term_x: Term, terms_y: List[Term]) -> List[int]:
+        """
+        Get the bipartite document frequencies of `term_x` with each term in `terms_y` in one ES query. Equivalent to
+        calling `bipartite_doc_freq()` on each term pair `(term_x, term_y)`.
+        """
+        if not terms_y:
+            return []
+
+        await self._store_term_sets([term_x, *terms_y])
+        search = self._bucketed_search([self._bipartite_filter(term_x, term_y) for term_y in terms_y])
+        return await self._query_bucketed_doc_freqs_in_es(search, [str(index) for index in range(len(terms_y))])
+
     async def doc_total(self) -> int:
         # This search is essentially a doc_freq search without any filter on terms
         search = Search().extra(size=0)
@@ -263,6 +447,15 @@ class NGDCache:
     def write_distance(self, key, distance: Union[float, str]):
         self.distance_cache.put(key, distance)
 
+    async def fetch_distance(self, key, loader) -> Union[float, str]:
+        return await self.distance_cache.fetch(key, loader)
+
+    def clear(self):
+        self.distance_cache.clear()
+
+    def stats(self) -> dict:
+        return {"distance": self.distance_cache.stats()}
+
 
 class DocStatsCache:
     """
@@ -275,6 +468,7 @@ class DocStatsCache:
 
     def __init__(self, unary_capacity, bipartite_capacity):
         self.total_cache: int = None
+        self.total_single_flight = SingleFlight()
 
         self.unary_cache = LRUCache(unary_capacity)
         self.bipartite_cache = LRUCache(bipartite_capacity)
@@ -297,6 +491,35 @@ class DocStatsCache:
     def write_bipartite_doc_freq(self, key, doc_freq: int):
         self.bipartite_cache.put(key, doc_freq)
 
+    async def fetch_doc_total(self, loader) -> int:
+        if self.total_cache is not None:
+            return self.total_cache
+
+        async def load_and_write():
+            total = await loader()
+            self.write_doc_total(total)
+            return total
+
+        return await self.total_single_flight.do("total", load_and_write)
+
+    async def fetch_unary_doc_freq(self, key, loader) -> int:
+        return await self.unary_cache.fetch(key, loader)
+
+    async def fetch_bipartite_doc_freq(self, key, loader) -> int:
+        return await self.bipartite_cache.fetch(key, loader)
+
+    def clear(self):
+        self.total_cache = None
+        self.unary_cache.clear()
+        self.bipartite_cache.clear()
+
+    def stats(self) -> dict:
+        return {
+            "total": {"cached": self.total_cache is not None, "value": self.total_cache},
+            "unary": self.unary_cache.stats(),
+            "bipartite": self.bipartite_cache.stats(),
+        }
+
 
 class NGDService:
     def __init__(
@@ -305,6 +528,7 @@ class NGDService:
         term_expansion_service: TermExpansionService,
         doc_stats_cache: DocStatsCache,
         ngd_cache: NGDCache,
+        precomputed_ngd_table=None,
     ):
         self.doc_stats_service = doc_stats_service
         self.term_expansion_service = term_expansion_service
@@ -312,6 +536,9 @@ class NGDService:
         self.doc_stats_cache = doc_stats_cache
         self.ngd_cache = ngd_cache
 
+        # an optional `web.service.ngd_precompute.PrecomputedNGDTable`, checked before the caches and ES
+        self.precomputed_ngd_table = precomputed_ngd_table
+
     def expand_term(self, term: Term):
         if term.expandable and (not term.expanded):
             leaves = self.term_expansion_service.expand(term.root)
@@ -322,25 +549,29 @@ class NGDService:
             self.expand_term(term)
 
     async def unary_doc_freq(self, term: Term, read_cache=True):
+        async def query_doc_freq():
+            self.expand_term(term)
+            return await self.doc_stats_service.unary_doc_freq(term)
+
         if read_cache:
-            cached_doc_freq = self.doc_stats_cache.read_unary_doc_freq(term.cache_key)
-            if cached_doc_freq is not None:
-                return cached_doc_freq
+            # concurrent cache misses on the same term are coalesced into one ES query
+            return await self.doc_stats_cache.fetch_unary_doc_freq(term.cache_key, query_doc_freq)
 
-        self.expand_term(term)
-        doc_freq = await self.doc_stats_service.unary_doc_freq(term)
+        doc_freq = await query_doc_freq()
         self.doc_stats_cache.write_unary_doc_freq(term.cache_key, doc_freq)
 
         return doc_freq
 
     async def bipartite_doc_freq(self, term_pair: TermPair, read_cache=True):
+        async def query_doc_freq():
+            self.expand_term_pair(term_pair)
+            return await self.doc_stats_service.bipartite_doc_freq(term_pair)
+
         if read_cache:
-            cached_doc_freq = self.doc_stats_cache.read_bipartite_doc_freq(term_pair.cache_key)
-            if cached_doc_freq is not None:
-                return cached_doc_freq
+            # concurrent cache misses on the same term pair are coalesced into one ES query
+            return await self.doc_stats_cache.fetch_bipartite_doc_freq(term_pair.cache_key, query_doc_freq)
 
-        self.expand_term_pair(term_pair)
-        doc_freq = await self.doc_stats_service.bipartite_doc_freq(term_pair)
+        doc_freq = await query_doc_freq()
         self.doc_stats_cache.write_bipartite_doc_freq(term_pair.cache_key, doc_freq)
 
         return doc_freq
@@ -350,9 +581,7 @@ class NGDService:
         Get the total number of documents in the index. This value will be cached, otherwise a query to self.doc_stats_service will be made to init this value.
         """
         if read_cache:
-            cached_total = self.doc_stats_cache.read_doc_total()
-            if cached_total is not None:
-                return cached_total
+            return await self.doc_stats_cache.fetch_doc_total(self.doc_stats_service.doc_total)
 
         total = await self.doc_stats_service.doc_total()
         self.doc_stats_cache.write_doc_total(total)
@@ -386,12 +615,7 @@ class NGDService:
         n = await self.doc_total()
         return f_x, f_y, f_xy, n
 
-    async def calculate_ngd(self, term_pair: TermPair, read_cache=True):
-        if read_cache:
-            cached_distance = self.ngd_cache.read_distance(term_pair.cache_key)
-            if cached_distance is not None:
-                return cached_distance
-
+    async def _compute_ngd(self, term_pair: TermPair):
         try:
             f_x, f_y, f_xy, n = await self._prepare_stats(term_pair)
         except NGDZeroDocFreqException as e:
@@ -401,7 +625,106 @@ class NGDService:
         else:
             distance = normalized_google_distance(n=n, f_x=f_x, f_y=f_y, f_xy=f_xy)
 
-        # Do not wrap the below 2 lines in `finally`,
-        # otherwise they will execute even when an NGDUndefinedException is raised.
+        return distance
+
+    async def calculate_ngd(self, term_pair: TermPair, read_cache=True):
+        if read_cache and self.precomputed_ngd_table is not None:
+            # Expanded terms have different cache keys (with "*" suffixes), so they never hit the precomputed table
+            precomputed_distance = self.precomputed_ngd_table.lookup(term_pair.cache_key)
+            if precomputed_distance is not None:
+                return precomputed_distance
+
+        if read_cache:
+            # Concurrent cache misses on the same term pair are coalesced into one computation.
+            # An NGDUndefinedException is propagated to all the waiting callers and the distance is not cached.
+            return await self.ngd_cache.fetch_distance(term_pair.cache_key, lambda: self._compute_ngd(term_pair))
+
+        distance = await self._compute_ngd(term_pair)
         self.ngd_cache.write_distance(term_pair.cache_key, distance)
         return distance
+
+    async def bulk_unary_doc_freq(self, terms: List[Term]) -> np.ndarray:
+        """
+        Get the unary document frequencies of all the terms. Cache misses are queried to ES in one request.
+        """
+        doc_freqs = {}
+        missed_terms = {}
+        for term in terms:
+            cached_doc_freq = self.doc_stats_cache.read_unary_doc_freq(term.cache_key)
+            if cached_doc_freq is not None:
+                doc_freqs[term.cache_key] = cached_doc_freq
+            else:
+                missed_terms.setdefault(term.cache_key, term)
+
+        if missed_terms:
+            missed_terms = list(missed_terms.values())
+            for term in missed_terms:
+                self.expand_term(term)
+
+            missed_doc_freqs = await self.doc_stats_service.bulk_unary_doc_freq(missed_terms)
+            for term, doc_freq in zip(missed_terms, missed_doc_freqs):
+                self.doc_stats_cache.write_unary_doc_freq(term.cache_key, doc_freq)
+                doc_freqs[term.cache_key] = doc_freq
+
+        return np.array([doc_freqs[term.cache_key] for term in terms], dtype=np.int64)
+
+    async def bulk_bipartite_doc_freq(self, term_x: Term, terms_y: List[Term]) -> np.ndarray:
+        """
+        Get the bipartite document frequencies of `term_x` with each term in `terms_y`.
+        Cache misses are queried to ES in one request.
+        """
+        doc_freqs = {}
+        missed_pairs = {}
+        for term_y in terms_y:
+            term_pair = TermPair(term_x=term_x, term_y=term_y)
+            cached_doc_freq = self.doc_stats_cache.read_bipartite_doc_freq(term_pair.cache_key)
+            if cached_doc_freq is not None:
+                doc_freqs[term_pair.cache_key] = cached_doc_freq
+            else:
+                missed_pairs.setdefault(term_pair.cache_key, term_pair)
+
+        if missed_pairs:
+            missed_pairs = list(missed_pairs.values())
+            for term_pair in missed_pairs:
+                self.expand_term_pair(term_pair)
+
+            missed_doc_freqs = await self.doc_stats_service.bulk_bipartite_doc_freq(
+                term_x, [term_pair[1] for term_pair in missed_pairs]
+            )
+            for term_pair, doc_freq in zip(missed_pairs, missed_doc_freqs):
+                self.doc_stats_cache.write_bipartite_doc_freq(term_pair.cache_key, doc_freq)
+                doc_freqs[term_pair.cache_key] = doc_freq
+
+        return np.array(
+            [doc_freqs[TermPair(term_x=term_x, term_y=term_y).cache_key] for term_y in terms_y], dtype=np.int64
+        )
+
+    async def calculate_ngd_matrix(self, terms_x: List[Term], terms_y: List[Term], max_concurrent_queries=8):
+        """
+        Calculate the NGD matrix between two lists of terms, i.e. entry (i, j) of the returned 2-D float array is the
+        NGD between terms_x[i] and terms_y[j]. An entry is inf if the NGD is infinite, or NaN if the NGD is undefined
+        (i.e. either term has zero document frequency).
+
+        All the unary document frequencies are queried in one ES request, and the bipartite document frequencies
+        are queried in one ES request per row (at most `max_concurrent_queries` rows concurrently).
+        Rows and columns of terms with zero document frequency are not queried at all.
+        """
+        f_x, f_y = await asyncio.gather(self.bulk_unary_doc_freq(terms_x), self.bulk_unary_doc_freq(terms_y))
+
+        # only query the sub-matrix where both terms have non-zero document frequencies
+        rows = np.flatnonzero(f_x)
+        columns = np.flatnonzero(f_y)
+        f_xy = np.zeros((len(terms_x), len(terms_y)), dtype=np.int64)
+
+        if len(rows) > 0 and len(columns) > 0:
+            defined_terms_y = [terms_y[column] for column in columns]
+            semaphore = asyncio.Semaphore(max_concurrent_queries)
+
+            async def fill_row(row):
+                async with semaphore:
+                    f_xy[row, columns] = await self.bulk_bipartite_doc_freq(terms_x[row], defined_terms_y)
+
+            await asyncio.gather(*[fill_row(row) for row in rows])
+
+        n = await self.doc_total()
+        return normalized_google_distance_matrix(n=n, f_x=f_x, f_y=f_y, f_xy=f_xy)
@@ -1,9 +1,13 @@
 from .distance import (
     normalized_google_distance,
+    normalized_google_distance_matrix,
     NGDZeroDocFreqException,
     NGDInfinityException,
     NGDUndefinedException,
     INFINITY_STR,
     UNDEFINED_STR,
 )
-from .cache import LRUCache
+from .cache import LRUCache, SingleFlight
+from .executor import OffloadExecutor, offload
+from .serializer import to_json_bytes
+from .compression import CompressionStatistics, compression_statistics, compression_transform
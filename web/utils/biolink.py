@@ -0,0 +1,115 @@
+"""
+Shared, versioned cache of the Biolink model for the nodenorm and nameres handlers
+
+Building a `bmt.Toolkit` fetches and parses the Biolink model YAML from GitHub, which takes a few
+seconds and fails on hosts without network access. The handlers only need the class URIs of the
+ancestors of a Biolink class, so on first use we precompute them for every class of the model
+and serialize them to a compact JSON artifact, named after the model version. Later starts (and
+every other process) load the artifact from disk instead of the toolkit
+"""
+
+import functools
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Union
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BIOLINK_MODEL_VERSION = "v4.2.6-rc5"
+BIOLINK_MODEL_VERSION = os.getenv("BIOLINK_VERSION", DEFAULT_BIOLINK_MODEL_VERSION)
+BIOLINK_MODEL_URL = "https://raw.githubusercontent.com/biolink/biolink-model/{version}/biolink-model.yaml"
+
+# since the web modules are imported by the `python index.py` process, `Path.cwd()` is
+# the "pending.api" folder, matching the other web assets
+BIOLINK_CACHE_DIRECTORY = Path(os.getenv("BIOLINK_CACHE_DIR", Path.cwd() / "assets" / "biolink"))
+
+
+class BiolinkModel:
+    """
+    Precomputed ancestry of the Biolink model classes
+
+    `classes` maps each class name to its class URI and the class URIs of its ancestors (itself
+    and its mixins included), in the order returned by `bmt.Toolkit.get_ancestors`
+    """
+
+    def __init__(self, version: str, classes: dict[str, dict]):
+        self.version = version
+        self.classes = classes
+
+        # bmt resolves a class by its name ("gene or gene product"), its snake case name,
+        # its class URI ("biolink:GeneOrGeneProduct") or the URI without its prefix
+        self._class_index = {}
+        for name, biolink_class in classes.items():
+            class_uri = biolink_class["class_uri"]
+            for alias in (name, name.replace(" ", "_"), class_uri, class_uri.split(":", 1)[-1]):
+                self._class_index.setdefault(alias.lower(), biolink_class)
+
+    @classmethod
+    def from_toolkit(cls, version: str, toolkit) -> "BiolinkModel":
+        classes = {}
+        for name in toolkit.get_all_classes():
+            classes[name] = {
+                "class_uri": toolkit.get_element(name)["class_uri"],
+                "ancestors": [toolkit.get_element(ancestor)["class_uri"] for ancestor in toolkit.get_ancestors(name)],
+            }
+        return cls(version, classes)
+
+    @classmethod
+    def load(cls, artifact: Union[str, Path]) -> "BiolinkModel":
+        with open(artifact, "r", encoding="utf-8") as handle:
+            serialized_model = json.load(handle)
+        return cls(serialized_model["version"], serialized_model["classes"])
+
+    def dump(self, artifact: Union[str, Path]) -> None:
+        """
+        Writes the artifact atomically, as several processes can build it at the same time
+        """
+        artifact = Path(artifact)
+        artifact.parent.mkdir(parents=True, exist_ok=True)
+        temporary_artifact = artifact.with_name(f"{artifact.name}.{os.getpid()}.tmp")
+        with open(temporary_artifact, "w", encoding="utf-8") as handle:
+            json.dump({"version": self.version, "classes": self.classes}, handle, separators=(",", ":"))
+        temporary_artifact.replace(artifact)
+
+    def get_ancestor_class_uris(self, name: str) -> list[str]:
+        """
+        Returns the class URIs of the ancestors of the Biolink class, itself included.
+        Unknown classes have no ancestors
+        """
+        biolink_class = self._class_index.get(name.lower())
+        if biolink_class is None:
+            return []
+        return biolink_class["ancestors"]
+
+
+def biolink_model_artifact(version: str = BIOLINK_MODEL_VERSION) -> Path:
+    return BIOLINK_CACHE_DIRECTORY / f"biolink-model-{version}.json"
+
+
+@functools.cache
+def get_biolink_model(version: str = BIOLINK_MODEL_VERSION) -> BiolinkModel:
+    """
+    Loads the cached Biolink model of the version, building (and caching) it from
+    the remote Biolink model YAML on first use
+    """
+    artifact = biolink_model_artifact(version)
+    if artifact.exists():
+        biolink_model = BiolinkModel.load(artifact)
+        if biolink_model.version == version:
+            return biolink_model
+        logger.warning("Discarding Biolink model cache %s built for version %s", artifact, biolink_model.version)
+
+    # only imported to build the cache, as importing bmt (and linkml) alone takes a while
+    import bmt
+
+    model_url = BIOLINK_MODEL_URL.format(version=version)
+    logger.info("Building Biolink model cache %s from %s", artifact, model_url)
+    biolink_model = BiolinkModel.from_toolkit(version, bmt.Toolkit(model_url))
+    try:
+        biolink_model.dump(artifact)
+    except OSError as dump_error:
+        # e.g. a read-only assets folder in a container, the model is still served from memory
+        logger.warning("Unable to write Biolink model cache %s: %s", artifact, dump_error)
+    return biolink_model
@@ -1,4 +1,43 @@
+import asyncio
+import functools
+import sys
 from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls of the same key into one in-flight call (a.k.a. "single-flight" or "request coalescing").
+
+    When several coroutines call `do(key, loader)` before the first `loader()` completes, only the first caller runs
+    `loader()`; the others await the same in-flight task and receive the same result (or exception).
+    """
+
+    def __init__(self):
+        self._inflight = {}
+
+    def __contains__(self, key):
+        return key in self._inflight
+
+    def __len__(self):
+        return len(self._inflight)
+
+    async def do(self, key: Hashable, loader: Callable[[], Awaitable[Any]]):
+        inflight = self._inflight.get(key)
+        if inflight is None:
+            # the call runs as its own task that every caller, the first one included, only awaits through a shield,
+            # so a cancelled caller (e.g. a client disconnect) never cancels the call for all the others
+            inflight = asyncio.ensure_future(loader())
+            self._inflight[key] = inflight
+            inflight.add_done_callback(functools.partial(self._done, key))
+        return await asyncio.shield(inflight)
+
+    def _done(self, key: Hashable, inflight: asyncio.Future):
+        if self._inflight.get(key) is inflight:
+            del self._inflight[key]
+        # mark the exception as retrieved, in case all the callers were cancelled
+        if not inflight.cancelled():
+            inflight.exception()
 
 
 class LRUCache:
@@ -12,14 +51,23 @@ class LRUCache:
         self.cache = OrderedDict()
         self.capacity = capacity
 
+        self.single_flight = SingleFlight()
+
+        # statistics since creation or the last `clear()`
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
     def get(self, key):
         """
         Returns the cached value to the key in O(1); also move the key to the end to show that it was recently used.
         Return None if key is not cached.
         """
         if key not in self.cache:
+            self.misses += 1
             return None
         else:
+            self.hits += 1
             self.cache.move_to_end(key)
             return self.cache[key]
 
@@ -33,3 +81,51 @@ class LRUCache:
         self.cache.move_to_end(key)
         if len(self.cache) > self.capacity:
             self.cache.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """
+        Remove all the cached keys and reset the statistics
+        """
+        self.cache.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def approximate_memory(self) -> int:
+        """
+        Approximate memory usage in bytes, i.e. the size of the underlying ordered dictionary plus the shallow sizes
+        of all the keys and values. It's O(n) so do not call it in a hot path.
+        """
+        return sys.getsizeof(self.cache) + sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in self.cache.items())
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "capacity": self.capacity,
+            "size": len(self.cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits / lookups) if lookups else None,
+            "evictions": self.evictions,
+            "inflight": len(self.single_flight),
+            "approximate_memory_bytes": self.approximate_memory(),
+        }
+
+    async def fetch(self, key, loader: Callable[[], Awaitable[Any]]):
+        """
+        Returns the cached value to the key if present. Otherwise await `loader()` to compute the value and cache it.
+
+        Concurrent misses on the same key are coalesced, i.e. `loader()` is awaited only once and all the callers share
+        its result. If `loader()` raises, the exception is propagated to all the callers and nothing is cached.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        async def load_and_put():
+            value = await loader()
+            self.put(key, value)
+            return value
+
+        return await self.single_flight.do(key, load_and_put)
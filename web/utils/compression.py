@@ -0,0 +1,247 @@
+"""
+Compression of the pending.api responses
+
+Replaces the gzip only `compress_response` of tornado with a content encoding negotiated from
+the Accept-Encoding header of the request among zstd, br (brotli) and gzip, the first two being
+used when their optional packages (`zstandard`, `brotli`) are installed. A response written at once
+is only compressed from a minimum length, while a streamed response (written across several
+flushes) is compressed incrementally, each flush sending out the data compressed so far.
+
+The CPU time spent compressing is accumulated per endpoint in `compression_statistics`
+"""
+
+import dataclasses
+import time
+import zlib
+from collections import Counter, defaultdict
+from typing import Optional
+
+import tornado.httputil
+import tornado.web
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class GzipCompressor:
+    LEVEL = 6
+
+    def __init__(self):
+        # 16 + MAX_WBITS writes the gzip header and trailer around the deflate stream
+        self._compressor = zlib.compressobj(self.LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, chunk: bytes, finishing: bool) -> bytes:
+        return self._compressor.compress(chunk) + self._compressor.flush(
+            zlib.Z_FINISH if finishing else zlib.Z_SYNC_FLUSH
+        )
+
+
+class BrotliCompressor:
+    # the higher qualities are meant for static content, too slow for responses built on each request
+    QUALITY = 4
+
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=self.QUALITY)
+
+    def compress(self, chunk: bytes, finishing: bool) -> bytes:
+        data = self._compressor.process(chunk)
+        return data + (self._compressor.finish() if finishing else self._compressor.flush())
+
+
+class ZstdCompressor:
+    LEVEL = 3
+
+    def __init__(self):
+        self._compressor = zstandard.ZstdCompressor(level=self.LEVEL).compressobj()
+
+    def compress(self, chunk: bytes, finishing: bool) -> bytes:
+        data = self._compressor.compress(chunk)
+        if finishing:
+            return data + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+        return data + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+
+COMPRESSORS = {"gzip": GzipCompressor}
+if brotli is not None:
+    COMPRESSORS["br"] = BrotliCompressor
+if zstandard is not None:
+    COMPRESSORS["zstd"] = ZstdCompressor
+
+
+def negotiate_encoding(accept_encoding: str, encodings: list[str]) -> Optional[str]:
+    """
+    Returns the encoding of `encodings` with the highest quality value in the Accept-Encoding
+    header, ties being broken by the order of `encodings`, or None when none is acceptable
+    """
+    qualities = {}
+    for accepted in accept_encoding.split(","):
+        name, _, parameters = accepted.partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        parameter, _, value = parameters.partition("=")
+        if parameter.strip().lower() == "q":
+            try:
+                quality = float(value)
+            except ValueError:
+                quality = 0.0
+        qualities[name] = quality
+
+    best_encoding, best_quality = None, 0.0
+    for encoding in encodings:
+        quality = qualities.get(encoding, qualities.get("*", 0.0))
+        if quality > best_quality:
+            best_encoding, best_quality = encoding, quality
+    return best_encoding
+
+
+@dataclasses.dataclass
+class EndpointCompressionStatistics:
+    compressed_responses: int = 0
+    uncompressed_bytes: int = 0
+    compressed_bytes: int = 0
+    cpu_time: float = 0.0
+    encodings: Counter = dataclasses.field(default_factory=Counter)
+
+    # responses left uncompressed for being under the minimum length
+    skipped_responses: int = 0
+    skipped_bytes: int = 0
+
+
+class CompressionStatistics:
+    def __init__(self):
+        self.endpoints = defaultdict(EndpointCompressionStatistics)
+
+    def record(self, endpoint: str, encoding: str, uncompressed_bytes: int, compressed_bytes: int, cpu_time: float):
+        statistics = self.endpoints[endpoint]
+        statistics.compressed_responses += 1
+        statistics.uncompressed_bytes += uncompressed_bytes
+        statistics.compressed_bytes += compressed_bytes
+        statistics.cpu_time += cpu_time
+        statistics.encodings[encoding] += 1
+
+    def record_skipped(self, endpoint: str, uncompressed_bytes: int):
+        statistics = self.endpoints[endpoint]
+        statistics.skipped_responses += 1
+        statistics.skipped_bytes += uncompressed_bytes
+
+    def summary(self) -> dict:
+        summary = {}
+        for endpoint, statistics in sorted(self.endpoints.items()):
+            endpoint_summary = dataclasses.asdict(statistics)
+            endpoint_summary["encodings"] = dict(statistics.encodings)
+            if statistics.uncompressed_bytes:
+                endpoint_summary["compression_ratio"] = statistics.compressed_bytes / statistics.uncompressed_bytes
+                endpoint_summary["cpu_ms_per_mib"] = (
+                    statistics.cpu_time * 1000 / (statistics.uncompressed_bytes / 2**20)
+                )
+            summary[endpoint] = endpoint_summary
+        return summary
+
+
+compression_statistics = CompressionStatistics()
+
+
+class CompressionContentEncoding(tornado.web.OutputTransform):
+    """
+    Output transform compressing the response with the encoding negotiated from the request.
+    Instantiated for each request by the application, from `compression_transform`
+    """
+
+    CONTENT_TYPES = tornado.web.GZipContentEncoding.CONTENT_TYPES
+
+    def __init__(
+        self,
+        request: tornado.httputil.HTTPServerRequest,
+        encodings: list[str],
+        min_length: int,
+        statistics: CompressionStatistics,
+    ):
+        self.encoding = negotiate_encoding(request.headers.get("Accept-Encoding", ""), encodings)
+        self.min_length = min_length
+        self.statistics = statistics
+        # named by PendingAPI.get_handler_delegate
+        self.endpoint = getattr(request, "endpoint", request.path)
+
+        self._compressor = None
+        self._uncompressed_bytes = 0
+        self._compressed_bytes = 0
+        self._cpu_time = 0.0
+
+    def _compressible_type(self, content_type: str) -> bool:
+        return content_type.startswith("text/") or content_type in self.CONTENT_TYPES
+
+    def transform_first_chunk(
+        self, status_code: int, headers: tornado.httputil.HTTPHeaders, chunk: bytes, finishing: bool
+    ) -> tuple[int, tornado.httputil.HTTPHeaders, bytes]:
+        if "Vary" in headers:
+            headers["Vary"] += ", Accept-Encoding"
+        else:
+            headers["Vary"] = "Accept-Encoding"
+
+        content_type = headers.get("Content-Type", "").split(";")[0]
+        if self.encoding is None or "Content-Encoding" in headers or not self._compressible_type(content_type):
+            return status_code, headers, chunk
+
+        # an empty body is never compressed, and the length of a streamed response is only
+        # known when the handler sets its Content-Length
+        min_length = max(self.min_length, 1)
+        if finishing:
+            length = len(chunk)
+        else:
+            length = int(headers.get("Content-Length", min_length))
+        if length < min_length:
+            if finishing and length:
+                self.statistics.record_skipped(self.endpoint, length)
+            return status_code, headers, chunk
+
+        headers["Content-Encoding"] = self.encoding
+        self._compressor = COMPRESSORS[self.encoding]()
+        chunk = self.transform_chunk(chunk, finishing)
+        if "Content-Length" in headers:
+            if finishing:
+                headers["Content-Length"] = str(len(chunk))
+            else:
+                # falls back to the chunked transfer encoding
+                del headers["Content-Length"]
+        return status_code, headers, chunk
+
+    def transform_chunk(self, chunk: bytes, finishing: bool) -> bytes:
+        if self._compressor is None:
+            return chunk
+
+        # the compression runs on the IOLoop thread, so the thread CPU time excludes the offload executor
+        start = time.thread_time()
+        compressed_chunk = self._compressor.compress(chunk, finishing)
+        self._cpu_time += time.thread_time() - start
+        self._uncompressed_bytes += len(chunk)
+        self._compressed_bytes += len(compressed_chunk)
+
+        if finishing:
+            self.statistics.record(
+                self.endpoint, self.encoding, self._uncompressed_bytes, self._compressed_bytes, self._cpu_time
+            )
+        return compressed_chunk
+
+
+def compression_transform(encodings: list[str], min_length: int, statistics: CompressionStatistics = None):
+    """
+    Returns the output transform of an application compressing its responses with the `encodings`
+    available, by order of preference, from `min_length` bytes
+    """
+    available_encodings = [encoding for encoding in encodings if encoding in COMPRESSORS]
+    if statistics is None:
+        statistics = compression_statistics
+
+    def transform(request: tornado.httputil.HTTPServerRequest) -> CompressionContentEncoding:
+        return CompressionContentEncoding(request, available_encodings, min_length, statistics)
+
+    return transform
@@ -1,5 +1,7 @@
 import math
 
+import numpy as np
+
 # Some JSON libraries cannot parse `float('inf')`, this constant string can be used for such scenarios.
 INFINITY_STR = "Infinity"
 UNDEFINED_STR = "undefined"
@@ -64,3 +66,40 @@ def normalized_google_distance(n: int, f_x: int, f_y: int, f_xy: int):
     dividend = max(log_f_x, log_f_y) - log_f_xy
     divisor = log_n - min(log_f_x, log_f_y)
     return dividend / divisor
+
+
+def normalized_google_distance_matrix(n: int, f_x: np.ndarray, f_y: np.ndarray, f_xy: np.ndarray) -> np.ndarray:
+    """
+    Vectorized version of `normalized_google_distance()`. Calculate the NGD matrix between two lists of SemmedDB entities.
+
+    :param int n: same as `n` in `normalized_google_distance()`
+    :param np.ndarray f_x: 1-D array of length m, the document frequencies of the terms x_1, ..., x_m
+    :param np.ndarray f_y: 1-D array of length k, the document frequencies of the terms y_1, ..., y_k
+    :param np.ndarray f_xy: 2-D array of shape (m, k), where f_xy[i, j] is the document frequency that x_i & y_j both occur in
+
+    Returns a 2-D float array of shape (m, k), where
+    - entry (i, j) is NaN if f_x[i] == 0 or f_y[j] == 0 (i.e. NGD undefined);
+    - entry (i, j) is inf if f_xy[i, j] == 0 (i.e. NGD infinite);
+    - otherwise entry (i, j) is the NGD between x_i and y_j.
+    """
+    # Same base as in `normalized_google_distance()`
+    base = 2
+
+    f_x = np.asarray(f_x, dtype=np.float64).reshape(-1, 1)  # column vector of shape (m, 1)
+    f_y = np.asarray(f_y, dtype=np.float64).reshape(1, -1)  # row vector of shape (1, k)
+    f_xy = np.asarray(f_xy, dtype=np.float64)
+
+    # log(0) is -inf, which is handled by the masks below, so silence the warnings
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_f_x = np.log(f_x) / np.log(base)
+        log_f_y = np.log(f_y) / np.log(base)
+        log_f_xy = np.log(f_xy) / np.log(base)
+        log_n = math.log(n, base)
+
+        dividend = np.maximum(log_f_x, log_f_y) - log_f_xy
+        divisor = log_n - np.minimum(log_f_x, log_f_y)
+        distance = dividend / divisor
+
+    distance[np.broadcast_to(f_xy == 0, distance.shape)] = np.inf
+    distance[np.broadcast_to((f_x == 0) | (f_y == 0), distance.shape)] = np.nan
+    return distance
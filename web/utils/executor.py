@@ -0,0 +1,69 @@
+import asyncio
+import concurrent.futures
+import functools
+import multiprocessing
+import os
+from typing import Any, Callable
+
+
+class OffloadExecutor:
+    """
+    Runs the CPU-bound steps of a request (response shaping, serialization) out of the IOLoop once their input
+    passes a size threshold. Below the threshold the function runs inline, as the executor round trip would cost
+    small requests more than it saves.
+
+    `kind` is either "thread" or "process". A thread pool shares the memory of the request (no pickling) and lets
+    the IOLoop run between two GIL switch intervals; a process pool runs in parallel but pickles the arguments and
+    the result, so it only pays off when the work dominates the size of its input and output.
+
+    The pool is created on first use, so with the pre-fork server every worker gets its own pool after the fork.
+    """
+
+    def __init__(self, kind: str = "thread", max_workers: int = None):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unsupported executor kind {kind}, expected 'thread' or 'process'")
+        self.kind = kind
+        self.max_workers = max_workers or min(4, os.cpu_count())
+        self._executor = None
+
+        # statistics since creation
+        self.inline_calls = 0
+        self.offloaded_calls = 0
+
+    @property
+    def executor(self) -> concurrent.futures.Executor:
+        if self._executor is None:
+            if self.kind == "thread":
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="offload"
+                )
+            else:
+                # the server process holds an IOLoop and threads, which are unsafe to fork
+                self._executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+                )
+        return self._executor
+
+    async def run(self, function: Callable, *args, size: int, threshold: int, **kwargs) -> Any:
+        if size < threshold:
+            self.inline_calls += 1
+            return function(*args, **kwargs)
+
+        self.offloaded_calls += 1
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(function, *args, **kwargs))
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+default_offload_executor = OffloadExecutor("thread")
+
+
+async def offload(function: Callable, *args, size: int, threshold: int, **kwargs) -> Any:
+    """
+    Runs `function(*args, **kwargs)` in the default (thread) offload executor when `size` reaches `threshold`
+    """
+    return await default_offload_executor.run(function, *args, size=size, threshold=threshold, **kwargs)
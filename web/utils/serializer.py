@@ -0,0 +1,25 @@
+"""
+JSON serialization of the pending.api responses
+
+biothings serializes the responses with orjson into a `str`, which tornado then encodes back to UTF-8 bytes,
+copying every (possibly several MB) response twice. We keep the orjson bytes as they are, with the same options
+as biothings, so the output is identical
+"""
+
+from collections import UserDict, UserList
+from typing import Any
+
+import orjson
+
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_NAIVE_UTC
+
+
+def _default(value: Any) -> Any:
+    # same as biothings.utils.serializer.orjson_default
+    if isinstance(value, (UserDict, UserList)):
+        return value.data
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def to_json_bytes(data: Any) -> bytes:
+    return orjson.dumps(data, default=_default, option=_ORJSON_OPTIONS)